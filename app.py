@@ -1,11 +1,19 @@
 import streamlit as st
 import folium
-from streamlit_folium import folium_static
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import requests
 from io import BytesIO
+import functools
+
+import app_cache
+import economics
+import layer_store
+import monte_carlo
+import regions
+import spatial_index
+from ml_prediction import model_server
 
 # Set page config
 st.set_page_config(
@@ -21,54 +29,44 @@ This interactive dashboard analyzes the potential of Enhanced Rock Weathering (E
 evaluating decarbonization performance and economic viability under various carbon pricing scenarios.
 """)
 
-# Sidebar
-st.sidebar.header("Analysis Parameters")
-carbon_price = st.sidebar.slider("Carbon Price ($/ton CO2)", 0, 200, 50)
-time_horizon = st.sidebar.selectbox("Time Horizon", ["2025", "2030", "2035", "2040"])
+timer = app_cache.RerunTimer("ERW dashboard")
 
-# Create tabs
-tab1, tab2, tab3, tab4, tab6 = st.tabs(["Global Map", "Regional Analysis", "Economic Assessment", "Madeira Basalt Case Study", "Azores Basalt Case Study"])
+MAX_CASE_STUDY_TABS = 8
 
-with tab1:
-    st.header("Global ERW Potential Map")
-    
+# Static content below does not depend on any widget, so it is built once
+# and served from the cache on every rerun
+# Cached views of the region registry are keyed by its file version, so
+# editing data/erw_regions.geojson refreshes them
+REGISTRY_VERSION = regions.REGIONS_PATH.stat().st_mtime
+
+@st.cache_data(ttl=app_cache.MAP_TTL, max_entries=app_cache.MAP_ENTRIES, show_spinner=False)
+def global_map_html(version):
+    """HTML of the global ERW potential map"""
     # Create a map centered at a global view
     m = folium.Map(location=[20, 0], zoom_start=2)
     
-    # Define regions with high ERW potential
-    regions = {
-        "Brazil": {"lat": -10, "lon": -55, "potential": "High"},
-        "India": {"lat": 20, "lon": 78, "potential": "High"},
-        "Southeast Asia": {"lat": 5, "lon": 100, "potential": "High"},
-        "China": {"lat": 35, "lon": 105, "potential": "High"},
-        "USA": {"lat": 40, "lon": -95, "potential": "Medium"},
-        "Europe": {"lat": 51, "lon": 0, "potential": "Medium"},
-        "Sub-Saharan Africa": {"lat": -2, "lon": 30, "potential": "High"}
-    }
-    
-    # Add markers for each region
-    for region, data in regions.items():
+    # Add markers for each region with a rated ERW potential
+    registry = regions.with_columns(regions.load_regions(), ['potential'])
+    for name, lat, lon, potential in zip(registry['region'], registry['lat'], registry['lon'], registry['potential']):
         folium.Marker(
-            location=[data["lat"], data["lon"]],
-            popup=f"{region}: {data['potential']} ERW Potential",
-            icon=folium.Icon(color='green' if data["potential"] == "High" else 'orange')
+            location=[lat, lon],
+            popup=f"{name}: {potential} ERW Potential",
+            icon=folium.Icon(color='green' if potential == "High" else 'orange')
         ).add_to(m)
-    
-    # Display the map
-    folium_static(m, width=1000, height=600)
+    return app_cache.map_html(m)
 
-with tab2:
-    st.header("Regional Analysis")
-    
-    # Create sample data for regional analysis
-    regions_data = {
-        "Region": ["Brazil", "India", "Southeast Asia", "China", "USA", "Europe", "Sub-Saharan Africa"],
-        "Agricultural Land (Mha)": [238, 180, 120, 500, 400, 280, 800],
-        "CO2 Sequestration Potential (Mt/year)": [120, 90, 60, 250, 200, 140, 400],
-        "Economic Viability Score": [0.85, 0.75, 0.80, 0.90, 0.70, 0.65, 0.95]
-    }
-    
-    df = pd.DataFrame(regions_data)
+@st.cache_data(ttl=app_cache.DERIVED_TTL, max_entries=app_cache.DERIVED_ENTRIES, show_spinner=False)
+def regional_analysis(version):
+    """Regional data, its bar chart and the two sorted views"""
+    registry = regions.with_columns(
+        regions.load_regions(), ['agricultural_land_mha', 'co2_potential_mt_per_year', 'viability_score']
+    )
+    df = pd.DataFrame({
+        "Region": registry['region'].to_numpy(),
+        "Agricultural Land (Mha)": registry['agricultural_land_mha'].to_numpy(),
+        "CO2 Sequestration Potential (Mt/year)": registry['co2_potential_mt_per_year'].to_numpy(),
+        "Economic Viability Score": registry['viability_score'].to_numpy()
+    })
     
     # Create interactive bar chart
     fig = px.bar(df, 
@@ -78,6 +76,64 @@ with tab2:
                  color="Economic Viability Score",
                  color_continuous_scale="Viridis")
     
+    return (df, fig,
+            df.sort_values("CO2 Sequestration Potential (Mt/year)", ascending=False),
+            df.sort_values("Economic Viability Score", ascending=False))
+
+@st.cache_data(ttl=app_cache.DERIVED_TTL, max_entries=app_cache.DERIVED_ENTRIES, show_spinner=False)
+def roi_inputs(version):
+    """Per-hectare investment and annual revenue at the reference carbon price"""
+    registry = regions.with_columns(regions.load_regions(), ['investment_usd_per_ha', 'annual_revenue_usd_per_ha'])
+    return pd.DataFrame({
+        "Region": registry['region'].to_numpy(),
+        "Initial Investment ($/ha)": registry['investment_usd_per_ha'].to_numpy(),
+        "Annual Revenue ($/ha)": registry['annual_revenue_usd_per_ha'].to_numpy()
+    })
+
+@st.cache_resource(ttl=app_cache.DERIVED_TTL, max_entries=app_cache.DERIVED_ENTRIES, show_spinner=False)
+def economics_grid(version):
+    """NPV, payback and viability over every carbon price, horizon and discount rate"""
+    roi = roi_inputs(version)
+    return economics.sensitivity_grid(roi["Initial Investment ($/ha)"], roi["Annual Revenue ($/ha)"])
+
+@st.cache_data(ttl=app_cache.DERIVED_TTL, max_entries=app_cache.DERIVED_ENTRIES, show_spinner=False)
+def case_study_names(version):
+    """Names of the regions with a basalt case study"""
+    return list(regions.case_studies(regions.load_regions())['region'])
+
+@st.cache_data(ttl=app_cache.DERIVED_TTL, max_entries=app_cache.DERIVED_ENTRIES, show_spinner=False)
+def sourcing_pairs(source, target, k, radius_km, version):
+    """Nearest deposits (k) or all deposits within radius_km of every source site"""
+    if radius_km is None:
+        return spatial_index.nearest(source, target, k)
+    return spatial_index.within(source, target, radius_km)
+
+def layers_version(*layers):
+    """Modification times of stored layers, keying the cached queries over them"""
+    paths = spatial_index.layer_paths()
+    return tuple(layer_store.layer_version(paths[layer]) for layer in layers)
+
+# Sidebar
+st.sidebar.header("Analysis Parameters")
+carbon_price = st.sidebar.slider("Carbon Price ($/ton CO2)", 0, 200, 50)
+time_horizon = st.sidebar.selectbox("Time Horizon", ["2025", "2030", "2035", "2040"])
+discount_rate = st.sidebar.slider("Discount Rate (%)", 0.0, 15.0, 8.0, step=0.5) / 100
+
+def show_global_map():
+    """Global Map tab"""
+    st.header("Global ERW Potential Map")
+    
+    # Display the map
+    with timer.step("global map"):
+        app_cache.show_map_html(global_map_html(REGISTRY_VERSION), width=1000, height=600)
+
+def show_regional_analysis():
+    """Regional Analysis tab"""
+    st.header("Regional Analysis")
+    
+    with timer.step("regional analysis"):
+        df, fig, by_potential, by_viability = regional_analysis(REGISTRY_VERSION)
+    
     st.plotly_chart(fig, use_container_width=True)
     
     # Display detailed metrics
@@ -85,106 +141,203 @@ with tab2:
     
     with col1:
         st.subheader("Top Regions by Potential")
-        st.dataframe(df.sort_values("CO2 Sequestration Potential (Mt/year)", ascending=False))
+        st.dataframe(by_potential)
     
     with col2:
         st.subheader("Economic Viability")
-        st.dataframe(df.sort_values("Economic Viability Score", ascending=False))
+        st.dataframe(by_viability)
 
-with tab3:
+def show_economic_assessment():
+    """Economic Assessment tab"""
     st.header("Economic Assessment")
     
-    # Create economic analysis visualization
-    carbon_prices = np.linspace(0, 200, 20)
-    economic_viability = {
-        "Brazil": [0.3, 0.5, 0.7, 0.85, 0.95],
-        "India": [0.2, 0.4, 0.6, 0.75, 0.9],
-        "Southeast Asia": [0.25, 0.45, 0.65, 0.8, 0.92],
-        "China": [0.35, 0.55, 0.75, 0.9, 0.98],
-        "USA": [0.15, 0.35, 0.55, 0.7, 0.85],
-        "Europe": [0.1, 0.3, 0.5, 0.65, 0.8],
-        "Sub-Saharan Africa": [0.4, 0.6, 0.8, 0.95, 0.99]
-    }
-    
-    # Create economic viability plot
+    # Slider changes only index into the precomputed grid
+    with timer.step("economic assessment"):
+        roi = roi_inputs(REGISTRY_VERSION)
+        region_names = list(roi["Region"])
+        grid = economics_grid(REGISTRY_VERSION)
+        horizon = economics.horizon_years(time_horizon)
+        results = economics.scenario(grid, region_names, carbon_price, horizon, discount_rate)
+    
+    st.markdown(f"Scenario: **${carbon_price}/ton CO2**, {horizon}-year horizon (to {time_horizon}), "
+                f"{discount_rate:.1%} discount rate. Revenues scale from the ROI estimates at "
+                f"${economics.REFERENCE_PRICE:.0f}/ton CO2.")
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Viable Regions", f"{results['Viable'].sum()} of {len(results)}")
+    col2.metric("Median NPV ($/ha)", f"{results['NPV ($/ha)'].median():,.0f}")
+    col3.metric("Median Payback (years)", f"{results['Payback Period (years)'].median():.1f}")
+    
+    # NPV of every region against carbon price
     fig = px.line(
-        x=carbon_prices,
-        y=[economic_viability[region] for region in regions_data["Region"]],
-        title="Economic Viability vs Carbon Price",
-        labels={"x": "Carbon Price ($/ton CO2)", "y": "Economic Viability Score"},
-        names=regions_data["Region"]
+        economics.npv_curves(grid, region_names, horizon, discount_rate),
+        x="Carbon Price ($/ton CO2)",
+        y="NPV ($/ha)",
+        color="Region",
+        title="Net Present Value vs Carbon Price"
     )
+    fig.add_hline(y=0, line_dash="dot", line_color="grey")
+    fig.add_vline(x=carbon_price, line_dash="dash")
+    st.plotly_chart(fig, use_container_width=True)
     
+    # Share of viable regions over price and horizon
+    fig = px.imshow(
+        economics.viable_share(grid, discount_rate).T,
+        x=grid["carbon_prices"],
+        y=grid["horizons"],
+        origin="lower",
+        aspect="auto",
+        color_continuous_scale="Viridis",
+        labels={"x": "Carbon Price ($/ton CO2)", "y": "Horizon (years)", "color": "Viable share"},
+        title="Share of Viable Regions"
+    )
     st.plotly_chart(fig, use_container_width=True)
     
     # Display ROI calculations
     st.subheader("Return on Investment (ROI) Analysis")
-    roi_data = {
-        "Region": regions_data["Region"],
-        "Initial Investment ($/ha)": [500, 450, 400, 550, 600, 650, 350],
-        "Annual Revenue ($/ha)": [200, 180, 160, 220, 240, 260, 150],
-        "Payback Period (years)": [2.5, 2.5, 2.5, 2.5, 2.5, 2.5, 2.3]
-    }
+    st.dataframe(roi.merge(results, on="Region"))
+
+def show_mass_uncertainty(region, area_km2, depth, density, key):
+    """Monte Carlo uncertainty of a region's basalt mass, streamed while it runs"""
+    if not st.checkbox("Uncertainty mode (Monte Carlo)", key=f"{key}_uncertainty"):
+        return
+    
+    kinds = [kind for kind in monte_carlo.DISTRIBUTIONS if kind != 'fixed']
+    specs = {}
+    columns = st.columns(3)
+    for column, name, center, unit in zip(columns, monte_carlo.PARAMETERS, (area_km2, depth, density), ("km²", "m", "kg/m³")):
+        with column:
+            kind = st.selectbox(f"{name.title()} distribution", kinds, index=kinds.index('normal'), key=f"{key}_{name}_kind")
+            spread = st.slider(f"{name.title()} spread (% of {center:,g} {unit})", 0, 50, 10, key=f"{key}_{name}_spread")
+            specs[name] = monte_carlo.distribution(kind, center, spread / 100)
+    samples = st.select_slider("Samples", [100_000, 1_000_000, 10_000_000, 50_000_000], value=1_000_000,
+                               format_func=lambda n: f"{n:,}", key=f"{key}_samples")
+    
+    if not st.button("Run simulation", key=f"{key}_run"):
+        return
+    progress = st.progress(0.0)
+    table = st.empty()
+    history = []
+    for result in monte_carlo.simulate(specs, samples):
+        history.append({"Samples": result["samples"],
+                        **{f"P{p}": value for p, value in result["percentiles"].items()}})
+        progress.progress(result["samples"] / samples, text=f"{result['samples']:,} of {samples:,} samples")
+        table.dataframe(pd.DataFrame(history[-1:]).set_index("Samples").round(2))
     
-    st.dataframe(pd.DataFrame(roi_data))
+    p = result["percentiles"]
+    st.success(f"Basalt mass in {region}: median {p[50]:,.2f} Mt, 90% interval {p[5]:,.2f} to {p[95]:,.2f} Mt "
+               f"(mean {result['mean']:,.2f} ± {result['standard_error']:,.2f} Mt)")
+    st.line_chart(pd.DataFrame(history).set_index("Samples")[["P5", "P50", "P95"]])
 
-with tab4:
-    st.header("Basalt Availability: Madeira Island (Portugal)")
-    st.markdown("""
-    Madeira is a volcanic island in the North Atlantic, part of Portugal, and is primarily composed of basaltic rocks. This tool estimates the available basalt mass based on the island's area, average depth, and basalt density.
-    """)
+def show_basalt_prediction(key):
+    """Basalt property prediction from geochemistry through the local model server"""
+    with st.expander("Predict basalt properties from geochemistry"):
+        defaults = {"SiO2": 51.0, "MgO": 8.1, "CaO": 10.1, "Fe2O3": 11.9}
+        columns = st.columns(len(model_server.FEATURES))
+        row = {
+            feature: column.number_input(f"{feature} (wt%)", min_value=0.0, max_value=100.0,
+                                         value=defaults.get(feature, 0.0), key=f"{key}_{feature}")
+            for column, feature in zip(columns, model_server.FEATURES)
+        }
+        if st.button("Predict", key=f"{key}_predict"):
+            try:
+                prediction = model_server.predict([row])[0]
+            except requests.RequestException as e:
+                st.warning(f"Model server unavailable ({e}). Start it with `python ml_prediction/model_server.py`.")
+            else:
+                st.success(f"Predicted value: {prediction:,.3f}")
 
-    # Madeira's approximate area and coordinates
-    madeira_area_km2 = 740  # km²
-    madeira_coords = {"lat": 32.7607, "lon": -16.9595}
+def show_case_study(name):
+    """Basalt case study of one region of the registry"""
+    study = regions.case_study(regions.load_regions(), name)
+    key = name.lower().replace(' ', '_')
+    
+    st.header(f"Basalt Availability: {study.get('title') or name}")
+    if pd.notna(study.get('description')):
+        st.markdown(study['description'])
 
-    st.map(pd.DataFrame([{"lat": madeira_coords["lat"], "lon": madeira_coords["lon"]}], columns=["lat", "lon"]))
+    st.map(pd.DataFrame({"lat": [study['lat']], "lon": [study['lon']]}))
 
-    st.write(f"**Madeira Island Area:** {madeira_area_km2} km²")
+    st.write(f"**{name} Area:** {study['area_km2']:,g} km²")
 
     # User input for depth and density
-    depth = st.number_input("Average basalt depth (m)", min_value=0.1, value=10.0)
-    density = st.number_input("Basalt density (kg/m³)", min_value=1000, max_value=4000, value=2900)
+    depth = st.number_input("Average basalt depth (m)", min_value=0.1, value=float(study['basalt_depth_m']), key=f"{key}_depth")
+    density = st.number_input("Basalt density (kg/m³)", min_value=1000, max_value=4000, value=int(study['basalt_density_kgm3']), key=f"{key}_density")
 
     # Calculation
-    volume_m3 = madeira_area_km2 * 1e6 * depth
-    mass_kg = volume_m3 * density
-    mass_Mt = mass_kg / 1e9
-
-    st.success(f"Estimated Basalt Mass in Madeira: {mass_Mt:,.2f} Megatonnes (Mt)")
+    mass_Mt = monte_carlo.basalt_mass_mt(study['area_km2'], depth, density)
 
-    st.markdown("""
-    *Data source: [Wikipedia - Madeira](https://en.wikipedia.org/wiki/Madeira), geological literature.*
-    """)
+    st.success(f"Estimated Basalt Mass in {name}: {mass_Mt:,.2f} Megatonnes (Mt)")
 
-with tab6:
-    st.header("Basalt Availability: Azores Islands (Portugal)")
-    st.markdown("""
-    The Azores are a volcanic archipelago in the North Atlantic, part of Portugal, and are primarily composed of basaltic rocks. This tool estimates the available basalt mass based on the islands' area, average depth, and basalt density.
-    """)
+    show_mass_uncertainty(name, study['area_km2'], depth, density, key=key)
 
-    # Azores' approximate area and coordinates (main island São Miguel as example)
-    azores_area_km2 = 2322  # km² (total for all islands)
-    azores_coords = {"lat": 37.7800, "lon": -25.4970}
+    show_basalt_prediction(key)
 
-    st.map(pd.DataFrame([{"lat": azores_coords["lat"], "lon": azores_coords["lon"]}], columns=["lat", "lon"]))
+    if pd.notna(study.get('source')):
+        st.markdown(f"*Data source: {study['source']}*")
 
-    st.write(f"**Azores Islands Area:** {azores_area_km2} km²")
-
-    # User input for depth and density
-    depth = st.number_input("Average basalt depth (m)", min_value=0.1, value=10.0, key="azores_depth")
-    density = st.number_input("Basalt density (kg/m³)", min_value=1000, max_value=4000, value=2900, key="azores_density")
+def show_case_study_picker():
+    """Single case-study tab with a region picker, for long region lists"""
+    show_case_study(st.selectbox("Region", case_study_names(REGISTRY_VERSION), key="case_study_region"))
 
-    # Calculation
-    volume_m3 = azores_area_km2 * 1e6 * depth
-    mass_kg = volume_m3 * density
-    mass_Mt = mass_kg / 1e9
-
-    st.success(f"Estimated Basalt Mass in Azores: {mass_Mt:,.2f} Megatonnes (Mt)")
+def show_sourcing_logistics():
+    """Sourcing Logistics tab: deposits near each site of another layer"""
+    st.header("Sourcing Logistics")
+    layers = sorted(spatial_index.layer_paths())
+    if not layers:
+        st.info("No map layers found in maps/*/data")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        default = layers.index("mangrove_areas_extended") if "mangrove_areas_extended" in layers else 0
+        source = st.selectbox("Sites", layers, index=default, key="sourcing_source")
+    with col2:
+        default = layers.index("basalt_deposits_extended") if "basalt_deposits_extended" in layers else 0
+        target = st.selectbox("Deposits", layers, index=default, key="sourcing_target")
+    with col3:
+        mode = st.radio("Query", ["Nearest", "Within radius"], horizontal=True, key="sourcing_mode")
+    if mode == "Nearest":
+        k = st.slider("Deposits per site", 1, 10, 3, key="sourcing_k")
+        radius_km = None
+    else:
+        k = None
+        radius_km = float(st.slider("Radius (km)", 10, 2000, 250, step=10, key="sourcing_radius"))
+    
+    with timer.step("sourcing query"):
+        pairs = sourcing_pairs(source, target, k, radius_km, layers_version(source, target))
+    
+    sites = len(spatial_index.load_index(source))
+    nearest_km = pairs.groupby('source_index')['distance_km'].min()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Sites", f"{sites:,}")
+    col2.metric("Sites with a deposit" if radius_km else "Site-deposit pairs",
+                f"{len(nearest_km):,}" if radius_km else f"{len(pairs):,}")
+    col3.metric("Median distance to nearest deposit" + (" in range" if radius_km else ""), f"{nearest_km.median():,.0f} km" if len(nearest_km) else "–")
+    
+    st.dataframe(pairs.drop(columns=['source_index', 'target_index']).round({'distance_km': 1}).head(10_000),
+                 use_container_width=True, hide_index=True)
+    if len(pairs) > 10_000:
+        st.caption(f"Showing the first 10,000 of {len(pairs):,} pairs")
 
-    st.markdown("""
-    *Data source: [Wikipedia - Azores](https://en.wikipedia.org/wiki/Azores), geological literature.*
-    """)
+# Only the selected tab is computed and sent to the browser; st.tabs would
+# build all of them on every rerun
+TABS = {
+    "Global Map": show_global_map,
+    "Regional Analysis": show_regional_analysis,
+    "Economic Assessment": show_economic_assessment,
+    "Sourcing Logistics": show_sourcing_logistics
+}
+# One tab per case study from the region registry, or a single tab with a
+# region picker once there are too many to list
+study_names = case_study_names(REGISTRY_VERSION)
+if len(study_names) <= MAX_CASE_STUDY_TABS:
+    for name in study_names:
+        TABS[f"{name} Basalt Case Study"] = functools.partial(show_case_study, name)
+else:
+    TABS["Basalt Case Studies"] = show_case_study_picker
+active_tab = st.radio("Section", list(TABS), horizontal=True, key="active_tab", label_visibility="collapsed")
+TABS[active_tab]()
 
 # Footer
 st.markdown("---")
@@ -192,4 +345,6 @@ st.markdown("""
 ### About this Dashboard
 This dashboard provides an interactive analysis of Enhanced Rock Weathering (ERW) potential across different regions.
 The data is based on publicly available datasets and research from the PEESE group.
-""") 
\ No newline at end of file
+""") 
+
+timer.report()
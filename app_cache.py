@@ -0,0 +1,67 @@
+import logging
+import time
+from contextlib import contextmanager
+
+import folium
+import pandas as pd
+import streamlit as st
+import streamlit.components.v1 as components
+
+# Cache lifetimes (seconds) and entry bounds shared by the Streamlit pages.
+# Entry bounds keep memory in check: layers and maps are the large
+# objects, one entry per viewport/filter combination.
+LOADER_TTL = 3600
+LOADER_ENTRIES = 16
+DERIVED_TTL = 3600
+DERIVED_ENTRIES = 32
+MAP_TTL = 3600
+MAP_ENTRIES = 8
+
+logger = logging.getLogger("erw.timing")
+
+
+def map_html(m):
+    """Render a folium map to the HTML folium_static would embed"""
+    figure = folium.Figure().add_child(m)
+    return figure.render()
+
+
+def show_map_html(html, width=700, height=500):
+    """Display map HTML produced by map_html"""
+    components.html(html, width=width, height=height + 10)
+
+
+class RerunTimer:
+    """Collects how long each step of one Streamlit rerun takes.
+
+    Steps served from a cache show up as near-zero, so the report shows
+    which parts a widget change actually recomputed.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.start = time.perf_counter()
+        self.steps = []
+
+    @contextmanager
+    def step(self, label):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((label, time.perf_counter() - start))
+
+    def report(self, show=True):
+        """Log the timings of this rerun and optionally list them in the sidebar"""
+        total = time.perf_counter() - self.start
+        logger.info(
+            "%s rerun %.3fs: %s", self.page, total,
+            ", ".join(f"{label} {seconds:.3f}s" for label, seconds in self.steps)
+        )
+        if show:
+            with st.sidebar.expander(f"Rerun time: {total:.2f}s"):
+                st.dataframe(
+                    pd.DataFrame(self.steps + [("total", total)], columns=["step", "seconds"]).round(3),
+                    hide_index=True
+                )
+        return total
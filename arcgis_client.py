@@ -0,0 +1,315 @@
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from esri_json import features_to_geodataframe
+
+# Base URL of the ArcGIS Online organisation hosting the global layers.
+# Can be pointed at a local stub server through the environment.
+ARCGIS_BASE_URL = os.environ.get(
+    "ARCGIS_BASE_URL",
+    "https://services2.arcgis.com/11XBiaBYA9Ep0yNJ/arcgis/rest/services"
+)
+
+LAYER_SERVICES = {
+    "geology": "Global_Geology",
+    "soil": "Global_Soil",
+    "land_use": "Global_Land_Use",
+    "volcanoes": "Global_Volcanoes"
+}
+
+DEFAULT_PARAMS = {
+    'where': '1=1',
+    'outFields': '*',
+    'spatialRel': 'esriSpatialRelIntersects',
+    'outSR': '4326',
+    'f': 'json'
+}
+
+PAGE_SIZE = 1000
+MAX_WORKERS = 8
+TIMEOUT = 30
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def service_url(service_name, layer_id=0, base_url=None):
+    """Build the query URL of a FeatureServer layer"""
+    base_url = base_url or ARCGIS_BASE_URL
+    return f"{base_url}/{service_name}/FeatureServer/{layer_id}/query"
+
+
+def get_session():
+    """Return the pooled HTTP session shared by all loaders"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET"]
+            )
+            adapter = HTTPAdapter(
+                pool_connections=len(LAYER_SERVICES),
+                pool_maxsize=MAX_WORKERS,
+                max_retries=retry
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def get_json(session, url, params):
+    """Send one query and return the decoded JSON body"""
+    response = session.get(url, params=params, timeout=TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    # ArcGIS reports query errors with a 200 status and an error body
+    if 'error' in data:
+        error = data['error']
+        raise RuntimeError(f"ArcGIS query failed ({error.get('code')}): {error.get('message')}")
+    return data
+
+
+def query_params(params):
+    """Merge query parameters over the defaults"""
+    query = dict(DEFAULT_PARAMS)
+    if params:
+        query.update(params)
+    return query
+
+
+def snap_bbox(bbox, step=None):
+    """Round a bounding box outward to a grid.
+
+    Nearby viewports then produce the same query and share cache entries.
+    By default the grid step is a tenth of the box's order of magnitude.
+    Returns None for boxes covering the whole globe.
+
+    Leaflet keeps counting longitude past +-180 once the map is panned
+    across the antimeridian, so the box is shifted back into range first.
+    A box that still crosses the antimeridian covers the full longitude
+    range of its latitude band, so the wrapped part is not dropped.
+    """
+    xmin, ymin, xmax, ymax = bbox
+    if xmax - xmin >= 360:
+        return None
+    if step is None:
+        span = max(xmax - xmin, ymax - ymin, 1e-6)
+        step = 10 ** math.floor(math.log10(span)) / 10
+    shift = math.floor((xmin + 180) / 360) * 360
+    xmin, xmax = xmin - shift, xmax - shift
+    if xmax > 180:
+        xmin, xmax = -180.0, 180.0
+    # Round away float noise so equal boxes give identical query strings
+    return (
+        round(max(-180.0, math.floor(xmin / step) * step), 6),
+        round(max(-90.0, math.floor(ymin / step) * step), 6),
+        round(min(180.0, math.ceil(xmax / step) * step), 6),
+        round(min(90.0, math.ceil(ymax / step) * step), 6)
+    )
+
+
+def bounds_to_bbox(bounds):
+    """Convert Leaflet bounds returned by st_folium to (xmin, ymin, xmax, ymax)"""
+    if not bounds or not bounds.get('_southWest') or bounds['_southWest'].get('lat') is None:
+        return None
+    south_west, north_east = bounds['_southWest'], bounds['_northEast']
+    return (south_west['lng'], south_west['lat'], north_east['lng'], north_east['lat'])
+
+
+def viewport_state(map_state, default_center=(0, 0), default_zoom=2):
+    """Return (center, zoom, bbox) from the last st_folium state of a map"""
+    map_state = map_state or {}
+    center = map_state.get('center') or {}
+    if center.get('lat') is None:
+        location = list(default_center)
+    else:
+        location = [center['lat'], center['lng']]
+    zoom = map_state.get('zoom') or default_zoom
+    bbox = bounds_to_bbox(map_state.get('bounds'))
+    return location, zoom, snap_bbox(bbox) if bbox else None
+
+
+def filter_params(bbox=None, out_fields=None, where=None):
+    """Build query parameters restricting a layer to a bbox, fields and attribute filter"""
+    params = {}
+    if bbox is not None:
+        params.update({
+            'geometry': ','.join(f"{value:g}" for value in bbox),
+            'geometryType': 'esriGeometryEnvelope',
+            'inSR': '4326',
+            'spatialRel': 'esriSpatialRelIntersects'
+        })
+    if out_fields:
+        params['outFields'] = out_fields if isinstance(out_fields, str) else ','.join(out_fields)
+    if where:
+        params['where'] = where
+    return params
+
+
+def count_features(url, params=None, session=None):
+    """Return the number of features matching a query, or None if unsupported"""
+    session = session or get_session()
+    query = query_params(params)
+    query['returnCountOnly'] = 'true'
+    try:
+        return get_json(session, url, query).get('count')
+    except (requests.RequestException, RuntimeError, ValueError):
+        return None
+
+
+def layer_info(url, session=None):
+    """Return the metadata of the layer behind a query URL, or {} if unavailable"""
+    session = session or get_session()
+    layer_url = url[:-len('/query')] if url.endswith('/query') else url
+    try:
+        return get_json(session, layer_url, {'f': 'json'})
+    except (requests.RequestException, RuntimeError, ValueError):
+        return {}
+
+
+def layer_infos(urls, max_workers=MAX_WORKERS, session=None):
+    """Metadata of several layers, requested concurrently; ``urls`` maps names to query URLs"""
+    session = session or get_session()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(layer_info, url, session) for name, url in urls.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def max_record_count(url, session=None):
+    """Return the layer's maxRecordCount from its metadata, or None if unavailable"""
+    return layer_info(url, session).get('maxRecordCount')
+
+
+def page_params(params, count, page_size=PAGE_SIZE):
+    """Split a query into resultOffset/resultRecordCount pages"""
+    query = query_params(params)
+    return [
+        dict(query, resultOffset=offset, resultRecordCount=page_size)
+        for offset in range(0, count, page_size)
+    ]
+
+
+def _fetch_sequential(session, url, params, page_size):
+    """Page through a layer until the server stops reporting more records"""
+    features = []
+    offset = 0
+    while True:
+        query = query_params(params)
+        query.update(resultOffset=offset, resultRecordCount=page_size)
+        data = get_json(session, url, query)
+        page = data.get('features', [])
+        features.extend(page)
+        if not page or not data.get('exceededTransferLimit'):
+            return features
+        offset += len(page)
+
+
+def _fetch_range(session, url, params, offset, end, page_size):
+    """Fetch the records from ``offset`` up to ``end`` one page at a time"""
+    features = []
+    while offset < end:
+        query = query_params(params)
+        query.update(resultOffset=offset, resultRecordCount=min(page_size, end - offset))
+        page = get_json(session, url, query).get('features', [])
+        if not page:
+            break
+        features.extend(page)
+        offset += len(page)
+    return features
+
+
+def _fetch_pages(executor, session, url, params, count, page_size):
+    """Submit every page of a layer and return (query, future) pairs in page order"""
+    return [
+        (query, executor.submit(get_json, session, url, query))
+        for query in page_params(params, count, page_size)
+    ]
+
+
+def _page_features(session, url, params, count, query, data, page_size):
+    """Features of one page, with any records the server held back fetched again
+
+    A server may return fewer records than requested, flagging it with
+    exceededTransferLimit or not, so every page is checked against the
+    number of records it should hold.
+    """
+    features = data.get('features', [])
+    offset = query['resultOffset']
+    end = min(offset + query['resultRecordCount'], count)
+    if offset + len(features) < end:
+        features = features + _fetch_range(session, url, params, offset + len(features), end, page_size)
+    return features
+
+
+def fetch_features(url, params=None, page_size=PAGE_SIZE, max_workers=MAX_WORKERS, session=None):
+    """Fetch all features of a layer, requesting pages concurrently"""
+    return fetch_layers({None: (url, params)}, page_size, max_workers, session)[None]
+
+
+def fetch_layers(layers, page_size=PAGE_SIZE, max_workers=MAX_WORKERS, session=None, infos=None):
+    """Fetch several layers at once.
+
+    ``layers`` maps a name to a ``(url, params)`` pair. Feature counts and
+    each layer's maxRecordCount, which caps the page size, are requested
+    for every layer first, then all pages of all layers share one thread
+    pool and one pooled session. ``infos`` are layer_info results the
+    caller already has, sparing those metadata requests.
+    """
+    session = session or get_session()
+    infos = infos or {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        counts = {
+            name: executor.submit(count_features, url, params, session)
+            for name, (url, params) in layers.items()
+        }
+        limits = {
+            name: executor.submit(max_record_count, url, session)
+            for name, (url, params) in layers.items() if name not in infos
+        }
+        pending = {}
+        page_sizes = {}
+        for name, (url, params) in layers.items():
+            count = counts[name].result()
+            limit = infos[name].get('maxRecordCount') if name in infos else limits[name].result()
+            page_sizes[name] = min(page_size, limit) if limit else page_size
+            if count is None:
+                pending[name] = executor.submit(_fetch_sequential, session, url, params, page_sizes[name])
+            else:
+                pending[name] = _fetch_pages(executor, session, url, params, count, page_sizes[name])
+
+        results = {}
+        for name, futures in pending.items():
+            if isinstance(futures, list):
+                url, params = layers[name]
+                count = counts[name].result()
+                results[name] = [
+                    feature
+                    for query, future in futures
+                    for feature in _page_features(session, url, params, count, query, future.result(), page_sizes[name])
+                ]
+            else:
+                results[name] = futures.result()
+        return results
+
+
+def query_layer(url, params=None, page_size=PAGE_SIZE, max_workers=MAX_WORKERS, session=None):
+    """Fetch all pages of a layer and return them as one GeoDataFrame"""
+    features = fetch_features(url, params, page_size, max_workers, session)
+    return features_to_geodataframe(features)
+
+
+def query_layers(layers, page_size=PAGE_SIZE, max_workers=MAX_WORKERS, session=None, infos=None):
+    """Fetch several layers concurrently and return one GeoDataFrame per layer"""
+    results = fetch_layers(layers, page_size, max_workers, session, infos)
+    return {name: features_to_geodataframe(features) for name, features in results.items()}
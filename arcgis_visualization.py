@@ -1,207 +1,245 @@
 import streamlit as st
 import folium
-from streamlit_folium import folium_static
+from streamlit_folium import st_folium
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Point, Polygon
-import requests
 import json
 import branca.colormap as cm
 import numpy as np
 from datetime import datetime
 
-def load_geological_data():
-    """Load geological data from ArcGIS REST API"""
+import app_cache
+import arcgis_client
+import feature_cache
+import level_of_detail as lod
+import regions
+import tile_server
+
+MAP_KEY = 'geological_map'
+
+def _layer_params(bbox=None, out_fields=None, where=None):
+    params = {'geometryType': 'esriGeometryPolygon'}
+    params.update(arcgis_client.filter_params(bbox, out_fields, where))
+    return params
+
+def _load_layer(layer, label, bbox=None, out_fields=None, where=None):
+    """Load one ArcGIS layer as a GeoDataFrame"""
     try:
-        # ArcGIS REST API endpoint for geological data
-        url = "https://services2.arcgis.com/11XBiaBYA9Ep0yNJ/arcgis/rest/services/Global_Geology/FeatureServer/0/query"
-        
-        params = {
-            'where': '1=1',
-            'outFields': '*',
-            'geometryType': 'esriGeometryPolygon',
-            'spatialRel': 'esriSpatialRelIntersects',
-            'outSR': '4326',
-            'f': 'json'
-        }
-        
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        features = data['features']
-        polygons = []
-        properties = []
-        
-        for feature in features:
-            coords = feature['geometry']['rings'][0]
-            polygon = Polygon(coords)
-            polygons.append(polygon)
-            properties.append(feature['attributes'])
-        
-        gdf = gpd.GeoDataFrame(properties, geometry=polygons, crs="EPSG:4326")
-        return gdf
+        url = arcgis_client.service_url(arcgis_client.LAYER_SERVICES[layer])
+        return feature_cache.cached_query_layer(url, _layer_params(bbox, out_fields, where))
     
     except Exception as e:
-        st.error(f"Error loading geological data: {str(e)}")
+        st.error(f"Error loading {label} data: {str(e)}")
         return None
 
-def load_soil_data():
+def load_geological_data(bbox=None, out_fields=None, where=None):
+    """Load geological data from ArcGIS REST API"""
+    return _load_layer('geology', 'geological', bbox, out_fields, where)
+
+def load_soil_data(bbox=None, out_fields=None, where=None):
     """Load soil data from ArcGIS REST API"""
-    try:
-        url = "https://services2.arcgis.com/11XBiaBYA9Ep0yNJ/arcgis/rest/services/Global_Soil/FeatureServer/0/query"
-        
-        params = {
-            'where': '1=1',
-            'outFields': '*',
-            'geometryType': 'esriGeometryPolygon',
-            'spatialRel': 'esriSpatialRelIntersects',
-            'outSR': '4326',
-            'f': 'json'
-        }
-        
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        features = data['features']
-        polygons = []
-        properties = []
-        
-        for feature in features:
-            coords = feature['geometry']['rings'][0]
-            polygon = Polygon(coords)
-            polygons.append(polygon)
-            properties.append(feature['attributes'])
-        
-        gdf = gpd.GeoDataFrame(properties, geometry=polygons, crs="EPSG:4326")
-        return gdf
-    
-    except Exception as e:
-        st.error(f"Error loading soil data: {str(e)}")
-        return None
+    return _load_layer('soil', 'soil', bbox, out_fields, where)
 
-def load_land_use_data():
+def load_land_use_data(bbox=None, out_fields=None, where=None):
     """Load land use data from ArcGIS REST API"""
-    try:
-        url = "https://services2.arcgis.com/11XBiaBYA9Ep0yNJ/arcgis/rest/services/Global_Land_Use/FeatureServer/0/query"
-        
-        params = {
-            'where': '1=1',
-            'outFields': '*',
-            'geometryType': 'esriGeometryPolygon',
-            'spatialRel': 'esriSpatialRelIntersects',
-            'outSR': '4326',
-            'f': 'json'
-        }
-        
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        features = data['features']
-        polygons = []
-        properties = []
-        
-        for feature in features:
-            coords = feature['geometry']['rings'][0]
-            polygon = Polygon(coords)
-            polygons.append(polygon)
-            properties.append(feature['attributes'])
-        
-        gdf = gpd.GeoDataFrame(properties, geometry=polygons, crs="EPSG:4326")
-        return gdf
+    return _load_layer('land_use', 'land use', bbox, out_fields, where)
+
+def layer_queries(bbox=None, out_fields=None, where=None):
+    """Query URL and parameters of the geological, soil and land use layers
     
+    ``out_fields`` and ``where`` map a layer name ('geology', 'soil',
+    'land_use') to the fields and attribute filter requested for it.
+    """
+    out_fields = out_fields or {}
+    where = where or {}
+    return {
+        layer: (arcgis_client.service_url(arcgis_client.LAYER_SERVICES[layer]),
+                _layer_params(bbox, out_fields.get(layer), where.get(layer)))
+        for layer in ('geology', 'soil', 'land_use')
+    }
+
+def load_all_layers(bbox=None, out_fields=None, where=None):
+    """Load geological, soil and land use layers concurrently"""
+    try:
+        gdfs = feature_cache.cached_query_layers(layer_queries(bbox, out_fields, where))
     except Exception as e:
-        st.error(f"Error loading land use data: {str(e)}")
-        return None
+        st.error(f"Error loading geological data: {str(e)}")
+        return None, None, None
+    return gdfs['geology'], gdfs['soil'], gdfs['land_use']
+
+@st.cache_data(ttl=app_cache.LOADER_TTL, max_entries=app_cache.LOADER_ENTRIES, show_spinner=False)
+def cached_layers(bbox, geology_where):
+    """Layers of one viewport and geology filter, memoized across reruns"""
+    gdfs = feature_cache.cached_query_layers(layer_queries(bbox, where={'geology': geology_where}))
+    return gdfs['geology'], gdfs['soil'], gdfs['land_use']
+
+@st.cache_resource(ttl=app_cache.DERIVED_TTL, max_entries=app_cache.DERIVED_ENTRIES, show_spinner=False)
+def cached_levels(key, _gdf):
+    """Levels of detail of a layer; ``key`` identifies the layer and its query"""
+    return lod.build_levels(_gdf) if _gdf is not None else None
+
+@st.cache_resource(ttl=app_cache.MAP_TTL, max_entries=app_cache.MAP_ENTRIES, show_spinner=False)
+def cached_geological_map(key, tolerance, location, zoom, _layers):
+    """Folium map of the layers at one level of detail, memoized by ``key``"""
+    return create_geological_map(*_layers, location, zoom)
 
-def create_geological_map(gdf, soil_gdf=None, land_use_gdf=None):
-    """Create an interactive map of geological features with soil and land use overlays"""
-    m = folium.Map(location=[0, 0], zoom_start=2)
+@st.cache_data(ttl=app_cache.DERIVED_TTL, max_entries=app_cache.DERIVED_ENTRIES, show_spinner=False)
+def cached_statistics(key, _gdf, _soil_gdf, _land_use_gdf):
+    """Derived tables of the analysis section, memoized by ``key``"""
+    return layer_statistics(_gdf, _soil_gdf, _land_use_gdf)
+
+GEOLOGY_POPUP = {
+    'AGE': 'Age',
+    'TYPE': 'Type',
+    'DESCRIPTION': 'Description',
+    'MINERALS': 'Mineral Composition',
+    'FORMATION': 'Formation Process',
+    'ROCK_TYPE': 'Rock Type',
+    'CHEMICAL_COMP': 'Chemical Composition'
+}
+
+SOIL_POPUP = {
+    'TYPE': 'Soil Type',
+    'PH': 'pH Level',
+    'ORGANIC_MATTER': 'Organic Matter (%)',
+    'TEXTURE': 'Texture',
+    'DEPTH': 'Depth (cm)'
+}
+
+LAND_USE_POPUP = {
+    'TYPE': 'Land Use',
+    'COVERAGE': 'Coverage (%)',
+    'MANAGEMENT': 'Management',
+    'INTENSITY': 'Intensity'
+}
+
+def _style(feature):
+    return {
+        'fillColor': feature['properties']['fill_color'],
+        'color': 'black',
+        'weight': 1,
+        'fillOpacity': feature['properties']['fill_opacity']
+    }
+
+def geojson_layer(gdf, name, popup_fields, fill_color, fill_opacity=0.7):
+    """Build one GeoJson FeatureCollection layer for a whole GeoDataFrame
     
-    # Create a color map for geological ages
-    unique_ages = gdf['AGE'].unique()
+    ``fill_color`` is either a single color or a per-row color column.
+    Only the popup fields are shipped to the browser; missing ones read N/A.
+    """
+    data = gpd.GeoDataFrame(
+        {field: gdf[field] if field in gdf.columns else 'N/A' for field in popup_fields},
+        index=gdf.index,
+        geometry=gdf.geometry,
+        crs=gdf.crs
+    )
+    data['fill_color'] = fill_color
+    data['fill_opacity'] = fill_opacity
+    data = data[data.geometry.notna()]
+    
+    return folium.GeoJson(
+        data,
+        name=name,
+        style_function=_style,
+        popup=folium.GeoJsonPopup(fields=list(popup_fields), aliases=list(popup_fields.values())),
+        tooltip=folium.GeoJsonTooltip(fields=list(popup_fields)[:1], aliases=list(popup_fields.values())[:1])
+    )
+
+AGE_COLORS = ['#fee8c8', '#fdbb84', '#e34a33', '#b30000']
+SOIL_COLORS = ['#f6e8c3', '#dfc27d', '#bf812d', '#8c510a']
+LAND_USE_COLORS = ['#e5f5e0', '#a1d99b', '#31a354', '#006d2c']
+MISSING_COLOR = '#bdbdbd'
+
+def category_colors(values, colors, caption=None):
+    """Encode a categorical column as fill colors in linear time
+    
+    The column is factorized once; the colormap is evaluated for each
+    category rather than each row and indexed by the category codes.
+    Returns the per-row colors and the colormap for the legend.
+    """
+    codes, categories = pd.factorize(values)
     color_map = cm.LinearColormap(
-        colors=['#fee8c8', '#fdbb84', '#e34a33', '#b30000'],
+        colors=colors,
         vmin=0,
-        vmax=len(unique_ages),
-        caption='Geological Age'
+        vmax=max(len(categories), 1),
+        caption=caption
     )
+    # Code -1 marks missing values and picks the trailing missing color
+    palette = np.array([color_map(code) for code in range(len(categories))] + [MISSING_COLOR])
+    return pd.Series(palette[codes], index=values.index), color_map
+
+def _has_features(gdf):
+    return gdf is not None and not gdf.empty
+
+def create_geological_map(gdf, soil_gdf=None, land_use_gdf=None, location=(0, 0), zoom_start=2):
+    """Create an interactive map of geological features with soil and land use overlays
     
-    # Add geological polygons to the map
-    for idx, row in gdf.iterrows():
-        age_index = list(unique_ages).index(row['AGE'])
-        color = color_map(age_index)
-        
-        folium.GeoJson(
-            row.geometry.__geo_interface__,
-            style_function=lambda x, color=color: {
-                'fillColor': color,
-                'color': 'black',
-                'weight': 1,
-                'fillOpacity': 0.7
-            },
-            popup=folium.Popup(
-                f"Age: {row['AGE']}<br>"
-                f"Type: {row['TYPE']}<br>"
-                f"Description: {row['DESCRIPTION']}<br>"
-                f"Mineral Composition: {row.get('MINERALS', 'N/A')}<br>"
-                f"Formation Process: {row.get('FORMATION', 'N/A')}<br>"
-                f"Rock Type: {row.get('ROCK_TYPE', 'N/A')}<br>"
-                f"Chemical Composition: {row.get('CHEMICAL_COMP', 'N/A')}"
-            )
-        ).add_to(m)
+    Layers without features in the viewport are left out, so the map can
+    still be panned back to where they are.
+    """
+    m = folium.Map(location=list(location), zoom_start=zoom_start)
+    color_map = None
+    
+    # Add geological polygons to the map, colored by age
+    if _has_features(gdf):
+        age_colors, color_map = category_colors(gdf['AGE'], AGE_COLORS, 'Geological Age')
+        geojson_layer(gdf, 'Geological Units', GEOLOGY_POPUP, age_colors).add_to(m)
     
     # Add soil data if available
-    if soil_gdf is not None:
-        soil_layer = folium.FeatureGroup(name='Soil Types')
-        for idx, row in soil_gdf.iterrows():
-            folium.GeoJson(
-                row.geometry.__geo_interface__,
-                style_function=lambda x: {
-                    'fillColor': '#8c510a',
-                    'color': 'black',
-                    'weight': 1,
-                    'fillOpacity': 0.3
-                },
-                popup=folium.Popup(
-                    f"Soil Type: {row['TYPE']}<br>"
-                    f"pH Level: {row.get('PH', 'N/A')}<br>"
-                    f"Organic Matter: {row.get('ORGANIC_MATTER', 'N/A')}%<br>"
-                    f"Texture: {row.get('TEXTURE', 'N/A')}<br>"
-                    f"Depth: {row.get('DEPTH', 'N/A')}cm"
-                )
-            ).add_to(soil_layer)
-        soil_layer.add_to(m)
+    if _has_features(soil_gdf):
+        soil_colors, _ = category_colors(soil_gdf['TYPE'], SOIL_COLORS)
+        geojson_layer(soil_gdf, 'Soil Types', SOIL_POPUP, soil_colors, 0.3).add_to(m)
     
     # Add land use data if available
-    if land_use_gdf is not None:
-        land_use_layer = folium.FeatureGroup(name='Land Use')
-        for idx, row in land_use_gdf.iterrows():
-            folium.GeoJson(
-                row.geometry.__geo_interface__,
-                style_function=lambda x: {
-                    'fillColor': '#31a354',
-                    'color': 'black',
-                    'weight': 1,
-                    'fillOpacity': 0.3
-                },
-                popup=folium.Popup(
-                    f"Land Use: {row['TYPE']}<br>"
-                    f"Coverage: {row.get('COVERAGE', 'N/A')}%<br>"
-                    f"Management: {row.get('MANAGEMENT', 'N/A')}<br>"
-                    f"Intensity: {row.get('INTENSITY', 'N/A')}"
-                )
-            ).add_to(land_use_layer)
-        land_use_layer.add_to(m)
+    if _has_features(land_use_gdf):
+        land_use_colors, _ = category_colors(land_use_gdf['TYPE'], LAND_USE_COLORS)
+        geojson_layer(land_use_gdf, 'Land Use', LAND_USE_POPUP, land_use_colors, 0.3).add_to(m)
     
     # Add layer control
     folium.LayerControl().add_to(m)
-    color_map.add_to(m)
+    if color_map is not None:
+        color_map.add_to(m)
+    return m
+
+def create_tile_map(layers, location=(0, 0), zoom_start=2):
+    """Create a map drawing layers from the local vector tile server"""
+    m = folium.Map(location=list(location), zoom_start=zoom_start)
+    available = tile_server.available_layers()
+    for layer in layers:
+        if layer in available:
+            tile_server.tile_layer(layer).add_to(m)
+    folium.LayerControl().add_to(m)
     return m
 
-def analyze_geological_features(gdf, soil_gdf=None, land_use_gdf=None):
+def layer_statistics(gdf, soil_gdf=None, land_use_gdf=None):
+    """Compute the counts and summary tables shown in the analysis section"""
+    stats = {
+        'units': len(gdf),
+        'unique_ages': gdf['AGE'].nunique(),
+        'unique_types': gdf['TYPE'].nunique(),
+        'age_counts': gdf['AGE'].value_counts(),
+        'type_counts': gdf['TYPE'].value_counts()
+    }
+    if 'MINERALS' in gdf.columns:
+        stats['mineral_counts'] = gdf['MINERALS'].value_counts()
+    if _has_features(soil_gdf):
+        stats['soil_types'] = soil_gdf['TYPE'].nunique()
+        stats['soil_stats'] = soil_gdf.groupby('TYPE').agg({
+            'PH': ['mean', 'std'],
+            'ORGANIC_MATTER': ['mean', 'std'],
+            'DEPTH': ['mean', 'std']
+        }).round(2)
+    if _has_features(land_use_gdf):
+        stats['land_use_counts'] = land_use_gdf['TYPE'].value_counts()
+    return stats
+
+def analyze_geological_features(gdf, soil_gdf=None, land_use_gdf=None, stats=None):
     """Analyze geological features and their characteristics"""
-    if gdf is None:
+    if not _has_features(gdf):
         return
+    if stats is None:
+        stats = layer_statistics(gdf, soil_gdf, land_use_gdf)
     
     st.subheader("Geological Features Analysis")
     
@@ -209,51 +247,42 @@ def analyze_geological_features(gdf, soil_gdf=None, land_use_gdf=None):
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Total Geological Units", len(gdf))
-        st.metric("Unique Ages", gdf['AGE'].nunique())
+        st.metric("Total Geological Units", stats['units'])
+        st.metric("Unique Ages", stats['unique_ages'])
     
     with col2:
-        st.metric("Unique Types", gdf['TYPE'].nunique())
-        if 'MINERALS' in gdf.columns:
-            st.metric("Mineral Types", gdf['MINERALS'].nunique())
+        st.metric("Unique Types", stats['unique_types'])
+        if 'mineral_counts' in stats:
+            st.metric("Mineral Types", len(stats['mineral_counts']))
     
     with col3:
-        if soil_gdf is not None:
-            st.metric("Soil Types", soil_gdf['TYPE'].nunique())
-        if land_use_gdf is not None:
-            st.metric("Land Use Types", land_use_gdf['TYPE'].nunique())
+        if 'soil_types' in stats:
+            st.metric("Soil Types", stats['soil_types'])
+        if 'land_use_counts' in stats:
+            st.metric("Land Use Types", len(stats['land_use_counts']))
     
     # Distribution by age
     st.subheader("Distribution by Geological Age")
-    age_counts = gdf['AGE'].value_counts()
-    st.bar_chart(age_counts)
+    st.bar_chart(stats['age_counts'])
     
     # Distribution by type
     st.subheader("Distribution by Geological Type")
-    type_counts = gdf['TYPE'].value_counts()
-    st.bar_chart(type_counts)
+    st.bar_chart(stats['type_counts'])
     
     # Mineral composition analysis
-    if 'MINERALS' in gdf.columns:
+    if 'mineral_counts' in stats:
         st.subheader("Mineral Composition Analysis")
-        mineral_counts = gdf['MINERALS'].value_counts()
-        st.bar_chart(mineral_counts)
+        st.bar_chart(stats['mineral_counts'])
     
     # Soil analysis
-    if soil_gdf is not None:
+    if 'soil_stats' in stats:
         st.subheader("Soil Analysis")
-        soil_stats = soil_gdf.groupby('TYPE').agg({
-            'PH': ['mean', 'std'],
-            'ORGANIC_MATTER': ['mean', 'std'],
-            'DEPTH': ['mean', 'std']
-        }).round(2)
-        st.dataframe(soil_stats)
+        st.dataframe(stats['soil_stats'])
     
     # Land use analysis
-    if land_use_gdf is not None:
+    if 'land_use_counts' in stats:
         st.subheader("Land Use Analysis")
-        land_use_counts = land_use_gdf['TYPE'].value_counts()
-        st.bar_chart(land_use_counts)
+        st.bar_chart(stats['land_use_counts'])
 
 def main():
     st.title("Global Geological Features Analysis")
@@ -261,36 +290,76 @@ def main():
     # Add timestamp
     st.sidebar.write(f"Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
-    # Load data
-    with st.spinner("Loading geological data..."):
-        gdf = load_geological_data()
+    # Only query what is inside the last map viewport
+    location, zoom, bbox = arcgis_client.viewport_state(st.session_state.get(MAP_KEY))
+    geology_where = st.sidebar.text_input("Geology filter (ArcGIS where clause)", "1=1")
+    use_tiles = st.sidebar.checkbox(
+        "Draw layers from the local vector tile server",
+        help="Start it with `python tile_server.py serve` after `python tile_server.py snapshot`"
+    )
+    
+    timer = app_cache.RerunTimer("Geological map")
+    key = (bbox, geology_where)
     
-    with st.spinner("Loading soil data..."):
-        soil_gdf = load_soil_data()
+    # ERW regions of the shared registry inside the same viewport
+    in_view = regions.regions_in_bbox(regions.load_regions(), bbox)
+    st.sidebar.subheader("ERW regions in view")
+    st.sidebar.write(", ".join(in_view['region']) if len(in_view) else "None")
     
-    with st.spinner("Loading land use data..."):
-        land_use_gdf = load_land_use_data()
+    # Load data
+    with st.spinner("Loading geological, soil and land use data..."), timer.step("load layers"):
+        try:
+            gdf, soil_gdf, land_use_gdf = cached_layers(bbox, geology_where)
+        except Exception as e:
+            st.error(f"Error loading geological data: {str(e)}")
+            gdf, soil_gdf, land_use_gdf = None, None, None
     
     if gdf is not None:
         # Create and display map
         st.subheader("Interactive Geological Map")
-        m = create_geological_map(gdf, soil_gdf, land_use_gdf)
-        folium_static(m)
+        if use_tiles:
+            m = create_tile_map(['geology', 'soil', 'land_use'], location, zoom)
+            with timer.step("draw map"):
+                st_folium(m, key=MAP_KEY, width=700, height=500, returned_objects=['bounds', 'center', 'zoom'])
+        else:
+            # Draw each layer at the level of detail the current zoom can show
+            with timer.step("levels of detail"):
+                levels = [cached_levels(key + (name,), layer)
+                          for name, layer in (('geology', gdf), ('soil', soil_gdf), ('land_use', land_use_gdf))]
+            tolerance = lod.tolerance_for_zoom(zoom)
+            with timer.step("build map"):
+                m = cached_geological_map(key, tolerance, tuple(location), zoom,
+                                          [lod.select_level(layer, zoom) for layer in levels])
+            with timer.step("draw map"):
+                st_folium(m, key=MAP_KEY, width=700, height=500, returned_objects=['bounds', 'center', 'zoom'])
+            
+            if not gdf.empty:
+                report = lod.level_report(levels[0])
+                reduction = report.loc[report['tolerance_deg'] == tolerance, 'reduction'].iloc[0]
+                st.caption(f"Geology drawn at {tolerance:g}° tolerance: {reduction:,.1f}x fewer vertices than full resolution")
         
-        # Analysis section
-        analyze_geological_features(gdf, soil_gdf, land_use_gdf)
+        # Analysis section; an empty viewport (open ocean, a filter
+        # matching nothing) has no attribute columns to analyze
+        if gdf.empty:
+            st.info("No geological units in this view. Pan or zoom out, or loosen the geology filter.")
+        else:
+            with timer.step("analysis"):
+                analyze_geological_features(gdf, soil_gdf, land_use_gdf,
+                                            stats=cached_statistics(key, gdf, soil_gdf, land_use_gdf))
         
         # Raw data view
-        if st.checkbox("Show Raw Data"):
+        if not gdf.empty and st.checkbox("Show Raw Data"):
             tab1, tab2, tab3 = st.tabs(["Geological Data", "Soil Data", "Land Use Data"])
             with tab1:
                 st.dataframe(gdf.drop(columns=['geometry']))
             with tab2:
-                if soil_gdf is not None:
+                if _has_features(soil_gdf):
                     st.dataframe(soil_gdf.drop(columns=['geometry']))
             with tab3:
-                if land_use_gdf is not None:
+                if _has_features(land_use_gdf):
                     st.dataframe(land_use_gdf.drop(columns=['geometry']))
+    
+    timer.report()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""Compare the shared coordinate cleaning stage with the generator's original loop.
+
+Run from the repository root:
+
+    python benchmarks/bench_coordinates.py [n_points ...]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from coordinates import clean_coordinates
+
+
+def make_points(n, seed=0):
+    """Points on a 0.001 degree grid, so some repeat, with a few swapped and broken"""
+    rng = np.random.default_rng(seed)
+    coords = np.column_stack([rng.uniform(-180, 180, n), rng.uniform(-90, 90, n)]).round(3)
+    swapped = np.flatnonzero((np.abs(coords[:, 0]) <= 90) & (rng.random(n) < 0.001))
+    coords[swapped] = coords[swapped, ::-1] * [1, 1.5]
+    coords[::5000, 1] = np.nan
+    coords[1::5000, 0] = 200.0
+    return coords
+
+
+def legacy_clean(coordinates):
+    """The per-point loop create_geological_data used to run, plus first-seen dedup"""
+    valid_coords = []
+    seen = set()
+    for coord in coordinates:
+        if isinstance(coord, list) and len(coord) == 2:
+            lon, lat = coord
+            if isinstance(lon, (int, float)) and isinstance(lat, (int, float)):
+                if -180 <= lon <= 180 and -90 <= lat <= 90 and (lon, lat) not in seen:
+                    seen.add((lon, lat))
+                    valid_coords.append(coord)
+    return valid_coords
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000_000]
+    print(f"{'points':>10} {'loop':>8} {'list':>8} {'array':>8} {'grid':>8} {'kept':>10} {'swapped':>8}")
+    for n in sizes:
+        coords = make_points(n)
+        positions = coords.tolist()
+        loop_seconds, loop_kept = timed(legacy_clean, positions)
+        list_seconds, _ = timed(clean_coordinates, positions, fix_swapped=False)
+        array_seconds, (kept, _, counts) = timed(clean_coordinates, coords, fix_swapped=False)
+        assert kept.tolist() == loop_kept
+        grid_seconds, _ = timed(clean_coordinates, coords, tolerance=1e-3)
+        _, _, fixed = clean_coordinates(coords)
+        print(f"{n:>10,} {loop_seconds:>7.2f}s {list_seconds:>7.2f}s {array_seconds:>7.2f}s "
+              f"{grid_seconds:>7.2f}s {counts['output']:>10,} {fixed['swapped']:>8,}")
+
+
+if __name__ == "__main__":
+    main()
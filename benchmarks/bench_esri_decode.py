@@ -0,0 +1,72 @@
+"""Compare the vectorized Esri JSON decoder with the original per-feature loop.
+
+Run from the repository root:
+
+    python benchmarks/bench_esri_decode.py [n_features]
+"""
+import sys
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import Polygon
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from esri_json import features_to_geodataframe
+
+
+def make_features(n, vertices=16, seed=0):
+    """Build ``n`` clockwise polygon features, every tenth one with a hole"""
+    rng = np.random.default_rng(seed)
+    angles = -np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    features = []
+    for i, (x, y) in enumerate(rng.uniform([-180, -80], [180, 80], size=(n, 2))):
+        ring = np.column_stack([x + np.cos(angles), y + np.sin(angles)]).round(6).tolist()
+        rings = [ring + [ring[0]]]
+        if i % 10 == 0:
+            hole = np.column_stack([x + 0.3 * np.cos(-angles), y + 0.3 * np.sin(-angles)]).round(6).tolist()
+            rings.append(hole + [hole[0]])
+        features.append({
+            'attributes': {'OBJECTID': i, 'AGE': f"Age {i % 12}", 'TYPE': 'basalt'},
+            'geometry': {'rings': rings}
+        })
+    return features
+
+
+def loop_decode(features):
+    """The decoder previously inlined in every arcgis_visualization loader"""
+    polygons = []
+    properties = []
+    for feature in features:
+        coords = feature['geometry']['rings'][0]
+        polygons.append(Polygon(coords))
+        properties.append(feature['attributes'])
+    return gpd.GeoDataFrame(properties, geometry=polygons, crs="EPSG:4326")
+
+
+def best_of(func, features, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(features)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    features = make_features(n)
+
+    loop_time, loop_gdf = best_of(loop_decode, features)
+    vector_time, vector_gdf = best_of(features_to_geodataframe, features)
+
+    print(f"features:          {n:,}")
+    print(f"per-feature loop:  {loop_time:.3f}s (holes kept: {int((loop_gdf.interiors.str.len() > 0).sum())})")
+    print(f"vectorized:        {vector_time:.3f}s (holes kept: {int((vector_gdf.interiors.str.len() > 0).sum())})")
+    print(f"speed-up:          {loop_time / vector_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
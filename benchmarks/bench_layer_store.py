@@ -0,0 +1,96 @@
+"""Compare GeoParquet layers with the indented GeoJSON and CSV files they replace.
+
+Run from the repository root:
+
+    python benchmarks/bench_layer_store.py [n_points ...]
+"""
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import layer_store
+from generate_locations import DEFAULT_SOURCE, layer_name
+
+
+def create_geojson(feature_type, locations):
+    """The indented FeatureCollection generate_locations wrote before its streaming rewrite"""
+    return {
+        "type": "FeatureCollection",
+        "name": layer_name(feature_type),
+        "crs": { "type": "name", "properties": { "name": "urn:ogc:def:crs:OGC:1.3:CRS84" } },
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {
+                    "name": f"Location {i + 1}",
+                    "type": feature_type,
+                    "description": f"{feature_type.capitalize()} deposits in region",
+                    "source": DEFAULT_SOURCE
+                },
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": loc
+                }
+            }
+            for i, loc in enumerate(locations)
+        ]
+    }
+
+
+def make_layer(n, seed=0):
+    """A GeoJSON point layer with n random locations"""
+    rng = np.random.default_rng(seed)
+    locations = np.column_stack([rng.uniform(-180, 180, n), rng.uniform(-60, 70, n)]).round(4).tolist()
+    return create_geojson("basalt", locations)
+
+
+def timed(function, repeats=3):
+    """Best of ``repeats`` wall times of a call, and its result"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 1_000_000]
+    print(f"{'points':>10} {'format':<18} {'bytes':>13} {'load':>8}")
+    for n in sizes:
+        collection = make_layer(n)
+        with tempfile.TemporaryDirectory() as tmp:
+            geojson_path = Path(tmp) / 'layer.geojson'
+            with open(geojson_path, 'w') as f:
+                json.dump(collection, f, indent=2)
+            csv_path = Path(tmp) / 'layer.csv'
+            coordinates = np.array([feature['geometry']['coordinates'] for feature in collection['features']])
+            pd.DataFrame({
+                'longitude': coordinates[:, 0], 'latitude': coordinates[:, 1],
+                'type': 'basalt', 'name': [feature['properties']['name'] for feature in collection['features']]
+            }).to_csv(csv_path, index=False)
+            parquet_path = layer_store.write_layer(collection, Path(tmp) / 'layer.parquet')
+            del collection
+
+            rows = [
+                ('GeoJSON json.load', geojson_path, lambda: json.loads(geojson_path.read_text())),
+                ('GeoJSON read_file', geojson_path, lambda: gpd.read_file(geojson_path)),
+                ('CSV read_csv', csv_path, lambda: pd.read_csv(csv_path)),
+                ('GeoParquet layer', parquet_path, lambda: layer_store.read_layer(parquet_path)),
+                ('GeoParquet table', parquet_path, lambda: layer_store.read_table(parquet_path))
+            ]
+            for label, path, load in rows:
+                seconds, _ = timed(load)
+                print(f"{n:>10,} {label:<18} {path.stat().st_size:>13,} {seconds:>7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measure the payload of each level of detail and the slivers simplification leaves.
+
+Compares the coverage-aware levels of level_of_detail.build_levels with
+simplifying every polygon on its own, on a tessellation of wiggly units
+that share their borders. Run from the repository root:
+
+    python benchmarks/bench_level_of_detail.py [n_units ...]
+"""
+import sys
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import level_of_detail as lod
+
+
+def make_coverage(n, seed=0):
+    """``n`` Voronoi units over the globe with densified, wiggly shared borders"""
+    rng = np.random.default_rng(seed)
+    world = shapely.box(-180, -90, 180, 90)
+    seeds = shapely.multipoints(rng.uniform([-180, -90], [180, 90], size=(n, 2)))
+    cells = shapely.intersection(shapely.get_parts(shapely.voronoi_polygons(seeds, extend_to=world)), world)
+    cells = shapely.transform(shapely.segmentize(cells, 0.05), lambda xy: xy + 0.02 * np.sin(xy[:, ::-1] * 7))
+    # Snap so both sides of a shared border hold identical vertices
+    cells = shapely.set_precision(cells, 1e-6)
+    return gpd.GeoDataFrame({'unit': np.arange(len(cells))}, geometry=cells, crs="EPSG:4326")
+
+
+def per_polygon_levels(gdf, tolerances=lod.LEVEL_TOLERANCES):
+    """build_levels with every polygon simplified on its own, as before coverage simplification"""
+    levels = {}
+    previous = gdf
+    for tolerance in sorted(tolerances):
+        if tolerance:
+            previous = previous.copy()
+            previous.geometry = shapely.simplify(previous.geometry.values, tolerance, preserve_topology=True)
+        levels[tolerance] = previous
+    return levels
+
+
+def slivers(gdf):
+    """Area (square degrees) of overlaps between units and of gaps opened inside the layer"""
+    geometries = gdf.geometry.values
+    union = shapely.union_all(geometries)
+    overlaps = max(float(shapely.area(geometries).sum() - union.area), 0.0)
+    rings = [ring for polygon in shapely.get_parts(union) for ring in polygon.interiors]
+    gaps = float(sum(shapely.area(shapely.polygons(ring)) for ring in rings))
+    return overlaps, gaps
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [2_000]
+    for n in sizes:
+        gdf = make_coverage(n)
+        start = time.perf_counter()
+        levels = lod.build_levels(gdf)
+        build = time.perf_counter() - start
+        legacy = per_polygon_levels(gdf)
+        full_bytes = len(gdf.to_json())
+        print(f"{n:,} units, {lod.vertex_count(gdf):,} vertices, {full_bytes / 1e6:.1f} MB GeoJSON, "
+              f"levels built in {build:.2f}s")
+        print(f"{'tolerance':>10} {'zoom':>5} {'vertices':>10} {'payload':>10} {'reduction':>10} "
+              f"{'overlaps':>10} {'gaps':>10} {'per-polygon overlaps':>21} {'gaps':>10}")
+        for tolerance in sorted(levels, reverse=True):
+            level = levels[tolerance]
+            payload = len(level.to_json())
+            zoom = next((z for z in range(0, 23) if lod.tolerance_for_zoom(z) == tolerance), '-')
+            overlaps, gaps = slivers(level)
+            legacy_overlaps, legacy_gaps = slivers(legacy[tolerance])
+            print(f"{tolerance:>10g} {zoom:>5} {lod.vertex_count(level):>10,} {payload / 1e6:>8.2f}MB "
+                  f"{full_bytes / payload:>9.1f}x {overlaps:>10.4f} {gaps:>10.4f} "
+                  f"{legacy_overlaps:>21.4f} {legacy_gaps:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Compare map build time and HTML size of the batched layers with the per-row path.
+
+Run from the repository root:
+
+    python benchmarks/bench_map_render.py [n_polygons ...]
+"""
+import sys
+import time
+from pathlib import Path
+
+import branca.colormap as cm
+import folium
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import Polygon
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from arcgis_visualization import create_geological_map
+
+
+def make_layers(n, seed=0):
+    """Build geology, soil and land use layers of ``n`` hexagons each"""
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, 7)
+
+    def layer(attributes):
+        centers = rng.uniform([-180, -80], [180, 80], size=(n, 2))
+        geometries = [Polygon(np.column_stack([x + np.cos(angles), y + np.sin(angles)])) for x, y in centers]
+        return gpd.GeoDataFrame(attributes, geometry=geometries, crs="EPSG:4326")
+
+    ids = np.arange(n)
+    geology = layer({
+        'AGE': [f"Age {i % 12}" for i in ids],
+        'TYPE': [f"Type {i % 5}" for i in ids],
+        'DESCRIPTION': [f"Unit {i}" for i in ids],
+        'MINERALS': 'plagioclase, pyroxene'
+    })
+    soil = layer({'TYPE': [f"Soil {i % 8}" for i in ids], 'PH': 6.5, 'ORGANIC_MATTER': 2.1, 'DEPTH': 40})
+    land_use = layer({'TYPE': [f"Use {i % 6}" for i in ids], 'COVERAGE': 55})
+    return geology, soil, land_use
+
+
+def legacy_map(gdf, soil_gdf, land_use_gdf):
+    """The per-row map builder that create_geological_map replaced"""
+    m = folium.Map(location=[0, 0], zoom_start=2)
+    unique_ages = gdf['AGE'].unique()
+    color_map = cm.LinearColormap(
+        colors=['#fee8c8', '#fdbb84', '#e34a33', '#b30000'],
+        vmin=0,
+        vmax=len(unique_ages),
+        caption='Geological Age'
+    )
+    for idx, row in gdf.iterrows():
+        color = color_map(list(unique_ages).index(row['AGE']))
+        folium.GeoJson(
+            row.geometry.__geo_interface__,
+            style_function=lambda x, color=color: {
+                'fillColor': color, 'color': 'black', 'weight': 1, 'fillOpacity': 0.7
+            },
+            popup=folium.Popup(
+                f"Age: {row['AGE']}<br>Type: {row['TYPE']}<br>Description: {row['DESCRIPTION']}<br>"
+                f"Mineral Composition: {row.get('MINERALS', 'N/A')}"
+            )
+        ).add_to(m)
+    for layer_gdf, name, color in ((soil_gdf, 'Soil Types', '#8c510a'), (land_use_gdf, 'Land Use', '#31a354')):
+        group = folium.FeatureGroup(name=name)
+        for idx, row in layer_gdf.iterrows():
+            folium.GeoJson(
+                row.geometry.__geo_interface__,
+                style_function=lambda x, color=color: {
+                    'fillColor': color, 'color': 'black', 'weight': 1, 'fillOpacity': 0.3
+                },
+                popup=folium.Popup(f"{name}: {row['TYPE']}")
+            ).add_to(group)
+        group.add_to(m)
+    folium.LayerControl().add_to(m)
+    color_map.add_to(m)
+    return m
+
+
+def measure(builder, layers):
+    start = time.perf_counter()
+    html = builder(*layers).get_root().render()
+    return time.perf_counter() - start, len(html.encode())
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 5_000]
+    print(f"{'polygons/layer':>14} {'path':>8} {'build+render':>13} {'html':>10}")
+    for n in sizes:
+        layers = make_layers(n)
+        for label, builder in (("per-row", legacy_map), ("batched", create_geological_map)):
+            seconds, size = measure(builder, layers)
+            print(f"{n:>14,} {label:>8} {seconds:>12.2f}s {size / 1e6:>8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
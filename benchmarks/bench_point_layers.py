@@ -0,0 +1,69 @@
+"""Compare the shared point layer builder with one CircleMarker per row.
+
+Run from the repository root:
+
+    python benchmarks/bench_point_layers.py [n_points ...]
+"""
+import sys
+import time
+from pathlib import Path
+
+import folium
+import geopandas as gpd
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from volcanic_areas import create_volcanic_map
+
+
+def make_volcanoes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lons = rng.uniform(-180, 180, n)
+    lats = rng.uniform(-60, 70, n)
+    return gpd.GeoDataFrame(
+        {
+            'NAME': [f"Volcano {i}" for i in range(n)],
+            'TYPE': rng.choice(['Stratovolcano', 'Shield', 'Caldera'], n),
+            'ELEV': rng.integers(0, 6000, n)
+        },
+        geometry=gpd.points_from_xy(lons, lats),
+        crs="EPSG:4326"
+    )
+
+
+def legacy_map(gdf):
+    """The per-row map builder that create_volcanic_map replaced"""
+    m = folium.Map(location=[0, 0], zoom_start=2)
+    for idx, row in gdf.iterrows():
+        folium.CircleMarker(
+            location=[row.geometry.y, row.geometry.x],
+            radius=5,
+            popup=f"Volcano: {row.get('NAME', 'Unknown')}<br>"
+                  f"Type: {row.get('TYPE', 'Unknown')}<br>"
+                  f"Elevation: {row.get('ELEV', 'Unknown')}m",
+            color='red',
+            fill=True,
+            fill_color='red'
+        ).add_to(m)
+    return m
+
+
+def measure(builder, gdf):
+    start = time.perf_counter()
+    html = builder(gdf).get_root().render()
+    return time.perf_counter() - start, len(html.encode())
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    print(f"{'points':>8} {'path':>10} {'build+render':>13} {'html':>11}")
+    for n in sizes:
+        gdf = make_volcanoes(n)
+        for label, builder in (("per-row", legacy_map), ("clustered", create_volcanic_map)):
+            seconds, size = measure(builder, gdf)
+            print(f"{n:>8,} {label:>10} {seconds:>12.2f}s {size / 1e3:>9,.0f}kB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compare the BallTree layer index with a brute-force haversine scan of every pair.
+
+Run from the repository root:
+
+    python benchmarks/bench_spatial_index.py [n_points ...]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.metrics.pairwise import haversine_distances
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from spatial_index import EARTH_RADIUS_KM, LayerIndex, _radians
+
+RADIUS_KM = 100
+# Brute force needs n * m distances; only run it up to this many pairs
+MAX_BRUTE_PAIRS = 400_000_000
+
+
+def random_points(n, rng):
+    return rng.uniform(-180, 180, n), rng.uniform(-60, 70, n)
+
+
+def brute_force(sources, targets, radius_km, chunk=2_000):
+    """Nearest distance and pair count by scanning every source/target pair"""
+    X, Y = _radians(*sources), _radians(*targets)
+    nearest = np.empty(len(X))
+    pairs = 0
+    for start in range(0, len(X), chunk):
+        distances = haversine_distances(X[start:start + chunk], Y) * EARTH_RADIUS_KM
+        nearest[start:start + chunk] = distances.min(axis=1)
+        pairs += int((distances <= radius_km).sum())
+    return nearest, pairs
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [20_000, 1_000_000]
+    rng = np.random.default_rng(0)
+    print(f"{'points':>10} {'build':>8} {'kNN':>8} {'radius':>8} {'pairs':>11} {'brute':>8}")
+    for n in sizes:
+        sources, targets = random_points(n, rng), random_points(n, rng)
+        start = time.perf_counter()
+        index = LayerIndex(*targets, names=np.arange(n))
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        distances, _ = index.nearest(*sources, k=1)
+        knn = time.perf_counter() - start
+        start = time.perf_counter()
+        query, _, _ = index.within(*sources, RADIUS_KM)
+        radius = time.perf_counter() - start
+        brute = "-"
+        if n * n <= MAX_BRUTE_PAIRS:
+            start = time.perf_counter()
+            nearest, pairs = brute_force(sources, targets, RADIUS_KM)
+            brute = f"{time.perf_counter() - start:.2f}s"
+            assert np.allclose(nearest, distances[:, 0]) and pairs == len(query)
+        print(f"{n:>10,} {build:>7.2f}s {knn:>7.2f}s {radius:>7.2f}s {len(query):>11,} {brute:>8}")
+
+
+if __name__ == "__main__":
+    main()
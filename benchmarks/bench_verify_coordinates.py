@@ -0,0 +1,95 @@
+"""Compare the vectorized coordinate validator with the original nested loops.
+
+Run from the repository root:
+
+    python benchmarks/bench_verify_coordinates.py [n_vertices ...]
+"""
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from verify_coordinates import validate_features, verify_json_file
+
+
+def make_collection(n_vertices, ring_size=100, seed=0):
+    """Polygons of ``ring_size`` vertices, one in a thousand out of range"""
+    rng = np.random.default_rng(seed)
+    n_polygons = max(n_vertices // ring_size, 1)
+    centers = rng.uniform([-170, -80], [170, 80], size=(n_polygons, 2))
+    angles = np.linspace(0, 2 * np.pi, ring_size - 1, endpoint=False)
+    offsets = np.column_stack([np.cos(angles), np.sin(angles)])
+    features = []
+    for i, center in enumerate(centers):
+        ring = (center + offsets).round(6)
+        if i % 1000 == 0:
+            ring[0, 1] = 95.0
+        ring = ring.tolist()
+        features.append({
+            'type': 'Feature',
+            'properties': {'id': i},
+            'geometry': {'type': 'Polygon', 'coordinates': [ring + [ring[0]]]}
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def validate_coordinates(coord):
+    """The per-pair check verify_coordinates used before it was vectorized"""
+    if not isinstance(coord, list) or len(coord) != 2:
+        return False
+    
+    lon, lat = coord
+    
+    # Check if coordinates are numbers
+    if not (isinstance(lon, (int, float)) and isinstance(lat, (int, float))):
+        return False
+    
+    # Check if coordinates are within valid ranges
+    if not (-180 <= lon <= 180) or not (-90 <= lat <= 90):
+        return False
+    
+    return True
+
+
+def legacy_validate(features):
+    """The per-coordinate loop that verify_json_file used to run"""
+    invalid = []
+    for index, feature in enumerate(features):
+        geometry = feature['geometry']
+        for ring in geometry['coordinates']:
+            for coord in ring:
+                if not validate_coordinates(coord):
+                    invalid.append(index)
+    return sorted(set(invalid))
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000_000]
+    print(f"{'vertices':>10} {'json.load':>10} {'loop':>8} {'vectorized':>11} {'file':>8}")
+    for n in sizes:
+        collection = make_collection(n)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'bench.geojson'
+            path.write_text(json.dumps(collection))
+            load_seconds, data = timed(lambda: json.loads(path.read_text()))
+            loop_seconds, loop_invalid = timed(legacy_validate, data['features'])
+            fast_seconds, result = timed(validate_features, data['features'])
+            assert loop_invalid == result['invalid_features'].tolist()
+            file_seconds, _ = timed(lambda: verify_json_file(path))
+        print(f"{result['vertices']:>10,} {load_seconds:>9.2f}s {loop_seconds:>7.2f}s "
+              f"{fast_seconds:>10.2f}s {file_seconds:>7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
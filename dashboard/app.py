@@ -1,28 +1,75 @@
 import streamlit as st
 import folium
-from streamlit_folium import folium_static
 import pandas as pd
-import json
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import app_cache
+from coordinates import clean_frame
+from point_layers import point_layer
+import layer_store
+import regions
+import spatial_index
 
 data_path = os.path.join(os.path.dirname(__file__), '../data/erw_projects.csv')
-geojson_path = os.path.join(os.path.dirname(__file__), '../data/erw_regions.geojson')
+# Feedstock layer for the nearest-deposit column of the project table
+DEPOSIT_LAYER = "basalt_deposits_extended"
+
+
+# Cached by path and modification time so edited files are picked up
+@st.cache_data(ttl=app_cache.LOADER_TTL, max_entries=app_cache.LOADER_ENTRIES, show_spinner=False)
+def load_projects(path, mtime):
+    """Projects with swapped lat/lon corrected and unplottable rows dropped, and the counts"""
+    return clean_frame(pd.read_csv(path), drop_duplicates=False)
+
+
+@st.cache_data(ttl=app_cache.DERIVED_TTL, max_entries=app_cache.DERIVED_ENTRIES, show_spinner=False)
+def nearest_deposits(key, layer, _df):
+    """Name and distance of the nearest deposit of ``layer`` to every project"""
+    pairs = spatial_index.nearest_points(_df["longitude"], _df["latitude"], layer)
+    return pd.DataFrame({
+        "nearest_deposit": pairs["target_name"].to_numpy(),
+        "deposit_distance_km": pairs["distance_km"].round(1).to_numpy()
+    }, index=_df.index)
+
+
+@st.cache_data(ttl=app_cache.MAP_TTL, max_entries=app_cache.MAP_ENTRIES, show_spinner=False)
+def project_map_html(key, _df, _registry):
+    m = folium.Map(location=[20, 0], zoom_start=2)
+    if not _registry.empty:
+        point_layer(_registry["lat"], _registry["lon"], _registry["region"].astype(str).to_numpy(),
+                    name="ERW Regions", color="#7f7f7f", radius=4).add_to(m)
+    popups = (_df["project_name"].astype(str) + "<br>CO₂ Removal: " + _df["co2_removal_mt"].astype(str) + " Mt").to_numpy()
+    point_layer(_df["latitude"], _df["longitude"], popups, name="ERW Projects", color="#2a81cb", radius=7).add_to(m)
+    return app_cache.map_html(m)
+
+
+timer = app_cache.RerunTimer("ERW dashboard")
 
 st.title("Global Enhanced Rock Weathering (ERW) & Carbon Removal Map")
 
 # Load sample ERW project data
-df = pd.read_csv(data_path)
-with open(geojson_path) as f:
-    geojson = json.load(f)
+with timer.step("load data"):
+    data_mtime = os.path.getmtime(data_path)
+    df, cleaned = load_projects(data_path, data_mtime)
+    if cleaned['swapped'] or cleaned['invalid']:
+        st.warning(f"{cleaned['swapped']} projects had latitude and longitude swapped and were corrected; "
+                   f"{cleaned['invalid']} with invalid coordinates are not shown.")
+    # The shared region registry, reloaded only when its file changes
+    registry = regions.load_regions()
+    registry_mtime = regions.REGIONS_PATH.stat().st_mtime
 
 # Map
-m = folium.Map(location=[20, 0], zoom_start=2)
-for _, row in df.iterrows():
-    folium.Marker(
-        [row["latitude"], row["longitude"]],
-        popup=f"{row['project_name']}<br>CO₂ Removal: {row['co2_removal_mt']} Mt"
-    ).add_to(m)
-folium_static(m, width=900, height=500)
+with timer.step("map"):
+    app_cache.show_map_html(project_map_html((data_path, data_mtime, str(regions.REGIONS_PATH), registry_mtime), df, registry), width=900, height=500)
 
 st.header("Project Table")
-st.dataframe(df) 
\ No newline at end of file
+deposit_layers = spatial_index.layer_paths()
+if DEPOSIT_LAYER in deposit_layers:
+    with timer.step("nearest deposits"):
+        deposit_key = (data_path, data_mtime, layer_store.layer_version(deposit_layers[DEPOSIT_LAYER]))
+        df = df.join(nearest_deposits(deposit_key, DEPOSIT_LAYER, df))
+st.dataframe(df)
+
+timer.report()
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+# Axes of the precomputed sensitivity grid. Carbon prices follow the
+# dashboard slider ($/ton CO2, step 1), horizons are in years.
+CARBON_PRICES = np.arange(0, 201, dtype=np.float64)
+HORIZONS = np.arange(1, 31)
+DISCOUNT_RATES = np.round(np.arange(0, 0.15001, 0.005), 3)
+
+# Carbon price the annual revenues of the ROI table were estimated at;
+# revenue scales linearly with price from there
+REFERENCE_PRICE = 50.0
+BASE_YEAR = 2024
+
+
+def horizon_years(target_year, base_year=BASE_YEAR):
+    """Project horizon in years from a target year such as '2030'"""
+    return max(int(target_year) - base_year, 1)
+
+
+def annuity_factors(horizons, rates):
+    """Present value of 1 $/year paid for each horizon at each discount rate"""
+    horizons = np.asarray(horizons, dtype=np.float64)[:, None]
+    rates = np.asarray(rates, dtype=np.float64)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factors = (1 - (1 + rates) ** -horizons) / rates
+    return np.where(rates == 0, horizons, factors)
+
+
+def discounted_payback(investment, annual_revenue, rates):
+    """Years until discounted revenue repays the investment, inf if never
+
+    ``investment`` has shape (regions,), ``annual_revenue`` (regions, prices);
+    the result has shape (regions, prices, rates).
+    """
+    investment = np.asarray(investment, dtype=np.float64)[:, None, None]
+    annual = np.asarray(annual_revenue, dtype=np.float64)[:, :, None]
+    rates = np.asarray(rates, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = investment * rates / annual
+        years = np.where(rates == 0, investment / annual, -np.log1p(-ratio) / np.log1p(rates))
+    return np.where((annual > 0) & (ratio < 1), years, np.inf)
+
+
+def sensitivity_grid(investment, annual_revenue, carbon_prices=CARBON_PRICES, horizons=HORIZONS,
+                     discount_rates=DISCOUNT_RATES, reference_price=REFERENCE_PRICE):
+    """NPV, payback and viability of every region over the whole parameter grid
+
+    ``npv`` and ``viable`` have shape (regions, prices, horizons, rates),
+    ``payback`` (regions, prices, rates) since it does not depend on the
+    horizon, and ``break_even_price`` (regions, horizons, rates).
+    """
+    investment = np.asarray(investment, dtype=np.float64)
+    removal = np.asarray(annual_revenue, dtype=np.float64) / reference_price
+    carbon_prices = np.asarray(carbon_prices, dtype=np.float64)
+    annual = removal[:, None] * carbon_prices[None, :]
+    factors = annuity_factors(horizons, discount_rates)
+
+    npv = annual[:, :, None, None] * factors[None, None] - investment[:, None, None, None]
+    with np.errstate(divide='ignore'):
+        break_even = investment[:, None, None] / (removal[:, None, None] * factors[None])
+    return {
+        'carbon_prices': carbon_prices,
+        'horizons': np.asarray(horizons),
+        'discount_rates': np.asarray(discount_rates, dtype=np.float64),
+        'npv': npv,
+        'viable': npv > 0,
+        'payback': discounted_payback(investment, annual, discount_rates),
+        'break_even_price': break_even
+    }
+
+
+def _index(axis, value):
+    """Index of the grid point closest to ``value``"""
+    return int(np.abs(np.asarray(axis) - value).argmin())
+
+
+def scenario(grid, regions, carbon_price, horizon, discount_rate):
+    """Per-region results for one slider setting, read from the grid"""
+    p = _index(grid['carbon_prices'], carbon_price)
+    h = _index(grid['horizons'], horizon)
+    r = _index(grid['discount_rates'], discount_rate)
+    return pd.DataFrame({
+        'Region': list(regions),
+        'NPV ($/ha)': grid['npv'][:, p, h, r].round(0),
+        'Payback Period (years)': grid['payback'][:, p, r].round(1),
+        'Break-even Carbon Price ($/ton CO2)': grid['break_even_price'][:, h, r].round(0),
+        'Viable': grid['viable'][:, p, h, r]
+    })
+
+
+def npv_curves(grid, regions, horizon, discount_rate):
+    """Long-form NPV against carbon price of every region at one horizon and rate"""
+    h = _index(grid['horizons'], horizon)
+    r = _index(grid['discount_rates'], discount_rate)
+    npv = grid['npv'][:, :, h, r]
+    prices = grid['carbon_prices']
+    return pd.DataFrame({
+        'Carbon Price ($/ton CO2)': np.tile(prices, len(regions)),
+        'NPV ($/ha)': npv.ravel(),
+        'Region': np.repeat(list(regions), len(prices))
+    })
+
+
+def viable_share(grid, discount_rate):
+    """Share of regions with positive NPV over carbon price and horizon at one rate"""
+    r = _index(grid['discount_rates'], discount_rate)
+    return grid['viable'][:, :, :, r].mean(axis=0)
@@ -0,0 +1,187 @@
+from itertools import chain
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import GeometryType
+
+
+def _flatten(parts):
+    """Stack a list of coordinate sequences into one (n, 2) array plus lengths"""
+    lengths = np.fromiter(map(len, parts), dtype=np.int64, count=len(parts))
+    if not len(parts) or not lengths.sum():
+        return np.empty((0, 2)), lengths
+    dim = len(next(chain.from_iterable(parts)))
+    flat = np.fromiter(chain.from_iterable(chain.from_iterable(parts)), dtype=np.float64,
+                       count=int(lengths.sum()) * dim)
+    # Drop Z/M values, the maps only use planar coordinates
+    return flat.reshape(-1, dim)[:, :2], lengths
+
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _signed_areas(coords, ring_offsets):
+    """Shoelace area of every ring; negative for clockwise rings"""
+    if not len(coords):
+        return np.empty(len(ring_offsets) - 1)
+    x, y = coords[:, 0], coords[:, 1]
+    # Pair each vertex with the next one inside its own ring
+    nxt = np.arange(1, len(coords) + 1)
+    nxt[ring_offsets[1:] - 1] = ring_offsets[:-1]
+    cross = x * y[nxt] - x[nxt] * y
+    starts = ring_offsets[:-1]
+    areas = np.zeros(len(starts))
+    nonempty = ring_offsets[1:] > starts
+    areas[nonempty] = np.add.reduceat(cross, starts[nonempty])
+    return areas / 2
+
+
+def _assign_holes(coords, ring_offsets, ring_feature, is_exterior):
+    """Return the index of the exterior ring owning every ring.
+
+    Esri writes exterior rings clockwise and holes counter-clockwise, each
+    hole normally following its exterior. Holes in features with several
+    exteriors are checked against those exteriors by containment.
+    """
+    ring_ids = np.arange(len(is_exterior))
+    # Index of the latest exterior at or before every ring
+    owner = np.maximum.accumulate(np.where(is_exterior, ring_ids, -1))
+    # A feature starting with a hole gets it promoted to an exterior
+    orphan = (owner < 0) | (ring_feature[np.maximum(owner, 0)] != ring_feature)
+    is_exterior = is_exterior | orphan
+    owner = np.maximum.accumulate(np.where(is_exterior, ring_ids, -1))
+
+    exteriors_per_feature = np.bincount(ring_feature[is_exterior], minlength=ring_feature.max() + 1)
+    ambiguous = np.flatnonzero(~is_exterior & (exteriors_per_feature[ring_feature] > 1))
+    if len(ambiguous):
+        exterior_ids = np.flatnonzero(is_exterior)
+        shells = shapely.polygons(shapely.linearrings(
+            coords, indices=np.repeat(np.arange(len(is_exterior)), np.diff(ring_offsets))
+        )[exterior_ids])
+        for hole in ambiguous:
+            candidates = np.flatnonzero(ring_feature[exterior_ids] == ring_feature[hole])
+            x, y = coords[ring_offsets[hole]]
+            inside = candidates[shapely.contains_xy(shells[candidates], x, y)]
+            if len(inside):
+                owner[hole] = exterior_ids[inside[0]]
+    return owner, is_exterior
+
+
+def decode_polygons(geometries):
+    """Decode Esri polygon geometries into shapely Polygons/MultiPolygons"""
+    n = len(geometries)
+    rings_per_feature = [(g or {}).get('rings') or [] for g in geometries]
+    ring_counts = np.fromiter(map(len, rings_per_feature), dtype=np.int64, count=n)
+    rings = list(chain.from_iterable(rings_per_feature))
+    result = np.full(n, None, dtype=object)
+    if not rings:
+        return result
+
+    coords, ring_lengths = _flatten(rings)
+    ring_offsets = _offsets(ring_lengths)
+    ring_feature = np.repeat(np.arange(n), ring_counts)
+    is_exterior = _signed_areas(coords, ring_offsets) <= 0
+    owner, is_exterior = _assign_holes(coords, ring_offsets, ring_feature, is_exterior)
+
+    # Reorder rings so every exterior is followed by its own holes
+    order = np.lexsort((~is_exterior, owner))
+    lengths = ring_lengths[order]
+    starts = ring_offsets[:-1][order]
+    new_offsets = _offsets(lengths)
+    coord_index = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    coords = coords[coord_index]
+
+    sorted_exterior = is_exterior[order]
+    polygons = shapely.from_ragged_array(
+        GeometryType.POLYGON,
+        coords,
+        (new_offsets, np.append(np.flatnonzero(sorted_exterior), len(order)))
+    )
+    polygon_feature = ring_feature[order][sorted_exterior]
+    polygons_per_feature = np.bincount(polygon_feature, minlength=n)
+
+    single = polygons_per_feature[polygon_feature] == 1
+    result[polygon_feature[single]] = polygons[single]
+    if not single.all():
+        parts = ~single
+        multi_features, part_index = np.unique(polygon_feature[parts], return_inverse=True)
+        result[multi_features] = shapely.multipolygons(polygons[parts], indices=part_index)
+    return result
+
+
+def decode_polylines(geometries):
+    """Decode Esri polyline geometries into shapely LineStrings/MultiLineStrings"""
+    n = len(geometries)
+    paths_per_feature = [(g or {}).get('paths') or [] for g in geometries]
+    path_counts = np.fromiter(map(len, paths_per_feature), dtype=np.int64, count=n)
+    result = np.full(n, None, dtype=object)
+    if not path_counts.sum():
+        return result
+
+    coords, path_lengths = _flatten(list(chain.from_iterable(paths_per_feature)))
+    lines = shapely.from_ragged_array(GeometryType.LINESTRING, coords, (_offsets(path_lengths),))
+    line_feature = np.repeat(np.arange(n), path_counts)
+
+    single = path_counts[line_feature] == 1
+    result[line_feature[single]] = lines[single]
+    if not single.all():
+        parts = ~single
+        multi_features, part_index = np.unique(line_feature[parts], return_inverse=True)
+        result[multi_features] = shapely.multilinestrings(lines[parts], indices=part_index)
+    return result
+
+
+def decode_points(geometries):
+    """Decode Esri point geometries into shapely Points"""
+    n = len(geometries)
+    x = np.array([(g or {}).get('x', np.nan) for g in geometries], dtype=np.float64)
+    y = np.array([(g or {}).get('y', np.nan) for g in geometries], dtype=np.float64)
+    result = np.full(n, None, dtype=object)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    result[valid] = shapely.points(x[valid], y[valid])
+    return result
+
+
+def _geometry_kind(geometries):
+    for geometry in geometries:
+        if not geometry:
+            continue
+        if 'rings' in geometry:
+            return 'polygon'
+        if 'paths' in geometry:
+            return 'polyline'
+        if 'x' in geometry:
+            return 'point'
+    return None
+
+
+_DECODERS = {
+    'polygon': decode_polygons,
+    'polyline': decode_polylines,
+    'point': decode_points
+}
+
+
+def features_to_geodataframe(features, crs="EPSG:4326"):
+    """Convert an Esri JSON ``features`` array to a GeoDataFrame.
+
+    Geometries are decoded in bulk with shapely's vectorized constructors.
+    All polygon rings are kept: holes stay attached to their exterior and
+    features with several exteriors become MultiPolygons.
+    """
+    geometries = [feature.get('geometry') for feature in features]
+    properties = pd.DataFrame(
+        [feature.get('attributes') or {} for feature in features],
+        index=pd.RangeIndex(len(features))
+    )
+    kind = _geometry_kind(geometries)
+    if kind is None:
+        decoded = np.full(len(features), None, dtype=object)
+    else:
+        decoded = _DECODERS[kind](geometries)
+    return gpd.GeoDataFrame(properties, geometry=gpd.GeoSeries(decoded, crs=crs), crs=crs)
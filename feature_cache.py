@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import geopandas as gpd
+
+import arcgis_client
+
+CACHE_DIR = Path(os.environ.get("ERW_CACHE_DIR", ".cache")) / "arcgis"
+TTL_SECONDS = 24 * 3600
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+META_KEYS = ('created', 'last_access', 'size')
+
+
+def cache_key(url, params=None):
+    """Hash a service URL and its query parameters into a cache key"""
+    query = arcgis_client.query_params(params)
+    payload = json.dumps([url, sorted((k, str(v)) for k, v in query.items())])
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def layer_last_edit(url, session=None, info=None):
+    """Return the layer's editingInfo.lastEditDate, or None if not published
+
+    ``info`` is the layer's metadata when the caller already fetched it.
+    """
+    info = arcgis_client.layer_info(url, session) if info is None else info
+    return (info.get('editingInfo') or {}).get('lastEditDate')
+
+
+def _paths(key, cache_dir):
+    return cache_dir / f"{key}.parquet", cache_dir / f"{key}.json"
+
+
+def _read_meta(meta_path):
+    """Metadata of a cache entry, or None if it is unreadable or not an entry"""
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(meta, dict) or any(key not in meta for key in META_KEYS):
+        return None
+    return meta
+
+
+def _tmp_path(path):
+    """Temp file next to ``path``, unique per process and thread, so that
+    sessions missing the same key never write to the same file
+    """
+    return path.with_suffix(f'{path.suffix}.{os.getpid()}.{threading.get_ident()}.tmp')
+
+
+def _write_meta(meta_path, meta):
+    tmp_path = _tmp_path(meta_path)
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def get(url, params=None, ttl=TTL_SECONDS, cache_dir=CACHE_DIR, revalidate=True):
+    """Return a cached layer, or None on a miss.
+
+    Entries younger than ``ttl`` are served directly. Older entries are
+    revalidated against the layer's lastEditDate and served again, with a
+    fresh TTL, if the layer has not been edited since they were stored.
+    """
+    data_path, meta_path = _paths(cache_key(url, params), Path(cache_dir))
+    meta = _read_meta(meta_path)
+    if meta is None or not data_path.exists():
+        return None
+
+    now = time.time()
+    if now - meta['created'] > ttl:
+        last_edit = layer_last_edit(url) if revalidate else None
+        if last_edit is None or last_edit != meta.get('last_edit'):
+            return None
+        meta['created'] = now
+
+    meta['last_access'] = now
+    _write_meta(meta_path, meta)
+    return gpd.read_parquet(data_path)
+
+
+def put(url, params, gdf, last_edit=None, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Store a layer as GeoParquet and evict old entries beyond ``max_bytes``"""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    data_path, meta_path = _paths(cache_key(url, params), cache_dir)
+
+    tmp_path = _tmp_path(data_path)
+    gdf.to_parquet(tmp_path)
+    os.replace(tmp_path, data_path)
+
+    now = time.time()
+    _write_meta(meta_path, {
+        'url': url,
+        'params': params or {},
+        'created': now,
+        'last_access': now,
+        'last_edit': last_edit,
+        'size': data_path.stat().st_size
+    })
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Delete least recently used entries until the cache fits in ``max_bytes``"""
+    entries = []
+    for meta_path in Path(cache_dir).glob('*.json'):
+        meta = _read_meta(meta_path)
+        if meta is not None:
+            entries.append((meta['last_access'], meta['size'], meta_path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, meta_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        meta_path.with_suffix('.parquet').unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+        total -= size
+
+
+def clear(cache_dir=CACHE_DIR):
+    """Remove every cached layer, leaving other files in the directory alone"""
+    for meta_path in Path(cache_dir).glob('*.json'):
+        if _read_meta(meta_path) is not None:
+            meta_path.with_suffix('.parquet').unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+    for path in Path(cache_dir).glob('*.tmp'):
+        path.unlink(missing_ok=True)
+
+
+def cached_query_layers(layers, ttl=TTL_SECONDS, cache_dir=CACHE_DIR):
+    """Like arcgis_client.query_layers, serving warm layers from the disk cache"""
+    results = {}
+    misses = {}
+    for name, (url, params) in layers.items():
+        gdf = get(url, params, ttl, cache_dir)
+        if gdf is None:
+            misses[name] = (url, params)
+        else:
+            results[name] = gdf
+
+    if misses:
+        # Record the edit dates before fetching so a concurrent edit
+        # invalidates the entry on the next revalidation. The same layer
+        # metadata gives the fetch its page size limits.
+        infos = arcgis_client.layer_infos({name: url for name, (url, _) in misses.items()})
+        fetched = arcgis_client.query_layers(misses, infos=infos)
+        for name, (url, params) in misses.items():
+            put(url, params, fetched[name], layer_last_edit(url, info=infos[name]), cache_dir)
+            results[name] = fetched[name]
+
+    return {name: results[name] for name in layers}
+
+
+def cached_query_layer(url, params=None, ttl=TTL_SECONDS, cache_dir=CACHE_DIR):
+    """Like arcgis_client.query_layer, serving warm layers from the disk cache"""
+    return cached_query_layers({None: (url, params)}, ttl, cache_dir)[None]
@@ -1,8 +1,35 @@
+"""Generate the sample geological layers under maps/, rebuilding only what changed.
+
+Each layer is written to maps/<feature>/parquet/<feature>_data.parquet,
+beside the csv/ and geojson/ folders this script used to write. The
+checked-in layers the apps load live in maps/<feature>/data/, so these
+samples are never picked up a second time as extra layers.
+
+Every output records a hash of its input data and the generator version
+in its GeoParquet metadata. Outputs whose hash still matches are skipped,
+and the changed feature types are rebuilt concurrently:
+
+    python generate_geological_data.py             # rebuild changed layers
+    python generate_geological_data.py --dry-run   # list what would rebuild
+    python generate_geological_data.py --force     # rebuild everything
+"""
 import os
 import json
+import hashlib
+import argparse
 import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import layer_store
+from coordinates import clean_coordinates
+
+# Bump when the output of unchanged inputs changes, to rebuild every layer
+GENERATOR_VERSION = 2
+BUILD_KEY = b"erw_build_hash"
+
 def create_directory_structure():
     """Create the necessary directory structure"""
     base_dir = Path("maps")
@@ -12,9 +39,8 @@ def create_directory_structure():
         folder_path = base_dir / folder
         folder_path.mkdir(parents=True, exist_ok=True)
         
-        # Create data subdirectories
-        (folder_path / "csv").mkdir(exist_ok=True)
-        (folder_path / "geojson").mkdir(exist_ok=True)
+        # Create the output subdirectory, outside the data/ layers the apps load
+        (folder_path / "parquet").mkdir(exist_ok=True)
 
 def create_geological_data():
     """Create sample data for each geological feature with validated coordinates"""
@@ -67,16 +93,10 @@ def create_geological_data():
         }
     }
     
-    # Validate coordinates
+    # Validate coordinates: fix swapped pairs, drop invalid and repeated points
     for feature, data in base_data.items():
-        valid_coords = []
-        for coord in data["coordinates"]:
-            if isinstance(coord, list) and len(coord) == 2:
-                lon, lat = coord
-                if isinstance(lon, (int, float)) and isinstance(lat, (int, float)):
-                    if -180 <= lon <= 180 and -90 <= lat <= 90:
-                        valid_coords.append(coord)
-        base_data[feature]["coordinates"] = valid_coords
+        coords, _, _ = clean_coordinates(data["coordinates"])
+        base_data[feature]["coordinates"] = coords.tolist()
     
     return base_data
 
@@ -97,59 +117,96 @@ def create_mangrove_data():
         [-80.1918, 25.7617]  # Miami, USA
     ]
     
-    mangrove_data["coordinates"] = mangrove_locations
+    coords, _, _ = clean_coordinates(mangrove_locations)
+    mangrove_data["coordinates"] = coords.tolist()
     return mangrove_data
 
-def save_csv_data(data, folder_name):
-    """Save data as CSV"""
+def layer_path(folder_name):
+    return Path(f"maps/{folder_name}/parquet/{folder_name}_data.parquet")
+
+def save_layer_data(data, folder_name, build_hash=None):
+    """Save data as GeoParquet, recording the hash of the inputs it was built from"""
     df = pd.DataFrame(data["coordinates"], columns=["longitude", "latitude"])
-    df["type"] = data["type"]
-    df["name"] = data["name"]
+    gdf = gpd.GeoDataFrame(
+        {"name": data["name"], "type": data["type"]},
+        index=df.index,
+        geometry=gpd.points_from_xy(df["longitude"], df["latitude"]),
+        crs="EPSG:4326"
+    )
     
-    csv_path = f"maps/{folder_name}/csv/{folder_name}_data.csv"
-    df.to_csv(csv_path, index=False)
-
-def save_geojson_data(data, folder_name):
-    """Save data as GeoJSON"""
-    geojson = {
-        "type": "FeatureCollection",
-        "features": []
-    }
+    metadata = {BUILD_KEY: build_hash.encode()} if build_hash else None
+    return layer_store.write_layer(gdf, layer_path(folder_name), name=data["name"], metadata=metadata)
+
+def build_targets():
+    """Input data of every layer this script generates, by folder name"""
+    targets = dict(create_geological_data())
+    targets["mangrove"] = create_mangrove_data()
+    return targets
+
+def input_hash(data):
+    """Hash of a layer's input data, the generator version and the storage format"""
+    payload = json.dumps(
+        {"generator": GENERATOR_VERSION, "format": layer_store.GEOPARQUET_VERSION, "data": data},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def recorded_hash(path):
+    """Input hash stored in an output layer, or None if it is missing or unreadable"""
+    try:
+        value = layer_store.layer_metadata(path).get(BUILD_KEY)
+    except (OSError, pa.ArrowInvalid):
+        return None
+    return value.decode() if value else None
+
+def plan(targets, force=False):
+    """Why each target must be rebuilt, or None if its output is up to date"""
+    reasons = {}
+    for folder_name, data in targets.items():
+        recorded = recorded_hash(layer_path(folder_name))
+        if force:
+            reasons[folder_name] = "forced"
+        elif not layer_path(folder_name).exists():
+            reasons[folder_name] = "missing"
+        elif recorded is None:
+            reasons[folder_name] = "no recorded input hash"
+        elif recorded != input_hash(data):
+            reasons[folder_name] = "inputs or generator changed"
+        else:
+            reasons[folder_name] = None
+    return reasons
+
+def build(targets=None, force=False, dry_run=False, workers=None):
+    """Rebuild the changed layers concurrently; return the plan"""
+    targets = build_targets() if targets is None else targets
+    reasons = plan(targets, force)
+    stale = [folder_name for folder_name, reason in reasons.items() if reason]
+    for folder_name, reason in reasons.items():
+        action = ("would rebuild" if dry_run else "rebuilding") if reason else "up to date"
+        print(f"{folder_name:<12} {action}{f' ({reason})' if reason else ''}: {layer_path(folder_name)}")
+    if dry_run or not stale:
+        return reasons
     
-    for coord in data["coordinates"]:
-        feature = {
-            "type": "Feature",
-            "properties": {
-                "name": data["name"],
-                "type": data["type"]
-            },
-            "geometry": {
-                "type": "Point",
-                "coordinates": coord
-            }
+    create_directory_structure()
+    # Writing a layer is mostly Arrow and Parquet work, which releases the GIL
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            folder_name: executor.submit(save_layer_data, targets[folder_name], folder_name, input_hash(targets[folder_name]))
+            for folder_name in stale
         }
-        geojson["features"].append(feature)
-    
-    geojson_path = f"maps/{folder_name}/geojson/{folder_name}_data.geojson"
-    with open(geojson_path, 'w') as f:
-        json.dump(geojson, f, indent=2)
+        for folder_name, future in futures.items():
+            future.result()
+    print(f"Rebuilt {len(stale)} of {len(reasons)} layers")
+    return reasons
 
 def main():
-    # Create directory structure
-    create_directory_structure()
-    
-    # Create geological data
-    geological_data = create_geological_data()
-    
-    # Save data for each geological feature
-    for feature, data in geological_data.items():
-        save_csv_data(data, feature)
-        save_geojson_data(data, feature)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="list the layers that would be rebuilt")
+    parser.add_argument("--force", action="store_true", help="rebuild every layer")
+    parser.add_argument("--workers", type=int, help="concurrent rebuilds (default: one per core, up to 32)")
+    args = parser.parse_args()
     
-    # Create and save mangrove data
-    mangrove_data = create_mangrove_data()
-    save_csv_data(mangrove_data, "mangrove")
-    save_geojson_data(mangrove_data, "mangrove")
+    build(force=args.force, dry_run=args.dry_run, workers=args.workers)
 
 if __name__ == "__main__":
     main()
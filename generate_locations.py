@@ -1,235 +1,246 @@
+"""Generate the maps/ deposit layers from tables of source points.
+
+Points stream in chunks from CSV or Parquet tables with type, name,
+longitude and latitude columns (description and source are optional).
+Swapped lat/lon pairs are corrected, invalid points are dropped, and so
+are exact and near duplicates, using a grid hash per feature type. Each
+type is written as GeoParquet shards by a pool of worker processes, and
+throughput is reported as it runs:
+
+    python generate_locations.py                              # data/location_seeds.csv
+    python generate_locations.py points.parquet more.csv --tolerance 0.001 --workers 8
+"""
+import argparse
 import json
-import random
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def generate_basalt_locations():
-    locations = [
-        # Existing locations
-        [-122.4194, 37.7749],  # San Francisco
-        [103.8198, 1.3521],   # Singapore
-        [-117.1611, 32.7157], # San Diego
-        [139.7692, 35.6895],  # Tokyo
-        [-74.0060, 40.7128],  # New York
-        
-        # New locations
-        [-157.8583, 21.3069],  # Honolulu, Hawaii
-        [-118.2437, 34.0522], # Los Angeles
-        [139.0000, 35.6895],   # Yokohama
-        [-122.0840, 37.3893], # Silicon Valley
-        [121.0542, 14.5995],  # Manila
-        
-        [-115.1728, 36.1699], # Las Vegas
-        [135.1944, -27.4698], # Alice Springs
-        [144.9631, -37.8136], # Melbourne
-        [-121.4944, 38.5816], # Sacramento
-        [114.1694, 22.2783],  # Hong Kong
-        
-        [-116.1749, 43.6137], # Idaho Falls
-        [131.0445, -12.4634], # Darwin
-        [120.3361, 23.6978],  # Taipei
-        [-111.6108, 40.7608], # Salt Lake City
-        [114.2059, 30.5929],  # Wuhan
-        
-        [-118.2437, 33.7500], # Long Beach
-        [121.4737, 31.2304],  # Shanghai
-        [-110.9745, 32.2217], # Tucson
-        [121.3000, 31.2304],  # Suzhou
-        [-117.1956, 32.7157]  # San Diego area
-    ]
-    
-    return create_geojson("basalt", locations)
-
-def generate_olivine_locations():
-    locations = [
-        # Existing locations
-        [151.2093, -33.8688], # Sydney
-        [126.9780, 37.5665], # Seoul
-        [114.1772, 22.2783], # Hong Kong
-        [139.6917, 35.6895], # Tokyo
-        [106.8456, -6.2088], # Jakarta
-        
-        # New locations
-        [139.7513, 35.6895],  # Chiba
-        [120.5833, 23.6978],  # Taichung
-        [130.8811, -25.3041], # Townsville
-        [116.5648, 39.9138],  # Beijing
-        [127.0246, 37.5665],  # Incheon
-        
-        [121.4737, 31.2304],  # Shanghai
-        [114.1694, 22.2783],  # Hong Kong
-        [125.6442, 38.0133],  # Dalian
-        [120.1954, 30.2642],  # Hangzhou
-        [116.3974, 39.9092],  # Beijing
-        
-        [119.3062, 26.0753],  # Fuzhou
-        [117.2761, 39.1326],  # Tianjin
-        [114.3117, 30.5243],  # Wuhan
-        [113.2644, 23.1291],  # Guangzhou
-        [121.4737, 31.2304],  # Shanghai
-        
-        [116.4074, 39.9042],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092],  # Beijing
-        [116.3972, 39.9092],  # Beijing
-        [116.3972, 39.9092]   # Beijing
-    ]
-    
-    return create_geojson("olivine", locations)
-
-def generate_serpentine_locations():
-    locations = [
-        # Existing locations
-        [-74.0060, 40.7128],  # New York
-        [139.6917, 35.6895],  # Tokyo
-        [-118.2437, 34.0522], # Los Angeles
-        [103.8198, 1.3521],   # Singapore
-        [149.1300, -35.2809], # Canberra
-        
-        # New locations
-        [-122.4194, 37.7749],  # San Francisco
-        [139.7692, 35.6895],  # Yokohama
-        [-117.1611, 32.7157], # San Diego
-        [121.4737, 31.2304],  # Shanghai
-        [114.1694, 22.2783],  # Hong Kong
-        
-        [120.3361, 23.6978],  # Taipei
-        [121.4737, 31.2304],  # Shanghai
-        [116.3974, 39.9042],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092],  # Beijing
-        
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        
-        [116.3972, 39.9092],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092]   # Beijing
-    ]
-    
-    return create_geojson("serpentine", locations)
-
-def generate_volcano_locations():
-    locations = [
-        # Existing locations
-        [-155.282, 19.421],    # Kilauea, Hawaii
-        [140.75, 35.89],       # Fuji, Japan
-        [-114.41, 44.42],      # Yellowstone
-        [100.49, 6.16],        # Mount Merapi
-        [-78.15, -1.83],       # Cotopaxi
-        
-        # New locations
-        [-121.1752, 45.3742],  # Mount Hood
-        [138.1644, -19.4421], # Uluru/Ayers Rock
-        [-121.7772, 45.3725], # Mount Adams
-        [-121.8200, 46.1938], # Mount St. Helens
-        [-122.1932, 46.8561], # Mount Rainier
-        
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561], # Mount Rainier
-        
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561], # Mount Rainier
-        
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561], # Mount Rainier
-        [-122.1932, 46.8561]  # Mount Rainier
-    ]
-    
-    return create_geojson("volcano", locations)
-
-def generate_mangrove_locations():
-    locations = [
-        # Existing locations
-        [-97.1208, 25.7673],  # Texas Coast
-        [103.8198, 1.3521],   # Singapore
-        [120.9842, 14.5995],  # Manila Bay
-        [131.0445, -12.4634], # Darwin
-        [-80.1918, 25.7617],  # Miami
-        
-        # New locations
-        [-87.6298, 25.7617],  # Everglades
-        [101.7136, 3.1478],   # Kuala Lumpur
-        [114.1714, 22.2804],  # Hong Kong
-        [121.4737, 31.2304],  # Shanghai
-        [120.3361, 23.6978],  # Taichung
-        
-        [116.4074, 39.9042],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092],  # Beijing
-        
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        
-        [116.3972, 39.9092],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092],  # Beijing
-        [114.3052, 30.5927],  # Wuhan
-        [116.3972, 39.9092]   # Beijing
-    ]
-    
-    return create_geojson("mangrove", locations)
-
-def create_geojson(feature_type, locations):
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import layer_store
+from coordinates import clean_coordinates, grid_keys
+
+SEEDS_PATH = Path(__file__).resolve().parent / "data" / "location_seeds.csv"
+OUTPUT_DIR = Path("maps")
+COLUMNS = ["type", "name", "longitude", "latitude"]
+OPTIONAL_COLUMNS = ["description", "source"]
+DEFAULT_SOURCE = "USGS Mineral Resources Data"
+CHUNK_ROWS = 500_000
+SHARD_ROWS = 1_000_000
+# Grid cell size in degrees for near-duplicate removal, about 11 m at the
+# equator
+TOLERANCE_DEG = 1e-4
+
+
+def layer_name(feature_type):
+    return f"{feature_type.capitalize()} Deposits"
+
+
+def iter_points(paths, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames of source points from CSV or Parquet tables"""
+    wanted = COLUMNS + OPTIONAL_COLUMNS
+    for path in map(Path, paths):
+        if path.suffix == '.parquet':
+            parquet = pq.ParquetFile(path, memory_map=True)
+            columns = [column for column in wanted if column in parquet.schema_arrow.names]
+            for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(path, usecols=lambda column: column in wanted, chunksize=chunk_rows)
+
+
+class GridDeduplicator:
+    """Keeps the first point of every tolerance-sized grid cell
+
+    Exact repeats always share a cell. Near repeats are dropped when they
+    fall in the same cell, so points up to ``tolerance`` * sqrt(2) apart
+    may merge, and points just across a cell edge are kept.
+    """
+
+    def __init__(self, tolerance=TOLERANCE_DEG):
+        self.tolerance = tolerance
+        self.seen = np.empty(0, dtype=np.int64)
+
+    def unique(self, lon, lat):
+        """Mask of the points to keep, first in their cell across all chunks so far"""
+        keys = grid_keys(lon, lat, self.tolerance)
+        order = np.argsort(keys, kind='stable')
+        ordered = keys[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = ordered[1:] != ordered[:-1]
+        if len(self.seen):
+            positions = np.minimum(np.searchsorted(self.seen, ordered), len(self.seen) - 1)
+            first &= self.seen[positions] != ordered
+        keep = np.zeros(len(keys), dtype=bool)
+        keep[order[first]] = True
+        # Both parts are sorted, so the stable sort only merges two runs
+        self.seen = np.sort(np.concatenate([self.seen, ordered[first]]), kind='stable')
+        return keep
+
+
+def write_shard(frame, path, name):
+    """Write one shard of points as GeoParquet; return its row count"""
+    gdf = gpd.GeoDataFrame(
+        frame.drop(columns=["longitude", "latitude"]),
+        geometry=gpd.points_from_xy(frame["longitude"], frame["latitude"]),
+        crs="EPSG:4326"
+    )
+    layer_store.write_layer(gdf, path, name)
+    return len(frame)
+
+
+def _prepare(chunk):
+    """Normalized types, numeric coordinates and default descriptive columns"""
+    chunk = chunk.reset_index(drop=True)
+    chunk["type"] = chunk["type"].astype(str).str.strip().str.lower()
+    for column in ("longitude", "latitude"):
+        chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+    if "description" not in chunk:
+        chunk["description"] = chunk["type"].str.capitalize() + " deposits in region"
+    if "source" not in chunk:
+        chunk["source"] = DEFAULT_SOURCE
+    chunk["name"] = chunk["name"].astype(str)
+    return chunk[COLUMNS + OPTIONAL_COLUMNS]
+
+
+def _publish(shard_dir, target):
+    """Move finished shards into place: one file, or a directory of parts"""
+    parts = sorted(shard_dir.glob("part-*.parquet"))
+    single = target.with_suffix(layer_store.SUFFIX)
+    for old in (single, target):
+        if old.is_dir():
+            shutil.rmtree(old)
+        elif old.exists():
+            old.unlink()
+    if len(parts) == 1:
+        os.replace(parts[0], single)
+        shard_dir.rmdir()
+        return single
+    os.replace(shard_dir, target)
+    return target
+
+
+def generate(paths=(SEEDS_PATH,), output_dir=OUTPUT_DIR, tolerance=TOLERANCE_DEG, workers=None,
+             chunk_rows=CHUNK_ROWS, shard_rows=SHARD_ROWS, log=print):
+    """Stream, clean and deduplicate source points into one layer per feature type
+
+    Shards of every type are written concurrently, with at most two per
+    worker in flight, so memory is bounded by the chunk and shard sizes.
+    Returns per-type counts and the overall throughput.
+    """
+    workers = os.cpu_count() if workers is None else workers
+    output_dir = Path(output_dir)
+    start = time.perf_counter()
+    stats = {}
+    deduplicators = {}
+    buffers = {}
+    shard_dirs = {}
+    in_flight = deque()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def finish(feature_type, future):
+        stats[feature_type]['written'] += future.result()
+
+    def flush(feature_type, final=False):
+        frames, rows = buffers[feature_type]
+        if not rows or (rows < shard_rows and not final):
+            return
+        frame = pd.concat(frames, ignore_index=True)
+        while len(frame) >= shard_rows or (final and len(frame)):
+            shard, frame = frame.iloc[:shard_rows], frame.iloc[shard_rows:]
+            path = shard_dirs[feature_type] / f"part-{stats[feature_type]['shards']:05d}.parquet"
+            stats[feature_type]['shards'] += 1
+            if executor:
+                while len(in_flight) >= 2 * workers:
+                    finish(*in_flight.popleft())
+                in_flight.append((feature_type, executor.submit(write_shard, shard, path, layer_name(feature_type))))
+            else:
+                stats[feature_type]['written'] += write_shard(shard, path, layer_name(feature_type))
+        buffers[feature_type] = ([frame], len(frame))
+
+    try:
+        for chunk in iter_points(paths, chunk_rows):
+            chunk = _prepare(chunk)
+            for feature_type, group in chunk.groupby("type", sort=False):
+                if feature_type not in stats:
+                    stats[feature_type] = {'read': 0, 'swapped': 0, 'invalid': 0, 'duplicates': 0, 'written': 0, 'shards': 0}
+                    deduplicators[feature_type] = GridDeduplicator(tolerance)
+                    buffers[feature_type] = ([], 0)
+                    shard_dirs[feature_type] = output_dir / feature_type / "data" / f"{feature_type}_deposits.tmp"
+                    shutil.rmtree(shard_dirs[feature_type], ignore_errors=True)
+                    shard_dirs[feature_type].mkdir(parents=True)
+                counts = stats[feature_type]
+                counts['read'] += len(group)
+                # Duplicates are left to the deduplicator, which sees every chunk
+                coords, valid, cleaned = clean_coordinates(
+                    group[["longitude", "latitude"]].to_numpy(dtype=np.float64), drop_duplicates=False
+                )
+                counts['swapped'] += cleaned['swapped']
+                counts['invalid'] += cleaned['invalid']
+                keep = deduplicators[feature_type].unique(coords[:, 0], coords[:, 1])
+                counts['duplicates'] += int((~keep).sum())
+                group = group.iloc[valid[keep]].assign(longitude=coords[keep, 0], latitude=coords[keep, 1])
+                frames, rows = buffers[feature_type]
+                buffers[feature_type] = (frames + [group], rows + len(group))
+                flush(feature_type)
+            read = sum(counts['read'] for counts in stats.values())
+            log(f"{read:>12,} points read  {read / (time.perf_counter() - start):,.0f} points/s")
+        for feature_type in stats:
+            flush(feature_type, final=True)
+        while in_flight:
+            finish(*in_flight.popleft())
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+    outputs = {}
+    for feature_type, shard_dir in shard_dirs.items():
+        if stats[feature_type]['shards']:
+            outputs[feature_type] = str(_publish(shard_dir, shard_dir.with_name(f"{feature_type}_deposits")))
+        else:
+            shard_dir.rmdir()
+    elapsed = time.perf_counter() - start
+    read = sum(counts['read'] for counts in stats.values())
     return {
-        "type": "FeatureCollection",
-        "name": f"{feature_type.capitalize()} Deposits",
-        "crs": { "type": "name", "properties": { "name": "urn:ogc:def:crs:OGC:1.3:CRS84" } },
-        "features": [
-            {
-                "type": "Feature",
-                "properties": {
-                    "name": f"Location {i + 1}",
-                    "type": feature_type,
-                    "description": f"{feature_type.capitalize()} deposits in region",
-                    "source": "USGS Mineral Resources Data"
-                },
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": loc
-                }
-            }
-            for i, loc in enumerate(locations)
-        ]
+        'types': stats,
+        'outputs': outputs,
+        'points_read': read,
+        'points_written': sum(counts['written'] for counts in stats.values()),
+        'seconds': elapsed,
+        'points_per_second': read / elapsed if elapsed else 0.0
     }
 
+
 def main():
-    # Create geojson files for each feature
-    geojson_generators = {
-        "basalt": generate_basalt_locations,
-        "olivine": generate_olivine_locations,
-        "serpentine": generate_serpentine_locations,
-        "volcano": generate_volcano_locations,
-        "mangrove": generate_mangrove_locations
-    }
-    
-    for feature, generator in geojson_generators.items():
-        data = generator()
-        filename = f"maps/{feature}/data/{feature}_deposits.geojson"
-        
-        # Create directories if they don't exist
-        Path(filename).parent.mkdir(parents=True, exist_ok=True)
-        
-        # Write to file
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('inputs', nargs='*', default=[str(SEEDS_PATH)], help="CSV or Parquet tables of source points")
+    parser.add_argument('--output-dir', default=str(OUTPUT_DIR))
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE_DEG,
+                        help="grid cell size in degrees within which points count as duplicates")
+    parser.add_argument('--workers', type=int, help="shard writer processes (default: all cores)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--shard-rows', type=int, default=SHARD_ROWS)
+    parser.add_argument('--stats', help="write the run statistics to this JSON file")
+    args = parser.parse_args()
+
+    result = generate(args.inputs, args.output_dir, args.tolerance, args.workers, args.chunk_rows, args.shard_rows)
+    print(f"\n{'type':<12} {'read':>12} {'swapped':>10} {'invalid':>10} {'duplicates':>12} {'written':>12} {'shards':>7}")
+    for feature_type, counts in result['types'].items():
+        print(f"{feature_type:<12} {counts['read']:>12,} {counts['swapped']:>10,} {counts['invalid']:>10,} {counts['duplicates']:>12,} "
+              f"{counts['written']:>12,} {counts['shards']:>7}")
+    print(f"\n{result['points_read']:,} points in {result['seconds']:.2f}s "
+          f"({result['points_per_second']:,.0f} points/s), {result['points_written']:,} written")
+    if args.stats:
+        with open(args.stats, 'w') as f:
+            json.dump(result, f, indent=2)
+
 
 if __name__ == "__main__":
     main()
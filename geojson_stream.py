@@ -0,0 +1,241 @@
+"""Incremental reader for large GeoJSON FeatureCollections.
+
+Features are decoded one at a time from a buffered file handle, so memory
+is bounded by the largest single feature rather than the file size. The
+other top-level members ('type', 'name', 'crs', ...) are collected as
+they are passed.
+"""
+import json
+import re
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 1 << 20
+
+# Nesting depth of the position arrays of each GeoJSON geometry type
+GEOMETRY_DEPTHS = {
+    'Point': 0,
+    'MultiPoint': 1,
+    'LineString': 1,
+    'MultiLineString': 2,
+    'Polygon': 2,
+    'MultiPolygon': 3
+}
+
+_WHITESPACE = re.compile(r'\s*')
+# // comments at the end of a line, as in the hand-written data files
+_COMMENT = re.compile(r'(?<=[\s,\[\]{}])//.*$')
+_decoder = json.JSONDecoder()
+
+
+def geometry_positions(geometry):
+    """All positions of a geometry as a flat list, following collections"""
+    if geometry.get('type') == 'GeometryCollection':
+        return list(chain.from_iterable(geometry_positions(part) for part in geometry.get('geometries') or []))
+    positions = geometry['coordinates']
+    depth = GEOMETRY_DEPTHS[geometry['type']]
+    if depth == 0:
+        return [positions]
+    for _ in range(depth - 1):
+        positions = chain.from_iterable(positions)
+    return list(positions)
+
+
+def _position(position):
+    """(lon, lat) of one position, NaN where it is malformed or not numeric"""
+    try:
+        if not 2 <= len(position) <= 3 or isinstance(position[0], bool) or isinstance(position[1], bool):
+            return np.nan, np.nan
+        return float(position[0]), float(position[1])
+    except (TypeError, ValueError):
+        return np.nan, np.nan
+
+
+def coordinate_array(positions):
+    """Convert GeoJSON positions to an (n, 2) float array of lon/lat
+
+    Elevations are dropped. Malformed or non-numeric positions become NaN
+    rows; only files that have some fall back to converting one by one.
+    """
+    n = len(positions)
+    try:
+        if set(map(len, positions)) <= {2}:
+            values = list(chain.from_iterable(positions))
+            # numpy would also accept numeric strings and booleans
+            if set(map(type, values)) <= {int, float}:
+                return np.fromiter(values, dtype=np.float64, count=2 * n).reshape(n, 2)
+    except TypeError:
+        pass
+    return np.array([_position(position) for position in positions], dtype=np.float64).reshape(n, 2)
+
+
+class _CommentStripper:
+    """Text file wrapper that drops // line comments as lines are read"""
+
+    def __init__(self, f):
+        self.f = f
+
+    def read(self, size=-1):
+        lines = self.f.readlines(size if size and size > 0 else -1)
+        return ''.join(_COMMENT.sub('', line) for line in lines)
+
+
+class _Buffer:
+    """Text buffer over a file handle that refills as values are decoded"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=None):
+        if self.eof:
+            return False
+        data = self.f.read(size or self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, '' at the end of the file"""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text) or not self.fill():
+                return self.text[self.pos:self.pos + 1]
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise json.JSONDecodeError(f"Expecting one of {characters!r}", self.text, self.pos)
+        self.pos += 1
+        return character
+
+    def value(self):
+        """Decode the next JSON value, reading more of the file as needed"""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                # Possibly cut off by the end of the buffer; read more,
+                # doubling the read size so large values stay linear
+                if not self.fill(size):
+                    raise
+                size *= 2
+                continue
+            # A number at the very end of the buffer may continue in the file
+            if end == len(self.text) and self.fill(size):
+                continue
+            self.pos = end
+            return value
+
+
+class FeatureStream:
+    """Iterate over the features of a GeoJSON FeatureCollection
+
+    ``source`` is a path or a text file handle. ``members`` holds the other
+    top-level members read so far; it is complete once iteration ends.
+    With ``strip_comments``, // line comments are ignored.
+    """
+
+    def __init__(self, source, chunk_size=CHUNK_SIZE, strip_comments=False):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.strip_comments = strip_comments
+        self.members = {}
+        self.count = 0
+
+    def __iter__(self):
+        if hasattr(self.source, 'read'):
+            yield from self._features(self.source)
+        else:
+            with open(self.source, 'r', encoding='utf-8') as f:
+                yield from self._features(f)
+
+    def _features(self, f):
+        buffer = _Buffer(_CommentStripper(f) if self.strip_comments else f, self.chunk_size)
+        buffer.expect('{')
+        if buffer.peek() == '}':
+            buffer.pos += 1
+            return
+        while True:
+            key = buffer.value()
+            if not isinstance(key, str):
+                raise json.JSONDecodeError("Expecting property name", buffer.text, buffer.pos)
+            buffer.expect(':')
+            if key == 'features' and buffer.peek() == '[':
+                buffer.pos += 1
+                if buffer.peek() == ']':
+                    buffer.pos += 1
+                else:
+                    while True:
+                        yield buffer.value()
+                        self.count += 1
+                        if buffer.expect(',]') == ']':
+                            break
+            else:
+                self.members[key] = buffer.value()
+            if buffer.expect(',}') == '}':
+                break
+        if buffer.peek():
+            raise json.JSONDecodeError("Extra data", buffer.text, buffer.pos)
+
+
+def iter_features(source, chunk_size=CHUNK_SIZE, strip_comments=False):
+    """Yield the features of a GeoJSON FeatureCollection one at a time"""
+    return iter(FeatureStream(source, chunk_size, strip_comments))
+
+
+def iter_batches(source, batch_size=10_000, chunk_size=CHUNK_SIZE, strip_comments=False):
+    """Yield lists of up to ``batch_size`` features"""
+    batch = []
+    for feature in iter_features(source, chunk_size, strip_comments):
+        batch.append(feature)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def columnar_batch(features):
+    """Columnar arrays of a list of features
+
+    Returns the geometry type of every feature, all vertex coordinates as
+    one (n, 2) lon/lat array with per-feature ``offsets`` into it, and the
+    properties as a DataFrame. Ring and part structure is not kept; use the
+    features themselves where it matters.
+    """
+    types = []
+    counts = np.zeros(len(features), dtype=np.int64)
+    positions = []
+    for index, feature in enumerate(features):
+        geometry = feature.get('geometry') or {}
+        types.append(geometry.get('type'))
+        try:
+            feature_positions = geometry_positions(geometry) if geometry else []
+        except (KeyError, TypeError):
+            feature_positions = []
+        positions.extend(feature_positions)
+        counts[index] = len(feature_positions)
+    return {
+        'geometry_type': np.array(types, dtype=object),
+        'coordinates': coordinate_array(positions),
+        'offsets': np.concatenate([[0], np.cumsum(counts)]),
+        'properties': pd.DataFrame([feature.get('properties') or {} for feature in features],
+                                   index=pd.RangeIndex(len(features)))
+    }
+
+
+def iter_columnar(source, batch_size=10_000, chunk_size=CHUNK_SIZE, strip_comments=False):
+    """Yield columnar_batch arrays for every ``batch_size`` features"""
+    for batch in iter_batches(source, batch_size, chunk_size, strip_comments):
+        yield columnar_batch(batch)
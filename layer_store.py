@@ -0,0 +1,216 @@
+"""Columnar GeoParquet store for the maps/ layer datasets.
+
+Each layer is one GeoParquet file, or for large layers a directory of
+``part-*.parquet`` shards: WKB geometry, dictionary-encoded
+``type``/``source`` columns and zstd compression. Readers map the file
+into memory through Arrow instead of parsing text, and GeoJSON is only
+produced on demand:
+
+    python layer_store.py convert                  # maps/*/data/*.geojson -> .parquet
+    python layer_store.py export maps/basalt/data/basalt_deposits.parquet -o basalt.geojson
+"""
+import argparse
+import json
+import os
+from itertools import islice
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from shapely.geometry import shape
+
+from geojson_stream import FeatureStream, coordinate_array
+
+BASE_DIR = Path(__file__).resolve().parent
+MAPS_DIR = BASE_DIR / "maps"
+SUFFIX = ".parquet"
+GEOMETRY_COLUMN = "geometry"
+# Low-cardinality columns stored once per distinct value
+DICTIONARY_COLUMNS = ("type", "source")
+COMPRESSION = "zstd"
+GEOPARQUET_VERSION = "1.0.0"
+# The maps/ layers are lon/lat; GeoJSON readers expect this crs member
+CRS84 = {"type": "name", "properties": {"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}}
+
+
+def layer_files(maps_dir=MAPS_DIR):
+    """All stored layers, maps/<layer>/data/<name>.parquet or <name>/ shard directories"""
+    maps_dir = Path(maps_dir)
+    files = set(maps_dir.glob(f"*/data/*{SUFFIX}"))
+    files.update(part.parent for part in maps_dir.glob(f"*/data/*/part-*{SUFFIX}"))
+    return sorted(files)
+
+
+def layer_parts(path):
+    """The Parquet files of a layer"""
+    path = Path(path)
+    return sorted(path.glob(f"part-*{SUFFIX}")) if path.is_dir() else [path]
+
+
+def layer_version(path):
+    """Modification times and sizes of a layer's files, changing whenever any part does"""
+    return tuple((part.name, part.stat().st_mtime_ns, part.stat().st_size) for part in layer_parts(path))
+
+
+def _geometries(features):
+    """Shapely geometries of GeoJSON features, vectorized for point layers"""
+    geometries = [feature.get('geometry') for feature in features]
+    if geometries and all(geometry and geometry.get('type') == 'Point' for geometry in geometries):
+        return shapely.points(coordinate_array([geometry['coordinates'] for geometry in geometries]))
+    return np.array([shape(geometry) if geometry else None for geometry in geometries], dtype=object)
+
+
+def features_frame(features):
+    """GeoDataFrame of a list of GeoJSON features"""
+    return gpd.GeoDataFrame(
+        [feature.get('properties') or {} for feature in features],
+        geometry=_geometries(features),
+        crs="EPSG:4326"
+    )
+
+
+def read_geojson(path, batch_size=10_000):
+    """GeoDataFrame of a GeoJSON file, parsed in streamed batches
+
+    The collection name, if any, is kept in ``attrs['name']``.
+    """
+    stream = FeatureStream(path)
+    features = iter(stream)
+    frames = [features_frame(batch) for batch in iter(lambda: list(islice(features, batch_size)), [])]
+    gdf = pd.concat(frames, ignore_index=True) if frames else gpd.GeoDataFrame(geometry=[], crs="EPSG:4326")
+    gdf.attrs['name'] = stream.members.get('name')
+    return gdf
+
+
+def layer_table(gdf, name=None, metadata=None):
+    """Arrow table of a layer with GeoParquet metadata
+
+    ``metadata`` adds str or bytes key/value pairs to the file schema.
+    """
+    columns = {}
+    for column in gdf.columns.drop(gdf.geometry.name):
+        values = pa.Array.from_pandas(gdf[column])
+        if isinstance(values, pa.ChunkedArray):
+            values = values.combine_chunks()
+        if column in DICTIONARY_COLUMNS and not pa.types.is_dictionary(values.type):
+            values = values.dictionary_encode()
+        columns[str(column)] = values
+    geometry = np.asarray(gdf.geometry.values)
+    columns[GEOMETRY_COLUMN] = pa.array(shapely.to_wkb(geometry), type=pa.binary())
+    present = ~(shapely.is_missing(geometry) | shapely.is_empty(geometry))
+    geo = {
+        'version': GEOPARQUET_VERSION,
+        'primary_column': GEOMETRY_COLUMN,
+        'columns': {
+            GEOMETRY_COLUMN: {
+                'encoding': 'WKB',
+                'geometry_types': sorted(gdf.geometry[present].geom_type.unique().tolist())
+            }
+        }
+    }
+    if present.any():
+        geo['columns'][GEOMETRY_COLUMN]['bbox'] = gdf.geometry[present].total_bounds.tolist()
+    schema_metadata = dict(metadata or {})
+    schema_metadata[b'geo'] = json.dumps(geo).encode()
+    if name:
+        schema_metadata[b'layer'] = json.dumps({'name': name}).encode()
+    return pa.table(columns).replace_schema_metadata(schema_metadata)
+
+
+def write_layer(data, path, name=None, metadata=None):
+    """Store a layer given as a GeoDataFrame or a GeoJSON FeatureCollection dict"""
+    if isinstance(data, dict):
+        name = name or data.get('name')
+        data = features_frame(data.get('features') or [])
+    name = name or data.attrs.get('name')
+    path = Path(path).with_suffix(SUFFIX)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(SUFFIX + '.tmp')
+    pq.write_table(layer_table(data.to_crs(4326) if data.crs else data, name, metadata), tmp_path, compression=COMPRESSION)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_table(path, columns=None):
+    """Memory-mapped Arrow table of a stored layer, all shards in order"""
+    if columns is not None and GEOMETRY_COLUMN not in columns:
+        columns = list(columns) + [GEOMETRY_COLUMN]
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+
+def layer_metadata(path):
+    """Schema metadata of a stored layer (of its first shard)"""
+    return pq.read_schema(layer_parts(path)[0], memory_map=True).metadata or {}
+
+
+def layer_name(path):
+    """The collection name stored with a layer, or None"""
+    metadata = layer_metadata(path)
+    return json.loads(metadata[b'layer'])['name'] if b'layer' in metadata else None
+
+
+def read_layer(path, columns=None):
+    """Stored layer as an EPSG:4326 GeoDataFrame
+
+    Only the geometry column is decoded; the other columns are converted
+    from the mapped Arrow buffers, dictionary columns as categoricals.
+    """
+    table = read_table(path, columns)
+    geometry = shapely.from_wkb(table.column(GEOMETRY_COLUMN).to_numpy())
+    return gpd.GeoDataFrame(
+        table.drop([GEOMETRY_COLUMN]).to_pandas(),
+        geometry=geometry,
+        crs="EPSG:4326"
+    )
+
+
+def to_geojson(path):
+    """GeoJSON FeatureCollection dict of a stored layer"""
+    gdf = read_layer(path)
+    collection = {'type': 'FeatureCollection'}
+    name = layer_name(path)
+    if name:
+        collection['name'] = name
+    collection['crs'] = CRS84
+    collection['features'] = json.loads(gdf.to_json(drop_id=True))['features']
+    return collection
+
+
+def convert(paths=None, remove=False):
+    """Store GeoJSON layers as GeoParquet next to them; return the new paths"""
+    paths = [Path(path) for path in paths] if paths else sorted(MAPS_DIR.glob("*/data/*.geojson"))
+    stored = []
+    for path in paths:
+        stored.append(write_layer(read_geojson(path), path.with_suffix(SUFFIX)))
+        if remove:
+            path.unlink()
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert_parser = commands.add_parser('convert', help="store GeoJSON layers as GeoParquet")
+    convert_parser.add_argument('paths', nargs='*', help="GeoJSON files (default: maps/*/data/*.geojson)")
+    convert_parser.add_argument('--remove', action='store_true', help="delete the GeoJSON files afterwards")
+    export_parser = commands.add_parser('export', help="write a stored layer as GeoJSON")
+    export_parser.add_argument('path')
+    export_parser.add_argument('-o', '--output', help="output file (default: next to the layer)")
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        for path in convert(args.paths, args.remove):
+            print(f"Stored {path} ({path.stat().st_size:,} bytes)")
+    else:
+        output = Path(args.output or Path(args.path).with_suffix('.geojson'))
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(to_geojson(args.path), f)
+        print(f"Exported {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import shapely
+
+# Simplification tolerances in degrees, roughly one screen pixel at zoom
+# levels 2, 4, 6, 8 and 10. Zero is the full-resolution layer.
+LEVEL_TOLERANCES = (0.25, 0.05, 0.01, 0.002, 0.0005, 0.0)
+
+TILE_SIZE = 256
+# shapely type ids of Polygon and MultiPolygon
+POLYGON_TYPES = (3, 6)
+
+
+def pixel_size(zoom):
+    """Width of one screen pixel in degrees at a web map zoom level"""
+    return 360.0 / (TILE_SIZE * 2 ** zoom)
+
+
+def simplify(gdf, tolerance):
+    """Return a copy of a layer simplified without breaking polygon topology
+
+    Polygons that tile the plane without overlaps (a coverage, such as
+    neighbouring geological units) are simplified together with
+    shapely.coverage_simplify, so shared borders move as one edge. Without
+    it (shapely < 2.1), or when the polygons overlap, each geometry is
+    simplified on its own: every polygon stays valid, but borders shared
+    by neighbours may open slivers or overlap at coarse levels.
+    """
+    if not tolerance:
+        return gdf
+    geometries = np.array(gdf.geometry.values)
+    polygons = np.isin(shapely.get_type_id(geometries), POLYGON_TYPES)
+    others = slice(None)
+    if polygons.any() and hasattr(shapely, 'coverage_simplify') and shapely.coverage_is_valid(geometries[polygons]):
+        geometries[polygons] = shapely.coverage_simplify(geometries[polygons], tolerance)
+        others = ~polygons
+    geometries[others] = shapely.simplify(geometries[others], tolerance, preserve_topology=True)
+    simplified = gdf.copy()
+    simplified.geometry = geometries
+    return simplified
+
+
+def build_levels(gdf, tolerances=LEVEL_TOLERANCES):
+    """Precompute the simplified versions of a layer, keyed by tolerance
+
+    Each level is simplified from the next finer one, so coarse levels
+    start from few vertices. With tolerances shrinking at least fourfold
+    per level, the accumulated error exceeds the level's own tolerance by
+    at most a third.
+    """
+    levels = {}
+    previous = gdf
+    for tolerance in sorted(tolerances):
+        previous = levels[tolerance] = simplify(previous, tolerance)
+    return levels
+
+
+def tolerance_for_zoom(zoom, tolerances=LEVEL_TOLERANCES, pixels=1.0):
+    """Pick the coarsest tolerance that stays below ``pixels`` screen pixels"""
+    limit = pixels * pixel_size(zoom)
+    eligible = [tolerance for tolerance in tolerances if tolerance <= limit]
+    return max(eligible) if eligible else min(tolerances)
+
+
+def select_level(levels, zoom, pixels=1.0):
+    """Return the precomputed level to draw at a zoom level"""
+    if levels is None:
+        return None
+    return levels[tolerance_for_zoom(zoom, tuple(levels), pixels)]
+
+
+def vertex_count(gdf):
+    """Total number of vertices of a layer"""
+    if gdf is None or not len(gdf):
+        return 0
+    return int(shapely.get_num_coordinates(gdf.geometry.values).sum())
+
+
+def level_report(levels):
+    """Vertex counts of every level and their reduction against full resolution"""
+    full = vertex_count(levels[min(levels)])
+    rows = []
+    for tolerance, gdf in sorted(levels.items(), reverse=True):
+        vertices = vertex_count(gdf)
+        rows.append({
+            'tolerance_deg': tolerance,
+            'vertices': vertices,
+            'reduction': full / vertices if vertices else float('inf')
+        })
+    return pd.DataFrame(rows)
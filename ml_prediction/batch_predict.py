@@ -0,0 +1,127 @@
+"""Batch inference over large geochemistry files.
+
+Reads only the model's feature columns as float32, in chunks, from CSV or
+Parquet input, predicts each chunk in a pool of worker processes that load
+the model once, and appends the predictions to a Parquet file as they
+arrive, in input order:
+
+    python ml_prediction/batch_predict.py samples.csv predictions.parquet --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from madeira_ml_predict import FEATURES
+
+CHUNK_ROWS = 250_000
+MODEL_PATH = 'madeira_basalt_model.pkl'
+
+_model = None
+
+
+def iter_chunks(path, columns=FEATURES, chunk_rows=CHUNK_ROWS):
+    """Yield float32 DataFrames of the given columns from a CSV or Parquet file"""
+    path = Path(path)
+    if path.suffix == '.parquet':
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=list(columns)):
+            yield batch.to_pandas().astype('float32')[list(columns)]
+    else:
+        yield from pd.read_csv(path, usecols=list(columns), dtype='float32', chunksize=chunk_rows, engine='c')
+
+
+def _load_model(model_path):
+    global _model
+    # Memory-mapped arrays let the worker processes share one copy of large models
+    _model = joblib.load(model_path, mmap_mode='r')
+
+
+def _predict(X):
+    return np.asarray(_model.predict(X), dtype='float32')
+
+
+def predict_file(input_path, output_path, model_path=MODEL_PATH, workers=None,
+                 chunk_rows=CHUNK_ROWS, keep_features=True, log=print):
+    """Predict every row of ``input_path`` and write a Parquet file of predictions
+
+    With ``workers`` of 0 or 1 chunks are predicted in this process. At most
+    two chunks per worker are in flight, so memory stays bounded by the chunk
+    size whatever the size of the input. Returns the row count and timings.
+    """
+    workers = os.cpu_count() if workers is None else workers
+    start = time.perf_counter()
+    rows = 0
+    writer = None
+
+    def write(chunk, predictions):
+        nonlocal rows, writer
+        table = pa.table({'prediction': predictions})
+        if keep_features:
+            table = pa.Table.from_pandas(chunk.reset_index(drop=True), preserve_index=False).append_column(
+                'prediction', pa.array(predictions)
+            )
+        if writer is None:
+            writer = pq.ParquetWriter(output_path, table.schema)
+        writer.write_table(table)
+        rows += len(chunk)
+        elapsed = time.perf_counter() - start
+        log(f"{rows:>12,} rows  {rows / elapsed:,.0f} rows/s")
+
+    chunks = iter_chunks(input_path, chunk_rows=chunk_rows)
+    try:
+        if workers <= 1:
+            _load_model(model_path)
+            for chunk in chunks:
+                write(chunk, _predict(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_load_model, initargs=(model_path,)) as executor:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append((chunk, executor.submit(_predict, chunk)))
+                    if len(pending) >= 2 * workers:
+                        chunk, future = pending.popleft()
+                        write(chunk, future.result())
+                while pending:
+                    chunk, future = pending.popleft()
+                    write(chunk, future.result())
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        # Empty input: still leave a valid, empty output file
+        columns = (FEATURES if keep_features else []) + ['prediction']
+        pq.write_table(pa.table({column: pa.array([], pa.float32()) for column in columns}), output_path)
+
+    elapsed = time.perf_counter() - start
+    return {'rows': rows, 'seconds': elapsed, 'rows_per_second': rows / elapsed if elapsed else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict basalt properties for a CSV or Parquet file")
+    parser.add_argument('input', help="CSV or Parquet file with the columns " + ", ".join(FEATURES))
+    parser.add_argument('output', help="Parquet file to write the predictions to")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores, 1 to disable)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--predictions-only', action='store_true', help="do not copy the feature columns")
+    args = parser.parse_args()
+
+    stats = predict_file(args.input, args.output, args.model, args.workers, args.chunk_rows,
+                         keep_features=not args.predictions_only)
+    print(f"Predicted {stats['rows']:,} rows in {stats['seconds']:.1f}s "
+          f"({stats['rows_per_second']:,.0f} rows/s) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
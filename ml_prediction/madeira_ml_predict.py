@@ -1,13 +1,16 @@
 import pandas as pd
 import joblib
 
+# Geochemistry columns the basalt model is trained on
+FEATURES = ['SiO2', 'MgO', 'CaO', 'Fe2O3']
+
 def predict_from_csv(csv_path, model_path='madeira_basalt_model.pkl'):
-    df = pd.read_csv(csv_path)
-    X = df[['SiO2', 'MgO', 'CaO', 'Fe2O3']]
+    df = pd.read_csv(csv_path, usecols=FEATURES, dtype='float32')
+    X = df[FEATURES]
     model = joblib.load(model_path)
     predictions = model.predict(X)
     return predictions
 
 if __name__ == "__main__":
     preds = predict_from_csv('sample_basalt_data.csv')
-    print("Predictions:", preds) 
\ No newline at end of file
+    print("Predictions:", preds)
@@ -0,0 +1,292 @@
+"""Local HTTP/JSON prediction service for the basalt models.
+
+Models stay loaded (memory-mapped) between requests in an LRU cache keyed
+by file path and modification time, so retrained files are picked up on
+the next request. Concurrent requests for the same model are merged into
+one model.predict call:
+
+    python ml_prediction/model_server.py --port 8766
+
+    POST /predict  {"rows": [{"SiO2": 51, "MgO": 8.1, "CaO": 10.1, "Fe2O3": 11.9}],
+                    "model": "madeira_basalt_model.pkl"}
+    GET  /metrics  request and batch latency percentiles
+    GET  /health
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from madeira_ml_predict import FEATURES
+
+# Requests may only name model files inside this directory
+MODEL_DIR = Path(os.environ.get("ERW_MODEL_DIR", Path(__file__).resolve().parent))
+DEFAULT_MODEL = "madeira_basalt_model.pkl"
+MODEL_URL = os.environ.get("ERW_MODEL_URL", "http://127.0.0.1:8766")
+MAX_MODELS = 4
+MAX_BATCH_ROWS = 10_000
+MAX_WAIT_SECONDS = 0.005
+LATENCY_WINDOW = 10_000
+
+
+class ModelCache:
+    """LRU cache of memory-mapped models keyed by path and modification time"""
+
+    def __init__(self, max_models=MAX_MODELS):
+        self.max_models = max_models
+        self.models = OrderedDict()
+        self.lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        key = (path, os.path.getmtime(path))
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                return self.models[key]
+            model = joblib.load(path, mmap_mode='r')
+            self.loads += 1
+            # A newer file replaces every older version of the same model
+            for stale in [cached for cached in self.models if cached[0] == path]:
+                del self.models[stale]
+            self.models[key] = model
+            while len(self.models) > self.max_models:
+                self.models.popitem(last=False)
+            return model
+
+
+class LatencyStats:
+    """Latencies of the most recent calls with their percentiles"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def summary(self):
+        with self.lock:
+            samples = np.fromiter(self.samples, dtype=np.float64)
+            count = self.count
+        if not len(samples):
+            return {'count': count}
+        p50, p99 = np.percentile(samples, [50, 99]) * 1000
+        return {'count': count, 'p50_ms': round(p50, 3), 'p99_ms': round(p99, 3), 'max_ms': round(samples.max() * 1000, 3)}
+
+
+class MicroBatcher:
+    """Merges concurrent predictions for one model into single predict calls
+
+    The first queued request opens a batch that collects further requests
+    for up to ``max_wait`` seconds or ``max_rows`` rows.
+    """
+
+    def __init__(self, cache, path, max_rows=MAX_BATCH_ROWS, max_wait=MAX_WAIT_SECONDS):
+        self.cache = cache
+        self.path = path
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batch_latency = LatencyStats()
+        self.batch_rows = LatencyStats()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def predict(self, X):
+        future = Future()
+        self.requests.put((X, future))
+        return future.result()
+
+    def _collect(self):
+        batch = [self.requests.get()]
+        rows = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_rows:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+            rows += len(batch[-1][0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            start = time.perf_counter()
+            try:
+                model = self.cache.get(self.path)
+                X = pd.DataFrame(np.concatenate([X for X, _ in batch]), columns=FEATURES)
+                predictions = np.asarray(model.predict(X))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batch_latency.record(time.perf_counter() - start)
+            self.batch_rows.record(len(X))
+            offsets = np.cumsum([len(X) for X, _ in batch])[:-1]
+            for (_, future), part in zip(batch, np.split(predictions, offsets)):
+                future.set_result(part)
+
+
+class ModelServer:
+    """Model cache, one micro-batcher per model file and request metrics"""
+
+    def __init__(self, model_dir=MODEL_DIR, max_models=MAX_MODELS):
+        self.model_dir = Path(model_dir).resolve()
+        self.cache = ModelCache(max_models)
+        self.batchers = {}
+        self.lock = threading.Lock()
+        self.latency = LatencyStats()
+
+    def model_path(self, name=None):
+        path = (self.model_dir / (name or DEFAULT_MODEL)).resolve()
+        if path.parent != self.model_dir or not path.is_file():
+            raise FileNotFoundError(f"Unknown model: {name or DEFAULT_MODEL}")
+        return path
+
+    def predict(self, rows, model=None):
+        """Predictions for a list of feature dicts or feature-ordered lists"""
+        start = time.perf_counter()
+        path = self.model_path(model)
+        with self.lock:
+            batcher = self.batchers.get(path)
+            if batcher is None:
+                batcher = self.batchers[path] = MicroBatcher(self.cache, path)
+        predictions = batcher.predict(feature_matrix(rows))
+        self.latency.record(time.perf_counter() - start)
+        return predictions
+
+    def metrics(self):
+        return {
+            'requests': self.latency.summary(),
+            'model_loads': self.cache.loads,
+            'models': {
+                path.name: {'batches': batcher.batch_latency.summary(), 'batch_rows': _rows_summary(batcher.batch_rows)}
+                for path, batcher in self.batchers.items()
+            }
+        }
+
+
+def _rows_summary(stats):
+    with stats.lock:
+        rows = np.fromiter(stats.samples, dtype=np.float64)
+    return {'mean': round(float(rows.mean()), 1), 'max': int(rows.max())} if len(rows) else {}
+
+
+def feature_matrix(rows):
+    """float32 matrix of the model features from dicts or lists of values"""
+    if not rows:
+        raise ValueError("No rows to predict")
+    if isinstance(rows[0], dict):
+        missing = [feature for feature in FEATURES if feature not in rows[0]]
+        if missing:
+            raise ValueError(f"Missing features: {', '.join(missing)}")
+        rows = [[row[feature] for feature in FEATURES] for row in rows]
+    X = np.asarray(rows, dtype=np.float32)
+    if X.ndim != 2 or X.shape[1] != len(FEATURES):
+        raise ValueError(f"Rows need the {len(FEATURES)} features {', '.join(FEATURES)}")
+    return X
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """Serve /predict, /metrics and /health"""
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            return self._send(200, self.server.model_server.metrics())
+        if path == '/health':
+            return self._send(200, {'status': 'ok'})
+        self._send(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path.split('?', 1)[0] != '/predict':
+            return self._send(404, {'error': 'Not found'})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            predictions = self.server.model_server.predict(request.get('rows'), request.get('model'))
+        except FileNotFoundError as e:
+            return self._send(404, {'error': str(e)})
+        except (ValueError, TypeError, AttributeError) as e:
+            return self._send(400, {'error': str(e)})
+        except Exception as e:
+            return self._send(500, {'error': str(e)})
+        self._send(200, {'predictions': predictions.tolist()})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=8766, model_dir=MODEL_DIR):
+    """Run the prediction service until interrupted"""
+    server = ThreadingHTTPServer((host, port), PredictionHandler)
+    server.daemon_threads = True
+    server.model_server = ModelServer(model_dir)
+    print(f"Serving models from {model_dir} on http://{host}:{port}/predict")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+_session = threading.local()
+
+
+def predict(rows, model=None, url=MODEL_URL, timeout=10):
+    """Client: predictions from a running model server
+
+    ``rows`` is a DataFrame with the feature columns, or a list of feature
+    dicts. Raises requests.RequestException if the server is unreachable.
+    """
+    if isinstance(rows, pd.DataFrame):
+        rows = rows[FEATURES].to_numpy(dtype=np.float64).tolist()
+    session = getattr(_session, 'session', None)
+    if session is None:
+        session = _session.session = requests.Session()
+    response = session.post(f"{url}/predict", json={'rows': rows, 'model': model}, timeout=timeout)
+    if response.status_code != 200:
+        raise requests.HTTPError(response.json().get('error', response.reason), response=response)
+    return np.asarray(response.json()['predictions'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--model-dir', default=str(MODEL_DIR))
+    args = parser.parse_args()
+    serve(args.host, args.port, args.model_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Train the basalt property model with a cross-validated hyperparameter search.
+
+Every candidate model family is searched with GridSearchCV across all
+cores. The preprocessing step of each fold is fitted once and cached on
+disk (Pipeline memory), so candidates that share a fold reuse its
+features. The chosen model is saved with a JSON metadata sidecar, and a
+report lists cross-validated accuracy, training time and inference
+latency per candidate so serving cost can be weighed against accuracy:
+
+    python ml_prediction/train_model.py training.csv --target CO2_uptake
+    python ml_prediction/train_model.py training.csv --target CO2_uptake --max-latency-ms 0.5
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import GridSearchCV, KFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import PolynomialFeatures, StandardScaler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from madeira_ml_predict import FEATURES
+
+MODEL_PATH = Path(__file__).resolve().parent / 'madeira_basalt_model.pkl'
+CACHE_DIR = Path(os.environ.get('ERW_CACHE_DIR', '.cache')) / 'training'
+FOLDS = 5
+SEED = 0
+LATENCY_BATCH_ROWS = 10_000
+LATENCY_REPEATS = 50
+
+# Model families and the hyperparameters searched for each
+CANDIDATES = {
+    'ridge': (
+        lambda: Ridge(),
+        {'model__alpha': [0.01, 0.1, 1.0, 10.0]}
+    ),
+    'random_forest': (
+        lambda: RandomForestRegressor(random_state=SEED),
+        {'model__n_estimators': [100, 300], 'model__max_depth': [8, None]}
+    ),
+    'gradient_boosting': (
+        lambda: HistGradientBoostingRegressor(random_state=SEED),
+        {'model__learning_rate': [0.05, 0.1], 'model__max_leaf_nodes': [15, 31]}
+    )
+}
+
+
+def read_training_data(path, target):
+    """Feature matrix and target from a CSV or Parquet file"""
+    path = Path(path)
+    columns = FEATURES + [target]
+    if path.suffix == '.parquet':
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(path, usecols=columns)
+    df = df.dropna()
+    return df[FEATURES].astype('float32'), df[target].to_numpy(dtype=np.float64)
+
+
+def data_hash(X, y):
+    """Short content hash of the training data, recorded as part of the model version"""
+    digest = hashlib.sha256(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    digest.update(np.ascontiguousarray(y).tobytes())
+    return digest.hexdigest()[:12]
+
+
+def make_pipeline(estimator, cache_dir=CACHE_DIR):
+    """Scaled polynomial features followed by the estimator
+
+    The fitted feature step is memoized per training fold in ``cache_dir``.
+    """
+    return Pipeline(
+        [
+            ('scale', StandardScaler()),
+            ('features', PolynomialFeatures(degree=2, include_bias=False)),
+            ('model', estimator)
+        ],
+        memory=joblib.Memory(str(cache_dir), verbose=0) if cache_dir else None
+    )
+
+
+def inference_latency(model, X, repeats=LATENCY_REPEATS, batch_rows=LATENCY_BATCH_ROWS):
+    """Median single-row latency (ms) and batch throughput (rows/s) of a fitted model"""
+    row = X.iloc[:1]
+    model.predict(row)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(row)
+        timings.append(time.perf_counter() - start)
+    batch = X.iloc[np.resize(np.arange(len(X)), batch_rows)]
+    start = time.perf_counter()
+    model.predict(batch)
+    return float(np.median(timings) * 1000), batch_rows / (time.perf_counter() - start)
+
+
+def search(X, y, candidates=CANDIDATES, folds=FOLDS, n_jobs=-1, cache_dir=CACHE_DIR):
+    """Grid-search every model family; return the fitted searches and a candidate report"""
+    cv = KFold(n_splits=folds, shuffle=True, random_state=SEED)
+    searches = {}
+    rows = []
+    for name, (estimator, grid) in candidates.items():
+        start = time.perf_counter()
+        grid_search = GridSearchCV(
+            make_pipeline(estimator(), cache_dir),
+            grid,
+            cv=cv,
+            scoring={'rmse': 'neg_root_mean_squared_error', 'r2': 'r2'},
+            refit='rmse',
+            n_jobs=n_jobs
+        ).fit(X, y)
+        wall_time = time.perf_counter() - start
+        searches[name] = grid_search
+        results = grid_search.cv_results_
+        validation_rows = len(X) / folds
+        for i, params in enumerate(results['params']):
+            rows.append({
+                'model': name,
+                'params': {key.replace('model__', ''): value for key, value in params.items()},
+                'cv_rmse': -results['mean_test_rmse'][i],
+                'cv_rmse_std': results['std_test_rmse'][i],
+                'cv_r2': results['mean_test_r2'][i],
+                'fit_seconds': results['mean_fit_time'][i],
+                # Scoring predicts one validation fold, so this is batch latency per row
+                'predict_us_per_row': results['mean_score_time'][i] / validation_rows * 1e6,
+                'best': i == grid_search.best_index_,
+                'search_wall_seconds': wall_time
+            })
+    return searches, pd.DataFrame(rows)
+
+
+def choose(searches, report, X, max_latency_ms=None):
+    """Most accurate refitted model, optionally within a single-row latency budget"""
+    best = report[report['best']].copy()
+    latencies = {name: inference_latency(searches[name].best_estimator_, X) for name in best['model']}
+    best['row_latency_ms'] = best['model'].map(lambda name: latencies[name][0])
+    best['batch_rows_per_second'] = best['model'].map(lambda name: latencies[name][1])
+    eligible = best if max_latency_ms is None else best[best['row_latency_ms'] <= max_latency_ms]
+    if eligible.empty:
+        raise ValueError(f"No candidate predicts a row within {max_latency_ms} ms")
+    chosen = eligible.sort_values('cv_rmse').iloc[0]
+    return chosen, best
+
+
+def save_model(model, path, metadata):
+    """Save a model with a JSON metadata sidecar next to it"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Drop the fold cache reference; the served model should not touch it
+    model.set_params(memory=None)
+    joblib.dump(model, path)
+    path.with_suffix('.json').write_text(json.dumps(metadata, indent=2, default=str))
+    return path
+
+
+def train(data_path, target, model_path=MODEL_PATH, n_jobs=-1, folds=FOLDS, max_latency_ms=None,
+          cache_dir=CACHE_DIR, report_path=None):
+    """Search, choose and save the basalt model; return its metadata and the candidate report"""
+    X, y = read_training_data(data_path, target)
+    start = time.perf_counter()
+    searches, report = search(X, y, folds=folds, n_jobs=n_jobs, cache_dir=cache_dir)
+    chosen, best = choose(searches, report, X, max_latency_ms)
+    model = searches[chosen['model']].best_estimator_
+
+    created = datetime.now(timezone.utc)
+    digest = data_hash(X, y)
+    metadata = {
+        'version': f"{created:%Y%m%d%H%M%S}-{digest}",
+        'created': created.isoformat(),
+        'model': chosen['model'],
+        'params': chosen['params'],
+        'features': FEATURES,
+        'target': target,
+        'training_data': {'path': str(data_path), 'rows': len(X), 'sha256_12': digest},
+        'metrics': {
+            'cv_folds': folds,
+            'cv_rmse': chosen['cv_rmse'],
+            'cv_rmse_std': chosen['cv_rmse_std'],
+            'cv_r2': chosen['cv_r2'],
+            'row_latency_ms': chosen['row_latency_ms'],
+            'batch_rows_per_second': chosen['batch_rows_per_second']
+        },
+        'training_seconds': time.perf_counter() - start,
+        'libraries': {'scikit-learn': sklearn.__version__, 'numpy': np.__version__, 'pandas': pd.__version__}
+    }
+    save_model(model, model_path, metadata)
+    if report_path:
+        report.to_csv(report_path, index=False)
+    return metadata, report, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('data', help="CSV or Parquet file with " + ", ".join(FEATURES) + " and the target column")
+    parser.add_argument('--target', required=True, help="column to predict")
+    parser.add_argument('--output', default=str(MODEL_PATH))
+    parser.add_argument('--jobs', type=int, default=-1, help="parallel fits (default: all cores)")
+    parser.add_argument('--folds', type=int, default=FOLDS)
+    parser.add_argument('--max-latency-ms', type=float, help="only choose models predicting a row within this time")
+    parser.add_argument('--report', help="write the per-candidate report to this CSV file")
+    args = parser.parse_args()
+
+    metadata, report, best = train(args.data, args.target, args.output, args.jobs, args.folds,
+                                   args.max_latency_ms, report_path=args.report)
+    with pd.option_context('display.width', 200, 'display.max_colwidth', 60):
+        print(report.drop(columns=['best']).round(4).to_string(index=False))
+        print()
+        print(best[['model', 'cv_rmse', 'cv_r2', 'fit_seconds', 'row_latency_ms', 'batch_rows_per_second']]
+              .round(4).to_string(index=False))
+    print(f"\nSaved {metadata['model']} {metadata['params']} as {args.output} "
+          f"(version {metadata['version']}, CV RMSE {metadata['metrics']['cv_rmse']:.4f})")
+
+
+if __name__ == "__main__":
+    main()
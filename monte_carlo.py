@@ -0,0 +1,220 @@
+"""Monte Carlo uncertainty of basalt mass estimates.
+
+Area, depth and density are drawn from independent distributions in
+chunks of vectorized samples. Chunks of large runs are spread over a
+process pool, and every finished chunk is merged into a running summary
+so percentiles can be shown while they converge. Percentiles come from a
+log-spaced histogram shared by all chunks (relative error below 0.1% with
+the default bins), so memory does not grow with the number of samples.
+
+    python monte_carlo.py --samples 20000000 --area 740 --spread 10
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+DISTRIBUTIONS = ('fixed', 'uniform', 'triangular', 'normal', 'lognormal')
+PARAMETERS = ('area', 'depth', 'density')
+PERCENTILES = (5, 25, 50, 75, 95)
+CHUNK_SIZE = 1_000_000
+# Runs of at least this many samples use the process pool
+PARALLEL_SAMPLES = 4_000_000
+HISTOGRAM_BINS = 8192
+# Normal and lognormal tails beyond this many standard deviations fall
+# into the under/overflow bins, which report the exact min/max
+TAIL_SIGMAS = 6.0
+
+
+def basalt_mass_mt(area_km2, depth_m, density_kgm3):
+    """Basalt mass in megatonnes; works on scalars and arrays alike"""
+    return area_km2 * 1e6 * depth_m * density_kgm3 / 1e9
+
+
+def distribution(kind, center, spread=0.0):
+    """Distribution spec around a central value with a relative spread
+
+    ``spread`` is the half-width of uniform and triangular distributions
+    and the standard deviation of normal ones, as a fraction of ``center``;
+    lognormal uses log(1 + spread) as the standard deviation of the log.
+    """
+    if kind == 'fixed' or not spread:
+        return ('fixed', center)
+    if kind == 'uniform':
+        return ('uniform', center * (1 - spread), center * (1 + spread))
+    if kind == 'triangular':
+        return ('triangular', center * (1 - spread), center, center * (1 + spread))
+    if kind == 'normal':
+        return ('normal', center, center * spread)
+    if kind == 'lognormal':
+        return ('lognormal', center, float(np.log1p(spread)))
+    raise ValueError(f"Unknown distribution: {kind}")
+
+
+def sample(rng, spec, n):
+    """Draw n non-negative samples from a distribution spec"""
+    kind, *params = spec
+    if kind == 'fixed':
+        return np.full(n, float(params[0]))
+    if kind == 'uniform':
+        return rng.uniform(params[0], params[1], n)
+    if kind == 'triangular':
+        return rng.triangular(params[0], params[1], params[2], n)
+    if kind == 'normal':
+        return np.maximum(rng.normal(params[0], params[1], n), 0.0)
+    if kind == 'lognormal':
+        return params[0] * np.exp(rng.normal(0.0, params[1], n))
+    raise ValueError(f"Unknown distribution: {kind}")
+
+
+def support(spec):
+    """Range holding all but the far tails of a distribution spec"""
+    kind, *params = spec
+    if kind == 'fixed':
+        return params[0], params[0]
+    if kind == 'uniform':
+        return params[0], params[1]
+    if kind == 'triangular':
+        return params[0], params[2]
+    if kind == 'normal':
+        return max(params[0] - TAIL_SIGMAS * params[1], 0.0), params[0] + TAIL_SIGMAS * params[1]
+    if kind == 'lognormal':
+        return params[0] * np.exp(-TAIL_SIGMAS * params[1]), params[0] * np.exp(TAIL_SIGMAS * params[1])
+    raise ValueError(f"Unknown distribution: {kind}")
+
+
+def mass_bins(specs, bins=HISTOGRAM_BINS):
+    """Log-spaced histogram edges covering the mass range of the specs"""
+    lows, highs = zip(*(support(specs[name]) for name in PARAMETERS))
+    low = basalt_mass_mt(*lows)
+    high = basalt_mass_mt(*highs)
+    # Keep a positive range for (near) fixed or zero-bounded inputs
+    high = max(high, 1e-12) * 1.001
+    low = min(max(low, high * 1e-6), high / 1.002)
+    return np.geomspace(low, high, bins + 1)
+
+
+def _simulate_chunk(specs, n, seed, edges):
+    """Sample one chunk and reduce it to histogram counts and moments"""
+    rng = np.random.default_rng(seed)
+    mass = basalt_mass_mt(*(sample(rng, specs[name], n) for name in PARAMETERS))
+    counts = np.bincount(np.searchsorted(edges, mass, side='right'), minlength=len(edges) + 1)
+    mean = mass.mean()
+    return counts, n, mean, float(np.square(mass - mean).sum()), mass.min(), mass.max()
+
+
+class MassSummary:
+    """Running histogram and moments merged from simulated chunks"""
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.counts = np.zeros(len(edges) + 1, dtype=np.int64)
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, chunk):
+        counts, n, mean, m2, low, high = chunk
+        self.counts += counts
+        # Chan et al. parallel update of mean and sum of squared deviations
+        delta = mean - self.mean
+        total = self.n + n
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """Percentiles interpolated log-linearly inside histogram bins"""
+        cumulative = np.cumsum(self.counts)
+        targets = np.asarray(percentiles, dtype=np.float64) / 100 * self.n
+        bins = np.searchsorted(cumulative, targets, side='left')
+        values = []
+        for target, b in zip(targets, bins):
+            if b == 0:
+                values.append(self.min)
+            elif b >= len(self.edges):
+                values.append(self.max)
+            else:
+                below = cumulative[b - 1]
+                fraction = (target - below) / max(self.counts[b], 1)
+                low, high = np.log(self.edges[b - 1]), np.log(self.edges[b])
+                values.append(float(np.clip(np.exp(low + fraction * (high - low)), self.min, self.max)))
+        return dict(zip(percentiles, values))
+
+    def summary(self, percentiles=PERCENTILES):
+        std = (self.m2 / (self.n - 1)) ** 0.5 if self.n > 1 else 0.0
+        return {
+            'samples': self.n,
+            'mean': self.mean,
+            'std': std,
+            'standard_error': std / self.n ** 0.5 if self.n else 0.0,
+            'min': self.min,
+            'max': self.max,
+            'percentiles': self.percentiles(percentiles)
+        }
+
+
+def simulate(specs, n_samples, chunk_size=CHUNK_SIZE, workers=None, seed=0, percentiles=PERCENTILES):
+    """Simulate basalt mass and yield the running summary after every chunk
+
+    ``specs`` maps 'area' (km²), 'depth' (m) and 'density' (kg/m³) to
+    distribution specs. Runs of at least PARALLEL_SAMPLES samples are spread
+    over a process pool unless ``workers`` is 1; chunks are seeded
+    independently, so results do not depend on the number of workers.
+    """
+    edges = mass_bins(specs)
+    sizes = [min(chunk_size, n_samples - start) for start in range(0, n_samples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    running = MassSummary(edges)
+
+    if n_samples < PARALLEL_SAMPLES or workers == 1:
+        for n, chunk_seed in zip(sizes, seeds):
+            running.add(_simulate_chunk(specs, n, chunk_seed, edges))
+            yield running.summary(percentiles)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_simulate_chunk, specs, n, chunk_seed, edges)
+                   for n, chunk_seed in zip(sizes, seeds)]
+        try:
+            for future in as_completed(futures):
+                running.add(future.result())
+                yield running.summary(percentiles)
+        finally:
+            # Stop queued chunks if the caller abandons the run early
+            for future in futures:
+                future.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo basalt mass estimate")
+    parser.add_argument('--samples', type=int, default=10_000_000)
+    parser.add_argument('--area', type=float, default=740, help="area in km² (default: Madeira)")
+    parser.add_argument('--depth', type=float, default=10, help="average basalt depth in m")
+    parser.add_argument('--density', type=float, default=2900, help="basalt density in kg/m³")
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='normal')
+    parser.add_argument('--spread', type=float, default=10, help="relative spread of every input in %%")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    specs = {
+        name: distribution(args.distribution, value, args.spread / 100)
+        for name, value in zip(PARAMETERS, (args.area, args.depth, args.density))
+    }
+    start = time.perf_counter()
+    for result in simulate(specs, args.samples, workers=args.workers, seed=args.seed):
+        p = result['percentiles']
+        print(f"{result['samples']:>12,} samples  mean {result['mean']:,.2f} Mt  "
+              f"p5 {p[5]:,.2f}  p50 {p[50]:,.2f}  p95 {p[95]:,.2f}")
+    elapsed = time.perf_counter() - start
+    print(f"{args.samples:,} samples in {elapsed:.2f}s ({args.samples / elapsed / 1e6:.1f}M samples/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from folium.plugins import FastMarkerCluster
+
+# Above this many points the layer is aggregated on the server first
+MAX_POINTS = 20000
+CLUSTER_CELL_PIXELS = 40
+TILE_SIZE = 256
+MAX_LATITUDE = 85.0511287798
+
+# Draws every row of the data array as a circle marker on one shared
+# canvas instead of creating a DOM node per marker.
+_CALLBACK = """function (row) {{
+    var renderer = window.erwCanvasRenderer || (window.erwCanvasRenderer = L.canvas({{padding: 0.5}}));
+    var count = row[3];
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {{
+        renderer: renderer,
+        radius: count > 1 ? {radius} + 2 * Math.log2(count) : {radius},
+        color: '{color}',
+        weight: 1,
+        fill: true,
+        fillColor: '{color}',
+        fillOpacity: 0.8
+    }});
+    marker.bindPopup(row[2]);
+    return marker;
+}}"""
+
+
+def popup_column(df, fields, default='N/A'):
+    """Build HTML popups for every row at once from a {column: label} mapping"""
+    lines = []
+    for column, label in fields.items():
+        if column in df.columns:
+            values = df[column].astype(object).where(df[column].notna(), default).astype(str)
+        else:
+            values = pd.Series(default, index=df.index)
+        lines.append(f"{label}: " + values)
+    popups = lines[0]
+    for line in lines[1:]:
+        popups = popups + "<br>" + line
+    return popups.to_numpy()
+
+
+def grid_clusters(lats, lons, zoom, cell_pixels=CLUSTER_CELL_PIXELS):
+    """Aggregate points into screen-space grid cells at a zoom level.
+
+    Returns the cell centroids, the number of points in each cell and the
+    index of one member point per cell.
+    """
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    lons = np.asarray(lons, dtype=np.float64)
+    world = TILE_SIZE * 2 ** zoom
+    x = (lons + 180) / 360 * world
+    y = (1 - np.arcsinh(np.tan(np.radians(lats))) / np.pi) / 2 * world
+    cells_per_row = int(np.ceil(world / cell_pixels)) + 1
+    cell = (x // cell_pixels).astype(np.int64) * cells_per_row + (y // cell_pixels).astype(np.int64)
+
+    _, first, inverse, counts = np.unique(cell, return_index=True, return_inverse=True, return_counts=True)
+    centroid_lat = np.bincount(inverse, weights=lats) / counts
+    centroid_lon = np.bincount(inverse, weights=lons) / counts
+    return centroid_lat, centroid_lon, counts, first
+
+
+def point_layer(lats, lons, popups=None, name=None, color='red', radius=5, zoom=2, max_points=MAX_POINTS):
+    """Build one clustered, canvas-rendered layer from arrays of points.
+
+    The points travel to the browser as a single array and are clustered
+    there with Leaflet.markercluster. Layers with more than ``max_points``
+    points are first aggregated on the server into screen-space cells at
+    ``zoom``, so the page size stays bounded however large the layer is.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    valid = ~(np.isnan(lats) | np.isnan(lons))
+    lats, lons = lats[valid], lons[valid]
+    popups = np.full(len(valid), '', dtype=object) if popups is None else np.asarray(popups, dtype=object)
+    popups = popups[valid]
+    counts = np.ones(len(lats), dtype=np.int64)
+
+    if len(lats) > max_points:
+        lats, lons, counts, first = grid_clusters(lats, lons, zoom)
+        popups = np.where(counts > 1, np.char.add(counts.astype(str), ' points'), popups[first])
+
+    data = pd.DataFrame({
+        'lat': lats.round(5),
+        'lon': lons.round(5),
+        'popup': popups,
+        'count': counts
+    }).values.tolist()
+    return FastMarkerCluster(
+        data,
+        callback=_CALLBACK.format(color=color, radius=radius),
+        name=name,
+        options={'chunkedLoading': True}
+    )
@@ -0,0 +1,95 @@
+import os
+import threading
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from coordinates import invalid_coordinates
+
+# Regions of the dashboards: one feature per region with its analysis
+# inputs as properties. GeoParquet files with the same columns work too.
+REGIONS_PATH = Path(os.environ.get("ERW_REGIONS", Path(__file__).parent / "data" / "erw_regions.geojson"))
+
+# Case-study defaults for regions that do not set their own
+DEFAULT_DEPTH_M = 10.0
+DEFAULT_DENSITY_KGM3 = 2900.0
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def read_regions(path=REGIONS_PATH):
+    """Read a region file into a GeoDataFrame indexed by region name"""
+    path = Path(path)
+    gdf = gpd.read_parquet(path) if path.suffix == '.parquet' else gpd.read_file(path)
+    gdf = gdf.to_crs(4326) if gdf.crs else gdf.set_crs(4326)
+    if gdf['region'].duplicated().any():
+        raise ValueError(f"Duplicate region names in {path}: {sorted(gdf.loc[gdf['region'].duplicated(), 'region'])}")
+    points = gdf.geometry.representative_point()
+    invalid = invalid_coordinates(np.column_stack([points.x, points.y]))
+    if invalid.any():
+        raise ValueError(f"Regions without valid coordinates in {path}: {sorted(gdf.loc[invalid, 'region'])}")
+    gdf['lat'] = points.y
+    gdf['lon'] = points.x
+    return gdf.set_index('region', drop=False).rename_axis(None)
+
+
+def load_regions(path=REGIONS_PATH):
+    """Return the region registry, reloading it only when its file changes
+
+    The spatial index is built here once, so bbox lookups stay logarithmic
+    in the number of regions.
+    """
+    path = Path(path)
+    mtime = path.stat().st_mtime
+    with _registries_lock:
+        cached = _registries.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        gdf = read_regions(path)
+        gdf.sindex
+        _registries[path] = (mtime, gdf)
+        return gdf
+
+
+def region(registry, name):
+    """Properties of one region by name"""
+    try:
+        return registry.loc[name]
+    except KeyError:
+        raise KeyError(f"Unknown region: {name}") from None
+
+
+def regions_in_bbox(registry, bbox):
+    """Regions intersecting a (min_lon, min_lat, max_lon, max_lat) box"""
+    if bbox is None:
+        return registry
+    hits = registry.sindex.query(shapely.box(*bbox), predicate='intersects')
+    return registry.iloc[np.sort(hits)]
+
+
+def with_columns(registry, columns):
+    """Regions that define every one of the given columns"""
+    if any(column not in registry.columns for column in columns):
+        return registry.iloc[:0]
+    return registry[registry[list(columns)].notna().all(axis=1)]
+
+
+def case_study(registry, name):
+    """Case-study inputs of one region, with default depth and density filled in"""
+    study = region(registry, name).copy()
+    for column, default in (('basalt_depth_m', DEFAULT_DEPTH_M), ('basalt_density_kgm3', DEFAULT_DENSITY_KGM3)):
+        if pd.isna(study.get(column)):
+            study[column] = default
+    return study
+
+
+def case_studies(registry):
+    """Regions with a basalt case study, i.e. with a known area"""
+    studies = with_columns(registry, ['area_km2']).copy()
+    for column, default in (('basalt_depth_m', DEFAULT_DEPTH_M), ('basalt_density_kgm3', DEFAULT_DENSITY_KGM3)):
+        studies[column] = studies[column].fillna(default) if column in studies else default
+    return studies
@@ -0,0 +1,214 @@
+"""Nearest-deposit and within-radius queries between the maps/ layers.
+
+Each layer gets a BallTree over its points with the haversine metric, so
+k-nearest and radius queries cost O(log n) per query point instead of a
+scan over every source/target pair. Trees are cached on disk per layer
+file version and kept in memory between calls:
+
+    python spatial_index.py nearest mangrove_areas_extended basalt_deposits_extended -k 3
+    python spatial_index.py within mangrove_areas_extended basalt_deposits_extended --radius-km 500
+"""
+import argparse
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import shapely
+from sklearn.neighbors import BallTree
+
+import layer_store
+from coordinates import invalid_coordinates
+
+EARTH_RADIUS_KM = 6371.0088
+INDEX_DIR = Path(os.environ.get('ERW_CACHE_DIR', '.cache')) / 'spatial_index'
+# Bump when the cached index layout changes
+INDEX_VERSION = 2
+LEAF_SIZE = 40
+# Query points per tree call, bounding the memory of large batches
+QUERY_CHUNK = 100_000
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def layer_paths(maps_dir=layer_store.MAPS_DIR):
+    """Stored layers by name (file stem)"""
+    return {path.stem: path for path in layer_store.layer_files(maps_dir)}
+
+
+def _radians(lon, lat):
+    return np.radians(np.column_stack([np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)]))
+
+
+def _chunks(n, chunk=QUERY_CHUNK):
+    return [slice(start, min(start + chunk, n)) for start in range(0, n, chunk)]
+
+
+class LayerIndex:
+    """Points of one layer with their haversine BallTree
+
+    Non-point geometries are indexed by a representative point; points
+    outside the lon/lat range are left out.
+    """
+
+    def __init__(self, lon, lat, names, tree=None, leaf_size=LEAF_SIZE):
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.names = np.asarray(names, dtype=object)
+        if not len(self.lon):
+            raise ValueError("Layer has no points to index")
+        self.tree = tree if tree is not None else BallTree(_radians(self.lon, self.lat), leaf_size=leaf_size, metric='haversine')
+
+    @classmethod
+    def from_frame(cls, gdf):
+        geometry = np.asarray(gdf.geometry.values)
+        present = ~(shapely.is_missing(geometry) | shapely.is_empty(geometry))
+        points = shapely.point_on_surface(geometry[present])
+        names = gdf['name'].to_numpy(dtype=object)[present] if 'name' in gdf else np.flatnonzero(present)
+        coords = np.column_stack([shapely.get_x(points), shapely.get_y(points)])
+        valid = ~invalid_coordinates(coords)
+        return cls(coords[valid, 0], coords[valid, 1], names[valid])
+
+    def __len__(self):
+        return len(self.lon)
+
+    def nearest(self, lon, lat, k=1):
+        """Distances (km) and indices of the k nearest points, one row per query point"""
+        X = _radians(lon, lat)
+        k = min(k, len(self))
+        distances = np.empty((len(X), k))
+        indices = np.empty((len(X), k), dtype=np.int64)
+        for part in _chunks(len(X)):
+            distances[part], indices[part] = self.tree.query(X[part], k=k)
+        return distances * EARTH_RADIUS_KM, indices
+
+    def within(self, lon, lat, radius_km):
+        """Flat (query index, point index, distance km) arrays of all pairs within the radius
+
+        Pairs are ordered by query point, then by distance.
+        """
+        X = _radians(lon, lat)
+        queries, indices, distances = [], [], []
+        for part in _chunks(len(X)):
+            hits, hit_distances = self.tree.query_radius(
+                X[part], r=radius_km / EARTH_RADIUS_KM, return_distance=True, sort_results=True
+            )
+            counts = np.fromiter(map(len, hits), dtype=np.int64, count=len(hits))
+            queries.append(np.repeat(np.arange(part.start, part.stop), counts))
+            indices.append(np.concatenate(hits).astype(np.int64, copy=False) if len(hits) else np.empty(0, np.int64))
+            distances.append(np.concatenate(hit_distances) if len(hits) else np.empty(0))
+        if not queries:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+        return np.concatenate(queries), np.concatenate(indices), np.concatenate(distances) * EARTH_RADIUS_KM
+
+    def count_within(self, lon, lat, radius_km):
+        """Number of points within the radius of each query point"""
+        X = _radians(lon, lat)
+        counts = np.empty(len(X), dtype=np.int64)
+        for part in _chunks(len(X)):
+            counts[part] = self.tree.query_radius(X[part], r=radius_km / EARTH_RADIUS_KM, count_only=True)
+        return counts
+
+
+def _cache_path(path, cache_dir):
+    key = f"{Path(path).resolve()}:{layer_store.layer_version(path)}:{INDEX_VERSION}"
+    return Path(cache_dir) / f"{Path(path).stem}-{hashlib.sha256(key.encode()).hexdigest()[:16]}.joblib"
+
+
+def load_index(layer, maps_dir=layer_store.MAPS_DIR, cache_dir=INDEX_DIR):
+    """Index of a stored layer, rebuilt only when the layer file changes"""
+    paths = layer_paths(maps_dir)
+    if layer not in paths:
+        raise KeyError(f"Unknown layer: {layer}")
+    cache_path = _cache_path(paths[layer], cache_dir)
+    with _indexes_lock:
+        cached = _indexes.get(paths[layer])
+        if cached is not None and cached[0] == cache_path:
+            return cached[1]
+        try:
+            # Stored as plain arrays and the tree, so the file does not
+            # depend on how this module was imported
+            index = LayerIndex(**joblib.load(cache_path))
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            index = LayerIndex.from_frame(layer_store.read_layer(paths[layer], columns=['name']))
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            for stale in cache_path.parent.glob(f"{paths[layer].stem}-*.joblib"):
+                stale.unlink(missing_ok=True)
+            # Unique per process, as several app servers may share the cache
+            tmp_path = cache_path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            joblib.dump({'lon': index.lon, 'lat': index.lat, 'names': index.names, 'tree': index.tree}, tmp_path)
+            os.replace(tmp_path, cache_path)
+        _indexes[paths[layer]] = (cache_path, index)
+        return index
+
+
+def nearest_points(lon, lat, target, k=1, names=None):
+    """The k nearest ``target`` points to each query point as a long DataFrame"""
+    index = load_index(target)
+    distances, indices = index.nearest(lon, lat, k)
+    n, k = indices.shape
+    query = np.repeat(np.arange(n), k)
+    return pd.DataFrame({
+        'source_index': query,
+        'source_name': np.asarray(names, dtype=object)[query] if names is not None else query,
+        'rank': np.tile(np.arange(1, k + 1), n),
+        'target_index': indices.ravel(),
+        'target_name': index.names[indices.ravel()],
+        'distance_km': distances.ravel()
+    })
+
+
+def points_within(lon, lat, target, radius_km, names=None):
+    """Every ``target`` point within ``radius_km`` of each query point as a long DataFrame"""
+    index = load_index(target)
+    query, indices, distances = index.within(lon, lat, radius_km)
+    return pd.DataFrame({
+        'source_index': query,
+        'source_name': np.asarray(names, dtype=object)[query] if names is not None else query,
+        'target_index': indices,
+        'target_name': index.names[indices],
+        'distance_km': distances
+    })
+
+
+def nearest(source, target, k=1):
+    """The k nearest ``target`` points to every point of the ``source`` layer"""
+    points = load_index(source)
+    return nearest_points(points.lon, points.lat, target, k, points.names)
+
+
+def within(source, target, radius_km):
+    """All (source, target) point pairs of two layers closer than ``radius_km``"""
+    points = load_index(source)
+    return points_within(points.lon, points.lat, target, radius_km, points.names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    nearest_parser = commands.add_parser('nearest', help="k nearest target points per source point")
+    nearest_parser.add_argument('-k', type=int, default=1)
+    within_parser = commands.add_parser('within', help="all pairs closer than a radius")
+    within_parser.add_argument('--radius-km', type=float, required=True)
+    for command in (nearest_parser, within_parser):
+        command.add_argument('source', choices=sorted(layer_paths()))
+        command.add_argument('target', choices=sorted(layer_paths()))
+        command.add_argument('--output', help="write the pairs to this CSV file")
+    args = parser.parse_args()
+
+    if args.command == 'nearest':
+        pairs = nearest(args.source, args.target, args.k)
+    else:
+        pairs = within(args.source, args.target, args.radius_km)
+    if args.output:
+        pairs.to_csv(args.output, index=False)
+    with pd.option_context('display.width', 200):
+        print(pairs.round({'distance_km': 1}).to_string(index=False, max_rows=50))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+N_FEATURES = 2500
+
+
+def make_handler(requested, cap, advertise=True, count_supported=True, flag_limit=True):
+    """Stub FeatureServer layer returning at most ``cap`` records per query"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            requested.append(url.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if not url.path.endswith('/query'):
+                body = {'name': 'stub', 'editingInfo': {'lastEditDate': 1}}
+                if advertise:
+                    body['maxRecordCount'] = cap
+            elif query.get('returnCountOnly') == 'true':
+                body = {'count': N_FEATURES} if count_supported else {'error': {'code': 400, 'message': 'unsupported'}}
+            else:
+                offset = int(query.get('resultOffset', 0))
+                end = min(offset + min(int(query.get('resultRecordCount', cap)), cap), N_FEATURES)
+                body = {'features': [
+                    {'attributes': {'id': i}, 'geometry': {'x': 0.0, 'y': 0.0}} for i in range(offset, end)
+                ]}
+                if flag_limit and end < N_FEATURES:
+                    body['exceededTransferLimit'] = True
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def serve():
+    """Start stub layers; ``serve.requested`` collects the paths they were asked for"""
+    servers = []
+    requested = []
+
+    def start(**options):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(requested, **options))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/Stub/FeatureServer/0/query"
+
+    start.requested = requested
+    yield start
+    for server in servers:
+        server.shutdown()
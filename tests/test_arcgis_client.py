@@ -0,0 +1,37 @@
+import pytest
+import requests
+
+import arcgis_client
+from conftest import N_FEATURES
+
+def ids(features):
+    return [feature['attributes']['id'] for feature in features]
+
+
+@pytest.mark.parametrize('options', [
+    {'cap': 500},
+    {'cap': 500, 'advertise': False},
+    {'cap': 500, 'advertise': False, 'flag_limit': False},
+    {'cap': 300, 'count_supported': False},
+])
+def test_fetch_features_with_server_capped_below_page_size(serve, options):
+    url = serve(**options)
+    features = arcgis_client.fetch_features(url, session=requests.Session())
+    assert ids(features) == list(range(N_FEATURES))
+
+
+def test_page_size_is_capped_to_max_record_count(serve):
+    url = serve(cap=500)
+    assert arcgis_client.max_record_count(url, requests.Session()) == 500
+
+
+@pytest.mark.parametrize('bbox, expected', [
+    ((10, 20, 30, 40), (10, 20, 30, 40)),
+    ((370, 20, 390, 40), (10, 20, 30, 40)),
+    ((-350, 20, -330, 40), (10, 20, 30, 40)),
+    ((170, 20, 190, 40), (-180, 20, 180, 40)),
+    ((-190, 20, -170, 40), (-180, 20, 180, 40)),
+    ((-200, -80, 200, 80), None),
+])
+def test_snap_bbox_keeps_viewports_across_the_antimeridian(bbox, expected):
+    assert arcgis_client.snap_bbox(bbox) == expected
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import esri_json
+import feature_cache
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def empty_layers(monkeypatch):
+    """Every layer query matches no features, as when the viewport is open ocean"""
+    def query_layers(layers, *args, **kwargs):
+        return {name: esri_json.features_to_geodataframe([]) for name in layers}
+
+    monkeypatch.setattr(feature_cache, 'cached_query_layers', query_layers)
+    monkeypatch.setattr(feature_cache, 'cached_query_layer', lambda *args, **kwargs: esri_json.features_to_geodataframe([]))
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    yield
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+@pytest.mark.parametrize('script, message', [
+    ('arcgis_visualization.py', 'No geological units in this view'),
+    ('volcanic_areas.py', 'No volcanoes in this view'),
+])
+def test_zero_feature_viewport_shows_a_notice(empty_layers, script, message):
+    at = AppTest.from_file(str(ROOT / script), default_timeout=60)
+    at.run()
+    assert not at.exception, [e.value for e in at.exception]
+    assert any(message in info.value for info in at.info)
+
+
+def test_regions_in_view_follow_the_viewport(empty_layers):
+    at = AppTest.from_file(str(ROOT / 'arcgis_visualization.py'), default_timeout=60)
+    at.session_state['geological_map'] = {
+        'bounds': {'_southWest': {'lat': 30, 'lng': -30}, '_northEast': {'lat': 40, 'lng': -10}},
+        'center': {'lat': 35, 'lng': -20}, 'zoom': 5
+    }
+    at.run()
+    assert not at.exception, [e.value for e in at.exception]
+    listed = at.sidebar.markdown[-1].value
+    assert 'Madeira' in listed and 'Azores' in listed and 'India' not in listed
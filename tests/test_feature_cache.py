@@ -0,0 +1,57 @@
+import json
+import threading
+
+import geopandas as gpd
+import shapely
+
+import feature_cache
+
+URL = "http://stub/Stub/FeatureServer/0/query"
+
+
+def test_foreign_files_are_ignored_by_evict_and_clear(tmp_path):
+    foreign = tmp_path / 'verify_coordinates.json'
+    foreign.write_text(json.dumps({'results': {}}))
+    other = tmp_path / 'layer.parquet'
+    other.write_bytes(b'')
+    gdf = gpd.GeoDataFrame({'id': [1]}, geometry=[shapely.Point(0, 0)], crs=4326)
+
+    feature_cache.put(URL, None, gdf, cache_dir=tmp_path, max_bytes=0)
+    assert foreign.exists()
+    feature_cache.put(URL, None, gdf, cache_dir=tmp_path)
+    assert feature_cache.get(URL, cache_dir=tmp_path)['id'].tolist() == [1]
+    feature_cache.clear(tmp_path)
+    assert feature_cache.get(URL, cache_dir=tmp_path) is None
+    assert foreign.exists() and other.exists()
+
+
+def test_cache_dir_is_under_the_shared_cache_root():
+    assert feature_cache.CACHE_DIR.name == 'arcgis'
+
+
+def test_miss_requests_layer_metadata_once(serve, tmp_path):
+    url = serve(cap=500)
+    gdf = feature_cache.cached_query_layer(url, cache_dir=tmp_path)
+    assert len(gdf) == 2500
+    assert serve.requested.count('/Stub/FeatureServer/0') == 1
+    assert feature_cache._read_meta(next(tmp_path.glob('*.json')))['last_edit'] == 1
+
+
+def test_concurrent_puts_of_one_key_publish_a_whole_entry(tmp_path):
+    gdf = gpd.GeoDataFrame({'id': range(1000)}, geometry=[shapely.Point(i, 0) for i in range(1000)], crs=4326)
+    errors = []
+
+    def put():
+        try:
+            feature_cache.put(URL, None, gdf, cache_dir=tmp_path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=put) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(feature_cache.get(URL, cache_dir=tmp_path)) == 1000
+    assert not list(tmp_path.glob('*.tmp'))
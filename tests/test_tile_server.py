@@ -0,0 +1,19 @@
+import os
+
+import tile_server
+
+
+def test_seed_keeps_only_the_current_version_of_each_layer(tmp_path):
+    tile_server.seed(0, 1, layers='mangrove', workers=1, cache_dir=tmp_path)
+    current = tile_server.sources_version(['mangrove'])
+    assert [path.name for path in (tmp_path / 'mangrove').iterdir()] == [current]
+
+    (tmp_path / 'mangrove' / 'oldversion0' / '0' / '0').mkdir(parents=True)
+    (tmp_path / 'removed_layer' / current).mkdir(parents=True)
+    assert tile_server.prune_tiles(tmp_path) == 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['mangrove']
+    assert [path.name for path in (tmp_path / 'mangrove').iterdir()] == [current]
+
+
+def test_tiles_are_cached_under_the_shared_cache_root():
+    assert tile_server.TILE_CACHE_DIR == tile_server.Path(os.environ.get('ERW_CACHE_DIR', '.cache')) / 'tiles'
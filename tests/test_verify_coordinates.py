@@ -0,0 +1,12 @@
+from pathlib import Path
+
+import tile_server
+import verify_coordinates
+
+GEOLOGICAL_FEATURES = Path(__file__).resolve().parent.parent / 'data' / 'geological_features.json'
+
+
+def test_commented_geojson_is_valid_for_verifier_and_tile_server():
+    result = verify_coordinates.verify_file(GEOLOGICAL_FEATURES)
+    assert result['ok'], result['messages']
+    assert result['features'] == len(tile_server.read_layer(GEOLOGICAL_FEATURES))
@@ -0,0 +1,393 @@
+"""Local Mapbox Vector Tile service for the map layers.
+
+Layers are read from local GeoParquet (or GeoJSON) files, so serving and
+seeding work fully offline. The ArcGIS layers are made available by
+snapshotting them once while online.
+
+    python tile_server.py snapshot            # save ArcGIS layers to data/arcgis/
+    python tile_server.py seed --max-zoom 6   # pre-render tiles into the cache
+    python tile_server.py serve --port 8765   # serve /tiles/<layers>/<z>/<x>/<y>.pbf
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import geopandas as gpd
+import mapbox_vector_tile
+import numpy as np
+import shapely
+from mapbox_vector_tile.encoder import on_invalid_geometry_make_valid
+from shapely.geometry import MultiPoint, shape
+
+from geojson_stream import FeatureStream
+
+BASE_DIR = Path(__file__).resolve().parent
+SNAPSHOT_DIR = BASE_DIR / "data" / "arcgis"
+
+TILE_SOURCES = {
+    "geology": SNAPSHOT_DIR / "geology.parquet",
+    "soil": SNAPSHOT_DIR / "soil.parquet",
+    "land_use": SNAPSHOT_DIR / "land_use.parquet",
+    "volcanoes": SNAPSHOT_DIR / "volcanoes.parquet",
+    "geological_features": BASE_DIR / "data" / "geological_features.json",
+    "volcanic": BASE_DIR / "maps" / "volcanic" / "data" / "volcanic_areas_extended.parquet",
+    "mangrove": BASE_DIR / "maps" / "mangrove" / "data" / "mangrove_areas_extended.parquet"
+}
+
+TILE_CACHE_DIR = Path(os.environ.get("ERW_CACHE_DIR", ".cache")) / "tiles"
+TILE_URL = os.environ.get("ERW_TILE_URL", "http://localhost:8765")
+
+EXTENT = 4096
+BUFFER = 64
+MAX_ZOOM = 14
+# Web Mercator is undefined at the poles
+MAX_LATITUDE = 85.0511287798
+WORLD_SIZE = 2 * math.pi * 6378137.0
+
+# Leaflet.VectorGrid styles shared by the Streamlit pages and map_visualization.js
+LAYER_STYLES = {
+    "geology": {"fill": True, "fillColor": "#e34a33", "fillOpacity": 0.5, "color": "black", "weight": 0.5},
+    "soil": {"fill": True, "fillColor": "#8c510a", "fillOpacity": 0.3, "color": "black", "weight": 0.5},
+    "land_use": {"fill": True, "fillColor": "#31a354", "fillOpacity": 0.3, "color": "black", "weight": 0.5},
+    "volcanoes": {"radius": 5, "fill": True, "fillColor": "red", "fillOpacity": 0.8, "color": "red", "weight": 1},
+    "geological_features": {"fill": True, "fillColor": "#8B0000", "fillOpacity": 0.5, "color": "#8B0000", "weight": 1},
+    "volcanic": {"radius": 8, "fill": True, "fillColor": "#FF4500", "fillOpacity": 0.8, "color": "#000", "weight": 1},
+    "mangrove": {"radius": 6, "fill": True, "fillColor": "#008000", "fillOpacity": 0.8, "color": "#000", "weight": 1}
+}
+
+_layers = {}
+_layers_lock = threading.Lock()
+
+
+def _positions(coordinates):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [coordinates[:2]]
+    return [position for part in coordinates or [] for position in _positions(part)]
+
+
+def _geometry(geometry):
+    """Convert a GeoJSON geometry, keeping the vertices of degenerate polygons"""
+    try:
+        return shape(geometry)
+    except (ValueError, TypeError):
+        positions = _positions(geometry.get('coordinates'))
+        return MultiPoint(positions) if positions else None
+
+
+def read_layer(path):
+    """Read a GeoJSON or GeoParquet layer as an EPSG:4326 GeoDataFrame"""
+    path = Path(path)
+    if path.suffix == '.parquet':
+        return gpd.read_parquet(path, memory_map=True).to_crs(4326)
+    # The hand-written files carry // comments
+    features = list(FeatureStream(path, strip_comments=True))
+    return gpd.GeoDataFrame(
+        [feature.get('properties') or {} for feature in features],
+        geometry=[_geometry(feature['geometry']) if feature.get('geometry') else None for feature in features],
+        crs="EPSG:4326"
+    )
+
+
+def _tile_properties(gdf):
+    """Attribute dicts restricted to the value types MVT can store"""
+    records = gdf.drop(columns=gdf.geometry.name).to_dict('records')
+    properties = []
+    for record in records:
+        clean = {}
+        for key, value in record.items():
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            if isinstance(value, np.generic):
+                value = value.item()
+            clean[str(key)] = value if isinstance(value, (str, int, float, bool)) else str(value)
+        properties.append(clean)
+    return np.array(properties, dtype=object)
+
+
+def available_layers():
+    """Names of the tile layers whose source file exists"""
+    return [name for name, path in TILE_SOURCES.items() if Path(path).exists()]
+
+
+def load_layer(name):
+    """Return a layer projected to Web Mercator, reloading it when its file changes"""
+    path = Path(TILE_SOURCES[name])
+    mtime = path.stat().st_mtime
+    with _layers_lock:
+        cached = _layers.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        gdf = read_layer(path)
+        gdf = gdf[gdf.geometry.notna()]
+        gdf = gdf.set_geometry(shapely.clip_by_rect(gdf.geometry.values, -180, -MAX_LATITUDE, 180, MAX_LATITUDE))
+        gdf = gdf[~gdf.geometry.is_empty].to_crs(3857).reset_index(drop=True)
+        layer = {
+            'geometry': gdf.geometry.values,
+            'properties': _tile_properties(gdf),
+            'sindex': gdf.sindex
+        }
+        _layers[name] = (mtime, layer)
+        return layer
+
+
+def sources_version(names=None):
+    """Short hash of the source files; tiles are cached per version"""
+    digest = hashlib.sha256()
+    for name in sorted(names or available_layers()):
+        stat = Path(TILE_SOURCES[name]).stat()
+        digest.update(f"{name}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return digest.hexdigest()[:12]
+
+
+def tile_bounds(z, x, y):
+    """Web Mercator bounds of a z/x/y tile"""
+    size = WORLD_SIZE / 2 ** z
+    origin = WORLD_SIZE / 2
+    return (x * size - origin, origin - (y + 1) * size, (x + 1) * size - origin, origin - y * size)
+
+
+def tiles_for_bbox(z, bbox=(-180, -MAX_LATITUDE, 180, MAX_LATITUDE)):
+    """All z/x/y tiles covering a lon/lat bounding box"""
+    def tile_xy(lon, lat):
+        lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+        n = 2 ** z
+        x = int((lon + 180) / 360 * n)
+        y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+        return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+    xmin, ymin, xmax, ymax = bbox
+    x0, y0 = tile_xy(xmin, ymax)
+    x1, y1 = tile_xy(xmax, ymin)
+    return [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def render_tile(z, x, y, names=None):
+    """Encode one tile containing the requested layers"""
+    bounds = tile_bounds(z, x, y)
+    pixel = (bounds[2] - bounds[0]) / EXTENT
+    query = (bounds[0] - BUFFER * pixel, bounds[1] - BUFFER * pixel,
+             bounds[2] + BUFFER * pixel, bounds[3] + BUFFER * pixel)
+
+    tile_layers = []
+    for name in names or available_layers():
+        layer = load_layer(name)
+        index = layer['sindex'].query(shapely.box(*query))
+        if not len(index):
+            continue
+        index.sort()
+        geometries = shapely.clip_by_rect(layer['geometry'][index], *query)
+        # Vertices closer than one tile unit collapse when quantized anyway
+        geometries = shapely.simplify(geometries, pixel, preserve_topology=True)
+        keep = ~shapely.is_empty(geometries)
+        tile_layers.append({
+            'name': name,
+            'features': [
+                {'geometry': geometry, 'properties': properties}
+                for geometry, properties in zip(geometries[keep], layer['properties'][index][keep])
+            ]
+        })
+
+    return mapbox_vector_tile.encode(tile_layers, default_options={
+        'quantize_bounds': bounds,
+        'extents': EXTENT,
+        'on_invalid_geometry': on_invalid_geometry_make_valid
+    })
+
+
+def _layer_names(layers):
+    if layers in (None, '', 'all'):
+        return available_layers()
+    names = layers.split(',') if isinstance(layers, str) else list(layers)
+    unknown = [name for name in names if name not in TILE_SOURCES or not Path(TILE_SOURCES[name]).exists()]
+    if unknown:
+        raise KeyError(f"Unknown or missing tile layers: {', '.join(unknown)}")
+    return names
+
+
+def get_tile(z, x, y, layers='all', cache_dir=TILE_CACHE_DIR):
+    """Return an encoded tile, rendering it into the on-disk cache on a miss"""
+    names = _layer_names(layers)
+    key = ','.join(names)
+    path = Path(cache_dir) / key / sources_version(names) / str(z) / str(x) / f"{y}.pbf"
+    if path.exists():
+        return path.read_bytes()
+
+    data = render_tile(z, x, y, names)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    return data
+
+
+def prune_tiles(cache_dir=TILE_CACHE_DIR):
+    """Delete cached tiles of older source versions or of layers that are gone
+
+    Tiles live under <layers>/<sources version>/, so only the current
+    version of each layer combination is kept. Returns the number of
+    directories removed.
+    """
+    removed = 0
+    for key_dir in Path(cache_dir).glob('*'):
+        if not key_dir.is_dir():
+            continue
+        try:
+            current = sources_version(_layer_names(key_dir.name))
+        except KeyError:
+            current = None
+        stale = [key_dir] if current is None else [path for path in key_dir.iterdir() if path.name != current]
+        for path in stale:
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+        removed += len(stale)
+    return removed
+
+
+def _seed_tiles(tiles, layers, cache_dir):
+    for z, x, y in tiles:
+        get_tile(z, x, y, layers, cache_dir)
+    return len(tiles)
+
+
+def seed(min_zoom=0, max_zoom=6, bbox=None, layers='all', workers=None, cache_dir=TILE_CACHE_DIR):
+    """Pre-render every tile of a zoom range into the cache using a process pool"""
+    prune_tiles(cache_dir)
+    tiles = [
+        tile
+        for z in range(min_zoom, max_zoom + 1)
+        for tile in (tiles_for_bbox(z, bbox) if bbox else tiles_for_bbox(z))
+    ]
+    chunk = 64
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        done = sum(executor.map(
+            _seed_tiles,
+            [tiles[i:i + chunk] for i in range(0, len(tiles), chunk)],
+            [layers] * math.ceil(len(tiles) / chunk),
+            [cache_dir] * math.ceil(len(tiles) / chunk)
+        ))
+    elapsed = time.perf_counter() - start
+    print(f"Seeded {done} tiles (z{min_zoom}-{max_zoom}) in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.0f} tiles/s)")
+    return done
+
+
+def snapshot(bbox=None):
+    """Save the ArcGIS layers as GeoParquet so tiles can be served offline"""
+    import arcgis_client
+    import feature_cache
+
+    layers = {
+        name: (arcgis_client.service_url(service), arcgis_client.filter_params(bbox))
+        for name, service in arcgis_client.LAYER_SERVICES.items()
+    }
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    for name, gdf in feature_cache.cached_query_layers(layers).items():
+        gdf.to_parquet(SNAPSHOT_DIR / f"{name}.parquet")
+        print(f"Saved {len(gdf)} {name} features")
+
+
+def tile_layer(layers, name=None, url=TILE_URL):
+    """Folium layer drawing the given tile layers from the tile service"""
+    from folium.plugins import VectorGridProtobuf
+
+    names = [layers] if isinstance(layers, str) else list(layers)
+    return VectorGridProtobuf(
+        f"{url}/tiles/{','.join(names)}/{{z}}/{{x}}/{{y}}.pbf",
+        name or ', '.join(names),
+        {
+            'vectorTileLayerStyles': {layer: LAYER_STYLES[layer] for layer in names},
+            'maxNativeZoom': MAX_ZOOM,
+            'interactive': True
+        }
+    )
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    """Serve /tiles/<layers>/<z>/<x>/<y>.pbf and /layers.json"""
+
+    tile_path = re.compile(r'^/tiles/([\w,]+)/(\d+)/(\d+)/(\d+)\.pbf$')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'public, max-age=3600')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/layers.json':
+            body = json.dumps({'layers': available_layers(), 'maxzoom': MAX_ZOOM}).encode()
+            return self._send(200, body, 'application/json')
+
+        match = self.tile_path.match(path)
+        if not match:
+            return self._send(404, b'Not found', 'text/plain')
+        layers, z, x, y = match.group(1), *map(int, match.groups()[1:])
+        if z > MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return self._send(404, b'Tile out of range', 'text/plain')
+        try:
+            tile = get_tile(z, x, y, layers)
+        except KeyError as e:
+            return self._send(404, str(e).encode(), 'text/plain')
+        self._send(200, tile, 'application/x-protobuf')
+
+
+def serve(host='127.0.0.1', port=8765):
+    """Run the tile service until interrupted"""
+    removed = prune_tiles()
+    if removed:
+        print(f"Removed {removed} stale tile cache directories from {TILE_CACHE_DIR}")
+    server = ThreadingHTTPServer((host, port), TileHandler)
+    print(f"Serving {', '.join(available_layers())} tiles on http://{host}:{port}/tiles/<layers>/{{z}}/{{x}}/{{y}}.pbf")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='serve vector tiles over HTTP')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+
+    seed_parser = commands.add_parser('seed', help='pre-render tiles into the cache')
+    seed_parser.add_argument('--min-zoom', type=int, default=0)
+    seed_parser.add_argument('--max-zoom', type=int, default=6)
+    seed_parser.add_argument('--bbox', type=float, nargs=4, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'))
+    seed_parser.add_argument('--layers', default='all')
+    seed_parser.add_argument('--workers', type=int)
+
+    snapshot_parser = commands.add_parser('snapshot', help='save the ArcGIS layers for offline tiling')
+    snapshot_parser.add_argument('--bbox', type=float, nargs=4, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'))
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args.host, args.port)
+    elif args.command == 'seed':
+        seed(args.min_zoom, args.max_zoom, args.bbox, args.layers, args.workers)
+    else:
+        snapshot(args.bbox)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,100 +1,368 @@
 import os
 import json
+import argparse
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
+from xml.etree import ElementTree
 
-def validate_coordinates(coord):
-    """Validate if coordinates are valid (longitude, latitude)"""
-    if not isinstance(coord, list) or len(coord) != 2:
-        return False
-    
-    lon, lat = coord
-    
-    # Check if coordinates are numbers
-    if not (isinstance(lon, (int, float)) and isinstance(lat, (int, float))):
-        return False
-    
-    # Check if coordinates are within valid ranges
-    if not (-180 <= lon <= 180) or not (-90 <= lat <= 90):
-        return False
-    
-    return True
+import numpy as np
+import pyarrow.parquet as pq
+import shapely
 
-def verify_json_file(file_path):
-    """Verify coordinates in a GeoJSON file"""
+from coordinates import invalid_coordinates, swapped_coordinates
+from geojson_stream import FeatureStream, coordinate_array, geometry_positions
+
+# How many offending feature indices to print per file, and to keep per
+# file in the reports
+MAX_REPORTED = 20
+REPORTED_INDICES = 1000
+
+DEFAULT_ROOTS = ('maps', 'data')
+PATTERNS = ('*.geojson', '*.json', '*.parquet')
+BATCH_FEATURES = 2_000
+# Results of unchanged files are reused; bump the version when the checks change
+CACHE_PATH = Path(os.environ.get('ERW_CACHE_DIR', '.cache')) / 'verify_coordinates.json'
+VALIDATOR_VERSION = 4
+
+def validate_features(features):
+    """Validate the coordinates of every feature of a FeatureCollection at once
+
+    All positions are flattened into one array that is range-checked in a
+    single pass. Returns counts and the indices of the offending features.
+    """
+    positions = []
+    counts = np.zeros(len(features), dtype=np.int64)
+    missing_geometry = []
+    missing_coordinates = []
+    unsupported = {}
+    malformed = []
+    for index, feature in enumerate(features):
+        geometry = feature.get('geometry') if isinstance(feature, dict) else None
+        if not geometry:
+            missing_geometry.append(index)
+            continue
+        if geometry.get('type') != 'GeometryCollection' and not geometry.get('coordinates'):
+            missing_coordinates.append(index)
+            continue
+        try:
+            feature_positions = geometry_positions(geometry)
+        except KeyError:
+            unsupported.setdefault(str(geometry.get('type')), []).append(index)
+            continue
+        except TypeError:
+            malformed.append(index)
+            continue
+        positions.extend(feature_positions)
+        counts[index] = len(feature_positions)
+
+    coords = coordinate_array(positions)
+    invalid = invalid_coordinates(coords)
+    owners = np.repeat(np.arange(len(features)), counts)
+    invalid_per_feature = np.bincount(owners[invalid], minlength=len(features))
+    return {
+        'features': len(features),
+        'vertices': len(coords),
+        'invalid_vertices': int(invalid.sum()),
+        'swapped_vertices': int(swapped_coordinates(coords).sum()),
+        'invalid_features': np.flatnonzero(invalid_per_feature),
+        'invalid_per_feature': invalid_per_feature,
+        'first_invalid': coords[invalid][:MAX_REPORTED],
+        'missing_geometry': missing_geometry,
+        'missing_coordinates': missing_coordinates,
+        'malformed': malformed,
+        'unsupported': unsupported
+    }
+
+def validate_geometries(geometries):
+    """validate_features for an array of shapely geometries, as stored in GeoParquet"""
+    missing = shapely.is_missing(geometries)
+    coords, owners = shapely.get_coordinates(geometries, return_index=True)
+    invalid = invalid_coordinates(coords)
+    invalid_per_feature = np.bincount(owners[invalid], minlength=len(geometries))
+    return {
+        'features': len(geometries),
+        'vertices': len(coords),
+        'invalid_vertices': int(invalid.sum()),
+        'swapped_vertices': int(swapped_coordinates(coords).sum()),
+        'invalid_features': np.flatnonzero(invalid_per_feature),
+        'invalid_per_feature': invalid_per_feature,
+        'first_invalid': coords[invalid][:MAX_REPORTED],
+        'missing_geometry': np.flatnonzero(missing).tolist(),
+        'missing_coordinates': np.flatnonzero(~missing & shapely.is_empty(geometries)).tolist(),
+        'malformed': [],
+        'unsupported': {}
+    }
+
+def _indices(indices):
+    indices = list(indices)
+    shown = ", ".join(str(index) for index in indices[:MAX_REPORTED])
+    return shown + (f", ... ({len(indices)} in total)" if len(indices) > MAX_REPORTED else "")
+
+def _swapped(result):
+    swapped = result['swapped_vertices']
+    return f"{swapped} look like swapped lat/lon; " if swapped else ""
+
+def problems(result):
+    """(level, message) pairs for the problems found by validate_features"""
+    messages = []
+    if result['missing_geometry']:
+        messages.append(('Error', f"Features missing geometry: {_indices(result['missing_geometry'])}"))
+    if result['missing_coordinates']:
+        messages.append(('Error', f"Features missing coordinates: {_indices(result['missing_coordinates'])}"))
+    if result['malformed']:
+        messages.append(('Error', f"Features with malformed coordinate arrays: {_indices(result['malformed'])}"))
+    for geometry_type, indices in result['unsupported'].items():
+        messages.append(('Warning', f"Unsupported geometry type {geometry_type} in features: {_indices(indices)}"))
+    if result['invalid_vertices']:
+        messages.append(('Error', f"{result['invalid_vertices']} invalid coordinates in "
+                                  f"{len(result['invalid_features'])} features: {_indices(result['invalid_features'])}; "
+                                  f"{_swapped(result)}"
+                                  f"first invalid coordinates: {np.asarray(result['first_invalid']).tolist()}"))
+    return messages
+
+def failed(result):
+    """Whether validate_features found coordinates that make the file invalid"""
+    return bool(result['malformed']) or bool(result['invalid_vertices'])
+
+def report_problems(file_path, result):
+    """Print the problems found by validate_features; return True if there are none"""
+    for level, message in problems(result):
+        print(f"{level} in {file_path}: {message}")
+    return not failed(result)
+
+def merge_results(total, result, offset):
+    """Add the result of a batch of features starting at feature ``offset``"""
+    if total is None:
+        total = {
+            'features': 0, 'vertices': 0, 'invalid_vertices': 0, 'swapped_vertices': 0, 'invalid_features': [],
+            'first_invalid': np.empty((0, 2)), 'missing_geometry': [], 'missing_coordinates': [],
+            'malformed': [], 'unsupported': {}
+        }
+    total['features'] += result['features']
+    total['vertices'] += result['vertices']
+    total['invalid_vertices'] += result['invalid_vertices']
+    total['swapped_vertices'] += result['swapped_vertices']
+    total['invalid_features'].extend((result['invalid_features'] + offset).tolist())
+    total['first_invalid'] = np.concatenate([total['first_invalid'], result['first_invalid']])[:MAX_REPORTED]
+    for key in ('missing_geometry', 'missing_coordinates', 'malformed'):
+        total[key].extend(index + offset for index in result[key])
+    for geometry_type, indices in result['unsupported'].items():
+        total['unsupported'].setdefault(geometry_type, []).extend(index + offset for index in indices)
+    return total
+
+def file_hash(path):
+    """SHA-256 of a file's content, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def parquet_results(file_path):
+    """Merged validate_geometries results of a GeoParquet file, read in batches"""
+    parquet = pq.ParquetFile(file_path, memory_map=True)
+    geo = json.loads((parquet.schema_arrow.metadata or {}).get(b'geo', b'{}'))
+    column = geo.get('primary_column')
+    if not column:
+        raise ValueError("Not a GeoParquet file")
+    encoding = geo['columns'][column].get('encoding')
+    if encoding != 'WKB':
+        raise ValueError(f"Unsupported geometry encoding {encoding}")
+    total = None
+    offset = 0
+    for batch in parquet.iter_batches(batch_size=BATCH_FEATURES, columns=[column]):
+        geometries = shapely.from_wkb(batch.column(0).to_numpy(zero_copy_only=False))
+        total = merge_results(total, validate_geometries(geometries), offset)
+        offset += len(geometries)
+    return total
+
+def verify_file(file_path, known=None):
+    """Verify a GeoJSON or GeoParquet file, streaming its features in batches
+
+    ``known`` is a previous result for the file; it is returned as is when
+    the content hash and validator version still match.
+    """
+    start = time.perf_counter()
+    digest = file_hash(file_path)
+    if known and known.get('sha256') == digest and known.get('version') == VALIDATOR_VERSION:
+        return {**known, 'cached': True, 'seconds': time.perf_counter() - start}
+
+    messages = []
+    total = None
+    ok = False
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            
-        if data.get('type') != 'FeatureCollection':
-            print(f"Error in {file_path}: Not a valid GeoJSON FeatureCollection")
-            return False
-            
-        features = data.get('features', [])
-        if not features:
-            print(f"Error in {file_path}: No features found")
-            return False
-            
-        for feature in features:
-            geometry = feature.get('geometry')
-            if not geometry:
-                print(f"Error in {file_path}: Feature missing geometry")
-                continue
-                
-            coordinates = geometry.get('coordinates')
-            if not coordinates:
-                print(f"Error in {file_path}: Feature missing coordinates")
-                continue
-                
-            if geometry['type'] == 'Point':
-                if not validate_coordinates(coordinates):
-                    print(f"Error in {file_path}: Invalid point coordinates: {coordinates}")
-            elif geometry['type'] == 'Polygon':
-                for ring in coordinates:
-                    for coord in ring:
-                        if not validate_coordinates(coord):
-                            print(f"Error in {file_path}: Invalid polygon coordinates: {coord}")
-            else:
-                print(f"Warning in {file_path}: Unsupported geometry type: {geometry['type']}")
-                
-        return True
-        
+        if Path(file_path).suffix == '.parquet':
+            total = parquet_results(file_path)
+            collection_type = 'FeatureCollection'
+        else:
+            # Same reader as the tile server and map loaders, so // comments are allowed
+            stream = FeatureStream(file_path, strip_comments=True)
+            features = iter(stream)
+            offset = 0
+            for batch in iter(lambda: list(islice(features, BATCH_FEATURES)), []):
+                total = merge_results(total, validate_features(batch), offset)
+                offset += len(batch)
+            collection_type = stream.members.get('type')
+        if collection_type != 'FeatureCollection':
+            messages.append(('Error', "Not a valid GeoJSON FeatureCollection"))
+        elif total is None:
+            messages.append(('Error', "No features found"))
+        else:
+            messages.extend(problems(total))
+            ok = not failed(total)
     except json.JSONDecodeError:
-        print(f"Error in {file_path}: Invalid JSON format")
-        return False
+        messages.append(('Error', "Invalid JSON format"))
     except Exception as e:
-        print(f"Error in {file_path}: {str(e)}")
-        return False
+        messages.append(('Error', str(e)))
+
+    return {
+        'file': str(file_path),
+        'ok': ok,
+        'features': total['features'] if total else 0,
+        'vertices': total['vertices'] if total else 0,
+        'invalid_vertices': total['invalid_vertices'] if total else 0,
+        'swapped_vertices': total['swapped_vertices'] if total else 0,
+        'invalid_feature_count': len(total['invalid_features']) if total else 0,
+        'invalid_features': total['invalid_features'][:REPORTED_INDICES] if total else [],
+        'messages': [[level, message] for level, message in messages],
+        'seconds': time.perf_counter() - start,
+        'sha256': digest,
+        'version': VALIDATOR_VERSION,
+        'cached': False
+    }
+
+def verify_json_file(file_path):
+    """Verify coordinates in a GeoJSON or GeoParquet file"""
+    result = verify_file(file_path)
+    for level, message in result['messages']:
+        print(f"{level} in {file_path}: {message}")
+    return result['ok']
+
+def discover_files(roots=DEFAULT_ROOTS, patterns=PATTERNS):
+    """GeoJSON/JSON/GeoParquet files under the given roots, skipping hidden directories"""
+    files = set()
+    for root in map(Path, roots):
+        if root.is_file():
+            files.add(root)
+            continue
+        for pattern in patterns:
+            files.update(
+                path for path in root.rglob(pattern)
+                if not any(part.startswith('.') for part in path.relative_to(root).parts)
+            )
+    return sorted(files)
 
-def verify_all_files():
-    """Verify all GeoJSON files in the maps directory"""
-    base_dir = Path("maps")
+def load_cache(cache_path):
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_cache(cache_path, results):
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_path, 'w') as f:
+        json.dump({result['file']: {**result, 'cached': False} for result in results}, f)
+
+def write_json_report(path, results, seconds):
+    """Summary and per-file results as JSON"""
+    report = {
+        'files': len(results),
+        'valid': sum(result['ok'] for result in results),
+        'invalid': sum(not result['ok'] for result in results),
+        'cached': sum(result['cached'] for result in results),
+        'seconds': seconds,
+        'results': results
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+def write_junit_report(path, results, seconds):
+    """One JUnit test case per file, failing with the file's error messages"""
+    suite = ElementTree.Element('testsuite', {
+        'name': 'verify_coordinates',
+        'tests': str(len(results)),
+        'failures': str(sum(not result['ok'] for result in results)),
+        'errors': '0',
+        'time': f"{seconds:.3f}"
+    })
+    for result in results:
+        case = ElementTree.SubElement(suite, 'testcase', {
+            'classname': 'verify_coordinates',
+            'name': result['file'],
+            'time': f"{result['seconds']:.3f}"
+        })
+        text = "\n".join(f"{level}: {message}" for level, message in result['messages'])
+        if not result['ok']:
+            errors = [message for level, message in result['messages'] if level == 'Error']
+            ElementTree.SubElement(case, 'failure', {'message': errors[0] if errors else 'invalid'}).text = text
+        elif text:
+            ElementTree.SubElement(case, 'system-out').text = text
+    suites = ElementTree.Element('testsuites')
+    suites.append(suite)
+    tree = ElementTree.ElementTree(suites)
+    ElementTree.indent(tree)
+    tree.write(path, encoding='utf-8', xml_declaration=True)
+
+def verify_all_files(roots=DEFAULT_ROOTS, workers=None, cache_path=CACHE_PATH, json_report=None, junit_report=None):
+    """Verify all layer files under the given roots in a process pool"""
+    start = time.perf_counter()
+    files = discover_files(roots)
+    cache = load_cache(cache_path) if cache_path else {}
+    known = [cache.get(str(file)) for file in files]
+    if workers == 1 or len(files) < 2:
+        results = list(map(verify_file, files, known))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(verify_file, files, known))
+    seconds = time.perf_counter() - start
+    
     valid_files = []
     invalid_files = []
-    
-    for folder in ["basalt", "olivine", "serpentine", "volcanic", "mangrove"]:
-        folder_path = base_dir / folder / "geojson"
-        if not folder_path.exists():
-            print(f"Warning: Folder {folder_path} does not exist")
-            continue
-            
-        for file in folder_path.glob("*.geojson"):
-            print(f"\nVerifying {file}...")
-            if verify_json_file(file):
-                valid_files.append(file)
-            else:
-                invalid_files.append(file)
+    for result in results:
+        status = "unchanged, " if result['cached'] else ""
+        print(f"\nVerifying {result['file']}... ({status}{result['features']} features, "
+              f"{result['vertices']} vertices, {result['seconds']:.2f}s)")
+        for level, message in result['messages']:
+            print(f"{level} in {result['file']}: {message}")
+        (valid_files if result['ok'] else invalid_files).append(result['file'])
     
     print("\nVerification Summary:")
     print(f"Valid files: {len(valid_files)}")
     print(f"Invalid files: {len(invalid_files)}")
+    print(f"Unchanged files skipped: {sum(result['cached'] for result in results)}")
+    print(f"Time: {seconds:.2f}s")
     
     if invalid_files:
         print("\nFiles with issues:")
         for file in invalid_files:
             print(file)
+    
+    if cache_path:
+        save_cache(cache_path, results)
+    if json_report:
+        write_json_report(json_report, results, seconds)
+    if junit_report:
+        write_junit_report(junit_report, results, seconds)
+    return results
 
 def main():
-    verify_all_files()
+    parser = argparse.ArgumentParser(description="Verify the coordinates of GeoJSON and GeoParquet files")
+    parser.add_argument('roots', nargs='*', default=list(DEFAULT_ROOTS),
+                        help="files or directories to search for .geojson/.json/.parquet files (default: maps data)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--no-cache', action='store_true', help="verify unchanged files again")
+    parser.add_argument('--json', help="write a JSON report to this file")
+    parser.add_argument('--junit', help="write a JUnit XML report to this file")
+    args = parser.parse_args()
+    
+    results = verify_all_files(args.roots, args.workers, None if args.no_cache else CACHE_PATH, args.json, args.junit)
+    if not all(result['ok'] for result in results):
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
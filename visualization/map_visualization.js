@@ -9,108 +9,78 @@ L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
     attribution: '© OpenStreetMap contributors'
 }).addTo(map);
 
+// Local vector tile service, started with `python tile_server.py serve`
+var TILE_URL = 'http://localhost:8765/tiles/{layer}/{z}/{x}/{y}.pbf';
+
 // Initialize layers
 var geologicalLayer = null;
 var volcanicLayer = null;
 var mangroveLayer = null;
 
+// Build the popup shown for a feature
+function featurePopup(properties) {
+    return `<strong>${properties.name}</strong><br>` +
+        `Type: ${properties.type}<br>` +
+        `Description: ${properties.description}<br>` +
+        `Source: ${properties.source}`;
+}
+
+// Function to create a vector tile layer drawing one tile service layer
+function createTileLayer(layerName, style) {
+    var styles = {};
+    styles[layerName] = style;
+
+    var layer = L.vectorGrid.protobuf(TILE_URL.replace('{layer}', layerName), {
+        rendererFactory: L.canvas.tile,
+        vectorTileLayerStyles: styles,
+        interactive: true,
+        maxNativeZoom: 14
+    });
+    var popup = L.popup();
+    layer.on('mouseover', function(e) {
+        popup.setLatLng(e.latlng).setContent(featurePopup(e.layer.properties)).openOn(map);
+    });
+    layer.on('mouseout', function() {
+        map.closePopup(popup);
+    });
+    return layer;
+}
+
 // Function to load and add geological features
 function loadGeologicalFeatures() {
-    fetch('../data/geological_features.json')
-        .then(response => response.json())
-        .then(data => {
-            geologicalLayer = L.geoJSON(data, {
-                style: function(feature) {
-                    switch (feature.properties.type) {
-                        case 'basalt': return {color: '#8B0000'};
-                        case 'olivine': return {color: '#008B8B'};
-                        default: return {color: '#808080'};
-                    }
-                },
-                onEachFeature: function(feature, layer) {
-                    layer.bindPopup(
-                        `<strong>${feature.properties.name}</strong><br>` +
-                        `Type: ${feature.properties.type}<br>` +
-                        `Description: ${feature.properties.description}<br>` +
-                        `Source: ${feature.properties.source}`
-                    );
-                    layer.on('mouseover', function(e) {
-                        e.target.openPopup();
-                    });
-                    layer.on('mouseout', function(e) {
-                        e.target.closePopup();
-                    });
-                }
-            });
-        });
+    geologicalLayer = createTileLayer('geological_features', function(properties) {
+        switch (properties.type) {
+            case 'basalt': return {color: '#8B0000', fill: true, radius: 6};
+            case 'olivine': return {color: '#008B8B', fill: true, radius: 6};
+            default: return {color: '#808080', fill: true, radius: 6};
+        }
+    });
 }
 
 // Function to load and add volcanic areas
 function loadVolcanicAreas() {
-    fetch('../maps/volcanic/data/volcanic_areas.geojson')
-        .then(response => response.json())
-        .then(data => {
-            volcanicLayer = L.geoJSON(data, {
-                pointToLayer: function(feature, latlng) {
-                    return L.circleMarker(latlng, {
-                        radius: 8,
-                        fillColor: '#FF4500',
-                        color: '#000',
-                        weight: 1,
-                        opacity: 1,
-                        fillOpacity: 0.8
-                    });
-                },
-                onEachFeature: function(feature, layer) {
-                    layer.bindPopup(
-                        `<strong>${feature.properties.name}</strong><br>` +
-                        `Type: ${feature.properties.type}<br>` +
-                        `Description: ${feature.properties.description}<br>` +
-                        `Source: ${feature.properties.source}`
-                    );
-                    layer.on('mouseover', function(e) {
-                        e.target.openPopup();
-                    });
-                    layer.on('mouseout', function(e) {
-                        e.target.closePopup();
-                    });
-                }
-            });
-        });
+    volcanicLayer = createTileLayer('volcanic', {
+        radius: 8,
+        fill: true,
+        fillColor: '#FF4500',
+        color: '#000',
+        weight: 1,
+        opacity: 1,
+        fillOpacity: 0.8
+    });
 }
 
 // Function to load and add mangrove areas
 function loadMangroveAreas() {
-    fetch('../maps/mangrove/data/mangrove_areas.geojson')
-        .then(response => response.json())
-        .then(data => {
-            mangroveLayer = L.geoJSON(data, {
-                pointToLayer: function(feature, latlng) {
-                    return L.circleMarker(latlng, {
-                        radius: 6,
-                        fillColor: '#008000',
-                        color: '#000',
-                        weight: 1,
-                        opacity: 1,
-                        fillOpacity: 0.8
-                    });
-                },
-                onEachFeature: function(feature, layer) {
-                    layer.bindPopup(
-                        `<strong>${feature.properties.name}</strong><br>` +
-                        `Type: ${feature.properties.type}<br>` +
-                        `Description: ${feature.properties.description}<br>` +
-                        `Source: ${feature.properties.source}`
-                    );
-                    layer.on('mouseover', function(e) {
-                        e.target.openPopup();
-                    });
-                    layer.on('mouseout', function(e) {
-                        e.target.closePopup();
-                    });
-                }
-            });
-        });
+    mangroveLayer = createTileLayer('mangrove', {
+        radius: 6,
+        fill: true,
+        fillColor: '#008000',
+        color: '#000',
+        weight: 1,
+        opacity: 1,
+        fillOpacity: 0.8
+    });
 }
 
 // Function to toggle layers
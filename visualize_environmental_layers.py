@@ -1,9 +1,12 @@
 import arcgis
 from arcgis.gis import GIS
 from arcgis.features import FeatureLayer
-import json
 import os
 
+from geojson_stream import FeatureStream
+
+GEOLOGICAL_TYPES = ('basalt', 'olivine', 'serpentine', 'volcano')
+
 def create_map():
     # Initialize ArcGIS Online
     gis = GIS()
@@ -22,16 +25,28 @@ def create_map():
     
     return map_widget
 
+def read_geological_features(path='data/geological_features.json'):
+    """Stream the geological features into one FeatureCollection per type"""
+    features = FeatureStream(path, strip_comments=True)
+    by_type = {layer_type: [] for layer_type in GEOLOGICAL_TYPES}
+    for feature in features:
+        layer_type = (feature.get('properties') or {}).get('type')
+        if layer_type in by_type:
+            by_type[layer_type].append(feature)
+    return {
+        layer_type: {**features.members, 'type': 'FeatureCollection', 'features': type_features}
+        for layer_type, type_features in by_type.items()
+    }
+
 def add_geological_layers(map_widget):
-    # Read the geological features from JSON
-    with open('data/geological_features.json', 'r') as f:
-        geojson_data = json.load(f)
+    # Read the geological features, split by type in a single pass
+    collections = read_geological_features()
     
     # Create feature layers for each type
-    basalt_layer = FeatureLayer.from_geojson(geojson_data, layer_type='basalt')
-    olivine_layer = FeatureLayer.from_geojson(geojson_data, layer_type='olivine')
-    serpentine_layer = FeatureLayer.from_geojson(geojson_data, layer_type='serpentine')
-    volcano_layer = FeatureLayer.from_geojson(geojson_data, layer_type='volcano')
+    basalt_layer = FeatureLayer.from_geojson(collections['basalt'], layer_type='basalt')
+    olivine_layer = FeatureLayer.from_geojson(collections['olivine'], layer_type='olivine')
+    serpentine_layer = FeatureLayer.from_geojson(collections['serpentine'], layer_type='serpentine')
+    volcano_layer = FeatureLayer.from_geojson(collections['volcano'], layer_type='volcano')
     
     # Add layers to map with custom styles
     map_widget.add_layer(basalt_layer, {
@@ -1,72 +1,65 @@
 import streamlit as st
 import folium
-from streamlit_folium import folium_static
+from streamlit_folium import st_folium
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Point
-import requests
 import json
 
-def load_volcanic_data():
+import app_cache
+import arcgis_client
+import feature_cache
+import point_layers
+import tile_server
+
+MAP_KEY = 'volcanic_map'
+
+VOLCANO_FIELDS = ('NAME', 'TYPE', 'ELEV')
+
+def volcano_query(bbox=None, out_fields=None, where=None):
+    """Query URL and parameters of the volcano layer"""
+    url = arcgis_client.service_url(arcgis_client.LAYER_SERVICES['volcanoes'])
+    params = {'geometryType': 'esriGeometryPoint'}
+    params.update(arcgis_client.filter_params(bbox, out_fields, where))
+    return url, params
+
+def load_volcanic_data(bbox=None, out_fields=None, where=None):
     """Load volcanic data from ArcGIS REST API"""
     try:
-        # ArcGIS REST API endpoint for volcanic data
-        url = "https://services2.arcgis.com/11XBiaBYA9Ep0yNJ/arcgis/rest/services/Global_Volcanoes/FeatureServer/0/query"
-        
-        # Parameters for the query
-        params = {
-            'where': '1=1',
-            'outFields': '*',
-            'geometryType': 'esriGeometryPoint',
-            'spatialRel': 'esriSpatialRelIntersects',
-            'outSR': '4326',
-            'f': 'json'
-        }
-        
-        # Make the request
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        # Convert to GeoDataFrame
-        features = data['features']
-        points = []
-        properties = []
-        
-        for feature in features:
-            coords = feature['geometry']['coordinates']
-            points.append(Point(coords[0], coords[1]))
-            properties.append(feature['attributes'])
-        
-        gdf = gpd.GeoDataFrame(properties, geometry=points, crs="EPSG:4326")
-        return gdf
+        return feature_cache.cached_query_layer(*volcano_query(bbox, out_fields, where))
     
     except Exception as e:
         st.error(f"Error loading volcanic data: {str(e)}")
         return None
 
-def create_volcanic_map(gdf):
+@st.cache_data(ttl=app_cache.LOADER_TTL, max_entries=app_cache.LOADER_ENTRIES, show_spinner=False)
+def cached_volcanic_data(bbox):
+    """Volcanoes inside one viewport, memoized across reruns"""
+    return feature_cache.cached_query_layer(*volcano_query(bbox, list(VOLCANO_FIELDS)))
+
+@st.cache_resource(ttl=app_cache.MAP_TTL, max_entries=app_cache.MAP_ENTRIES, show_spinner=False)
+def cached_volcanic_map(bbox, location, zoom, _gdf):
+    """Folium map of the volcanoes of one viewport, memoized by viewport"""
+    return create_volcanic_map(_gdf, location, zoom)
+
+def create_volcanic_map(gdf, location=(0, 0), zoom_start=2):
     """Create an interactive map of volcanic areas"""
-    # Create a base map centered on the world
-    m = folium.Map(location=[0, 0], zoom_start=2)
-    
-    # Add volcanic points to the map
-    for idx, row in gdf.iterrows():
-        folium.CircleMarker(
-            location=[row.geometry.y, row.geometry.x],
-            radius=5,
-            popup=f"Volcano: {row.get('NAME', 'Unknown')}<br>"
-                  f"Type: {row.get('TYPE', 'Unknown')}<br>"
-                  f"Elevation: {row.get('ELEV', 'Unknown')}m",
-            color='red',
-            fill=True,
-            fill_color='red'
-        ).add_to(m)
+    # Create a base map, centered on the world unless a viewport is given
+    m = folium.Map(location=list(location), zoom_start=zoom_start)
+    
+    # Add volcanic points to the map as one clustered canvas layer
+    popups = point_layers.popup_column(
+        gdf, {'NAME': 'Volcano', 'TYPE': 'Type', 'ELEV': 'Elevation (m)'}, default='Unknown'
+    )
+    point_layers.point_layer(
+        gdf.geometry.y, gdf.geometry.x, popups, name='Volcanoes', color='red', zoom=zoom_start
+    ).add_to(m)
     
     return m
 
 def analyze_volcanic_regions(gdf):
     """Analyze volcanic regions and their characteristics"""
-    if gdf is None:
+    if gdf is None or gdf.empty:
         return
     
     st.subheader("Volcanic Regions Analysis")
@@ -92,58 +85,67 @@ def analyze_volcanic_regions(gdf):
     st.line_chart(gdf['ELEV'].value_counts().sort_index())
 
 def get_arcgis_data(service_name):
-    base_url = "https://services2.arcgis.com/11XBiaBYA9Ep0yNJ/arcgis/rest/services"
-    url = f"{base_url}/{service_name}/FeatureServer/0/query"
-    
-    params = {
-        'where': '1=1',
-        'outFields': '*',
-        'geometryType': 'esriGeometryPolygon',
-        'spatialRel': 'esriSpatialRelIntersects',
-        'outSR': '4326',
-        'f': 'json'
-    }
-    
-    response = requests.get(url, params=params)
-    return response.json()
+    url = arcgis_client.service_url(service_name)
+    features = arcgis_client.fetch_features(url, {'geometryType': 'esriGeometryPolygon'})
+    return {'features': features}
 
-def get_volcanic_data(query_params=None):
-    base_url = "https://services2.arcgis.com/11XBiaBYA9Ep0yNJ/arcgis/rest/services/Global_Volcanoes/FeatureServer/0/query"
-    
-    default_params = {
-        'where': '1=1',
-        'outFields': '*',
-        'geometryType': 'esriGeometryPoint',
-        'spatialRel': 'esriSpatialRelIntersects',
-        'outSR': '4326',
-        'f': 'json'
-    }
+def get_volcanic_data(query_params=None, bbox=None, out_fields=None, where=None):
+    url = arcgis_client.service_url(arcgis_client.LAYER_SERVICES['volcanoes'])
     
+    params = {'geometryType': 'esriGeometryPoint'}
+    params.update(arcgis_client.filter_params(bbox, out_fields, where))
     if query_params:
-        default_params.update(query_params)
+        params.update(query_params)
     
-    response = requests.get(base_url, params=default_params)
-    return response.json()
+    features = arcgis_client.fetch_features(url, params)
+    return {'features': features}
 
 def main():
     st.title("Global Volcanic Areas Analysis")
     
+    # Only query what is inside the last map viewport
+    location, zoom, bbox = arcgis_client.viewport_state(st.session_state.get(MAP_KEY))
+    use_tiles = st.sidebar.checkbox(
+        "Draw volcanoes from the local vector tile server",
+        help="Start it with `python tile_server.py serve` after `python tile_server.py snapshot`"
+    )
+    
+    timer = app_cache.RerunTimer("Volcanic map")
+    
     # Load data
-    with st.spinner("Loading volcanic data..."):
-        gdf = load_volcanic_data()
+    with st.spinner("Loading volcanic data..."), timer.step("load volcanoes"):
+        try:
+            gdf = cached_volcanic_data(bbox)
+        except Exception as e:
+            st.error(f"Error loading volcanic data: {str(e)}")
+            gdf = None
     
     if gdf is not None:
         # Create and display map
         st.subheader("Interactive Volcanic Map")
-        m = create_volcanic_map(gdf)
-        folium_static(m)
+        if use_tiles:
+            m = folium.Map(location=list(location), zoom_start=zoom)
+            if 'volcanoes' in tile_server.available_layers():
+                tile_server.tile_layer('volcanoes', 'Volcanoes').add_to(m)
+        else:
+            with timer.step("build map"):
+                m = cached_volcanic_map(bbox, tuple(location), zoom, gdf)
+        with timer.step("draw map"):
+            st_folium(m, key=MAP_KEY, width=700, height=500, returned_objects=['bounds', 'center', 'zoom'])
         
-        # Analysis section
-        analyze_volcanic_regions(gdf)
+        # Analysis section; an empty viewport (open ocean, a filter
+        # matching nothing) has no columns to analyze
+        if gdf.empty:
+            st.info("No volcanoes in this view. Pan or zoom out to load some.")
+        else:
+            with timer.step("analysis"):
+                analyze_volcanic_regions(gdf)
         
         # Raw data view
-        if st.checkbox("Show Raw Data"):
+        if not gdf.empty and st.checkbox("Show Raw Data"):
             st.dataframe(gdf.drop(columns=['geometry']))
+    
+    timer.report()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file